@@ -0,0 +1,136 @@
+"""
+ANALYSES - MODULE 8
+Transport DanGE Planning
+
+Indicateurs par chauffeur, par semaine et par type de course, calculés
+par group-by pandas vectorisés à partir des agrégats journaliers
+(table daily_stats, migrations/0007) :
+
+- nombre de courses, courses terminées et taux de réalisation
+- CA prévu (toutes courses) et CA réalisé (courses déposées)
+- kilomètres prévus et réalisés
+
+Les fonctions ne touchent pas à la base : app.py fournit les lignes
+de daily_stats (requête en cache par période et version des données).
+"""
+
+import pandas as pd
+
+STATUT_TERMINE = 'deposee'
+
+# Colonnes des lignes fournies par app.get_daily_stats_rows()
+COLUMNS = ['jour', 'chauffeur_id', 'chauffeur', 'statut', 'type_course', 'nb_courses', 'ca', 'km']
+
+# Dimensions d'analyse : libellé -> colonne du DataFrame
+DIMENSIONS = {
+    'Chauffeur': 'chauffeur',
+    'Semaine': 'semaine',
+    'Type de course': 'type_course'
+}
+
+INDICATEURS = ['nb_courses', 'terminees', 'taux_realisation', 'ca_prevu', 'ca_realise', 'km_prevus', 'km_realises']
+
+
+def build_frame(rows):
+    """
+    DataFrame des agrégats journaliers, enrichi des colonnes calculées
+    une seule fois (semaine, valeurs des courses terminées).
+
+    Args:
+        rows (list): Lignes de daily_stats (dicts avec les clés de COLUMNS)
+
+    Returns:
+        DataFrame
+    """
+    df = pd.DataFrame(rows, columns=COLUMNS)
+
+    df['jour'] = pd.to_datetime(df['jour'])
+    df['semaine'] = df['jour'] - pd.to_timedelta(df['jour'].dt.weekday, unit='D')
+    df['type_course'] = df['type_course'].replace('', 'Non renseigné')
+    df[['ca', 'km']] = df[['ca', 'km']].astype(float)
+    df['nb_courses'] = df['nb_courses'].astype(int)
+
+    termine = df['statut'] == STATUT_TERMINE
+    df['terminees'] = df['nb_courses'].where(termine, 0)
+    df['ca_realise'] = df['ca'].where(termine, 0.0)
+    df['km_realises'] = df['km'].where(termine, 0.0)
+    return df
+
+
+def summarize(df, by):
+    """
+    Indicateurs agrégés par une ou plusieurs dimensions.
+
+    Args:
+        df (DataFrame): Résultat de build_frame()
+        by (str | list): Colonne(s) de regroupement (valeurs de DIMENSIONS)
+
+    Returns:
+        DataFrame: une ligne par groupe, colonnes INDICATEURS
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if df.empty:
+        return pd.DataFrame(columns=by + INDICATEURS)
+
+    summary = df.groupby(by, sort=True).agg(
+        nb_courses=('nb_courses', 'sum'),
+        terminees=('terminees', 'sum'),
+        ca_prevu=('ca', 'sum'),
+        ca_realise=('ca_realise', 'sum'),
+        km_prevus=('km', 'sum'),
+        km_realises=('km_realises', 'sum')
+    ).reset_index()
+
+    summary['taux_realisation'] = (summary['terminees'] / summary['nb_courses'].where(summary['nb_courses'] > 0)).fillna(0.0)
+    return summary[by + INDICATEURS]
+
+
+def pivot(df, index, columns, value='ca_realise'):
+    """
+    Tableau croisé d'un indicateur (ex: CA réalisé par chauffeur et par semaine).
+
+    Le taux de réalisation est recalculé à partir des sommes, jamais additionné.
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    if value == 'taux_realisation':
+        totals = summarize(df, [index, columns])
+        table = totals.pivot(index=index, columns=columns, values=value)
+    else:
+        source = {'ca_prevu': 'ca', 'km_prevus': 'km'}.get(value, value)
+        table = df.pivot_table(index=index, columns=columns, values=source, aggfunc='sum', fill_value=0)
+
+    return table.fillna(0)
+
+
+def compute_analytics(rows):
+    """
+    Jeu complet d'indicateurs pour une période.
+
+    Returns:
+        dict: {
+            'totaux': dict,                 # indicateurs de la période
+            'par_chauffeur': DataFrame,
+            'par_semaine': DataFrame,
+            'par_type': DataFrame,
+            'ca_chauffeur_semaine': DataFrame,   # pivot CA réalisé
+            'km_chauffeur_semaine': DataFrame    # pivot km réalisés
+        }
+    """
+    df = build_frame(rows)
+
+    if df.empty:
+        totaux = {indicateur: 0 for indicateur in INDICATEURS}
+    else:
+        df['periode'] = 'total'
+        totaux = summarize(df, 'periode').iloc[0][INDICATEURS].to_dict()
+
+    return {
+        'totaux': totaux,
+        'par_chauffeur': summarize(df, 'chauffeur'),
+        'par_semaine': summarize(df, 'semaine'),
+        'par_type': summarize(df, 'type_course'),
+        'ca_chauffeur_semaine': pivot(df, 'chauffeur', 'semaine', 'ca_realise'),
+        'km_chauffeur_semaine': pivot(df, 'chauffeur', 'semaine', 'km_realises')
+    }
@@ -1,25 +1,34 @@
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_values
 import hashlib
-import pandas as pd
 from datetime import datetime, timedelta
 import os
 import pytz
 
 # Import du module Assistant Intelligent
 from assistant import suggest_best_driver, calculate_distance
+from migrate import run_migrations
+from db_pool import BoundedConnectionPool, PoolTimeout
+from db_session import begin_request_session, get_request_session, end_request_session
+from cache import versioned_cache, bump_version, invalidate_all, NoCache
+from realtime import ChangeListener, get_driver_version
+from analytics import compute_analytics
+from exports import copy_query_to_csv, rows_to_xlsx, EXPORT_TIMEZONE, SERVER_CURSOR_ITERSIZE
+from client_search import ClientSearchIndex
+from course import courses_from_cursor, normalize_heure_pec, parse_heure_pec
+from planning import GRID_HOURS, build_day_plan, build_week_grid
+from distance_cache import DistanceCache, purge_expired_distances
+from distance_providers import GoogleDistanceProvider, OfflineDistanceProvider
 
 
 
 # ============================================
 # OPTIMISATIONS APPLIQUÉES - V3.0 ULTRA ⚡
 # ============================================
-# 1. CACHES RETIRÉS pour éviter les clics multiples (problème résolu)
+# 1. CACHE VERSIONNÉ - invalidé par chaque écriture (plus de clics multiples)
 # 2. Requêtes SQL optimisées (moins d'appels à la DB)
-# 3. Index recommandés (voir commentaires DATABASE INDEXES)
+# 3. Index gérés par migrations versionnées (dossier migrations/)
 # 4. Boucles simplifiées
 # 5. CONNECTION POOLING - Réutilisation connexions (100x plus rapide)
 # 6. LAZY LOADING - 30 derniers jours (10x moins de données)
@@ -49,103 +58,305 @@ st.set_page_config(
 
 
 # ============================================
-# DATABASE INDEXES - RECOMMANDATIONS
+# DATABASE INDEXES & SCHÉMA - MIGRATIONS
 # ============================================
-# Pour améliorer les performances, créez ces index dans Supabase :
-#
-# CREATE INDEX idx_courses_chauffeur_id ON courses(chauffeur_id);
-# CREATE INDEX idx_courses_heure_prevue ON courses(heure_prevue);
-# CREATE INDEX idx_courses_statut ON courses(statut);
-# CREATE INDEX idx_courses_visible_chauffeur ON courses(visible_chauffeur);
-# CREATE INDEX idx_courses_date_heure ON courses(DATE(heure_prevue), heure_prevue);
-#
-# CREATE INDEX idx_users_role ON users(role);
-# CREATE INDEX idx_users_username ON users(username);
-#
-# CREATE INDEX idx_clients_reguliers_nom ON clients_reguliers(nom_complet);
-# CREATE INDEX idx_clients_reguliers_actif ON clients_reguliers(actif);
+# Les tables complémentaires et les index sont gérés par les fichiers
+# versionnés du dossier migrations/ (voir migrate.py).
+# Ils sont appliqués UNE fois par process au démarrage (init_db),
+# les index avec CREATE INDEX CONCURRENTLY : aucun DDL pendant les reruns.
 # ============================================
 
 
-
-
 # ============================================
 # CONNECTION POOLING - OPTIMISATION #5
 # ============================================
+def get_db_params():
+    """Paramètres de connexion psycopg2 lus dans st.secrets["supabase"]"""
+    if "connection_string" in st.secrets.get("supabase", {}):
+        return {'dsn': st.secrets["supabase"]["connection_string"]}
+    return {
+        'host': st.secrets["supabase"]["host"],
+        'database': st.secrets["supabase"]["database"],
+        'user': st.secrets["supabase"]["user"],
+        'password': st.secrets["supabase"]["password"],
+        'port': st.secrets["supabase"]["port"],
+        'sslmode': 'require'
+    }
+
+
 @st.cache_resource
 def get_connection_pool():
-    """Crée un pool de connexions réutilisables - GAIN DE VITESSE"""
+    """
+    Crée un pool de connexions thread-safe partagé par toutes les sessions - GAIN DE VITESSE
+    
+    Réglages optionnels dans st.secrets["pool"] :
+        min_connections (1), max_connections (10),
+        timeout (10 s d'attente max quand le pool est plein),
+        health_check_interval (30 s d'inactivité avant un ping)
+    """
+    pool_config = st.secrets.get("pool", {})
     try:
-        if "connection_string" in st.secrets.get("supabase", {}):
-            return pool.SimpleConnectionPool(
-                1, 5,
-                st.secrets["supabase"]["connection_string"]
-            )
-        else:
-            return pool.SimpleConnectionPool(
-                1, 5,
-                host=st.secrets["supabase"]["host"],
-                database=st.secrets["supabase"]["database"],
-                user=st.secrets["supabase"]["user"],
-                password=st.secrets["supabase"]["password"],
-                port=st.secrets["supabase"]["port"],
-                sslmode='require'
-            )
+        return BoundedConnectionPool(
+            int(pool_config.get("min_connections", 1)),
+            int(pool_config.get("max_connections", 10)),
+            timeout=float(pool_config.get("timeout", 10)),
+            health_check_interval=float(pool_config.get("health_check_interval", 30)),
+            cursor_factory=RealDictCursor,
+            **get_db_params()
+        )
     except Exception as e:
         st.error(f"Erreur pool connexion: {e}")
         return None
 
 
+def get_pool_stats():
+    """Compteurs du pool (emprunts, attentes, saturations) - None si pas de pool"""
+    conn_pool = get_connection_pool()
+    return conn_pool.stats() if conn_pool else None
+
+
 def release_db_connection(conn):
-    """Remet la connexion dans le pool - OPTIMISATION"""
+    """
+    Remet la connexion dans le pool - OPTIMISATION
+    La connexion de la session du rerun reste attachée au rerun (rendue par main())
+    """
+    if not conn:
+        return
+    
+    session = get_request_session()
+    if session and session.owns(conn):
+        session.release(conn)
+        return
+    
+    return_db_connection(conn)
+
+
+def return_db_connection(conn):
+    """Rend réellement une connexion au pool (ou la ferme sans pool)"""
     try:
         conn_pool = get_connection_pool()
         if conn_pool:
             conn_pool.putconn(conn)
         else:
-            release_db_connection(conn)
-    except:
-        if conn:
-            release_db_connection(conn)
+            # Connexion directe (fallback sans pool)
+            conn.close()
+    except psycopg2.Error:
+        pass
 
 
 # Connexion à la base de données Supabase PostgreSQL
 def get_db_connection():
-    """Récupère une connexion depuis le pool - OPTIMISÉ"""
+    """
+    Récupère la connexion du rerun courant - OPTIMISÉ
+    Une seule connexion est empruntée par rerun, partagée par toutes les requêtes
+    """
+    session = get_request_session()
+    if session:
+        return session.connection()
+    return checkout_db_connection()
+
+
+def checkout_db_connection():
+    """Emprunte une connexion au pool (attente bornée si le pool est plein)"""
     try:
         conn_pool = get_connection_pool()
         if conn_pool:
-            conn = conn_pool.getconn()
-            conn.cursor_factory = RealDictCursor
-            return conn
+            return conn_pool.getconn()
         
         # Fallback si pool échoue
-        if "connection_string" in st.secrets.get("supabase", {}):
-            conn = psycopg2.connect(
-                st.secrets["supabase"]["connection_string"],
-                cursor_factory=RealDictCursor
-            )
-        else:
-            conn = psycopg2.connect(
-                host=st.secrets["supabase"]["host"],
-                database=st.secrets["supabase"]["database"],
-                user=st.secrets["supabase"]["user"],
-                password=st.secrets["supabase"]["password"],
-                port=st.secrets["supabase"]["port"],
-                sslmode='require',
-                cursor_factory=RealDictCursor
-            )
-        return conn
+        return psycopg2.connect(cursor_factory=RealDictCursor, **get_db_params())
+    except PoolTimeout:
+        st.error("⏳ Serveur très sollicité : aucune connexion disponible, réessayez dans quelques secondes.")
+        return None
     except Exception as e:
         st.error(f"Erreur de connexion à la base de données: {e}")
         return None
 
 
+# Attente maximale d'une connexion pour le cache des distances (secondes)
+DISTANCE_CACHE_CHECKOUT_TIMEOUT = 0.0
+
+
+def try_checkout_db_connection(timeout=DISTANCE_CACHE_CHECKOUT_TIMEOUT):
+    """
+    Emprunte une connexion SANS attendre ni afficher d'erreur : None si le
+    pool est saturé ou indisponible (l'appelant se passe alors de la base)
+    """
+    conn_pool = get_connection_pool()
+    if not conn_pool:
+        return None
+    try:
+        return conn_pool.getconn(timeout=timeout)
+    except Exception:
+        return None
+
+
 # Initialiser la base de données
 def init_db():
-    # Tables déjà créées dans Supabase - cette fonction n'est plus nécessaire
-    # MAIS on initialise la table notifications ici
-    init_notifications_table()
+    """Applique les migrations de schéma - aucun DDL lors des reruns"""
+    try:
+        run_db_migrations()
+    except Exception as e:
+        st.error(f"Erreur de migration de la base de données: {e}")
+        return
+    try:
+        # Une fois par mois et par process
+        run_db_maintenance(datetime.now(TIMEZONE).strftime('%Y-%m'))
+    except psycopg2.Error as e:
+        st.warning(f"Maintenance des partitions impossible : {e}")
+    get_change_listener()
+
+
+@st.cache_resource
+def get_change_listener():
+    """
+    Démarre (une fois par process) le thread LISTEN/NOTIFY qui invalide les caches
+    et réveille les pages chauffeur concernées.
+    NB: LISTEN nécessite une connexion directe ou le pooler Supabase en mode session.
+    """
+    listener = ChangeListener(lambda: psycopg2.connect(**get_db_params()))
+    listener.start()
+    return listener
+
+
+@st.cache_resource
+def run_db_migrations():
+    """
+    Applique les migrations en attente UNE fois par process (cache_resource).
+    En cas d'échec rien n'est mis en cache : nouvel essai au rerun suivant.
+    """
+    return run_migrations(lambda: psycopg2.connect(**get_db_params()))
+
+
+# Partitions mensuelles de courses créées à l'avance (migrations/0009)
+COURSES_PARTITIONS_AHEAD_MONTHS = 12
+
+
+@st.cache_resource
+def run_db_maintenance(month):
+    """
+    Maintenance des partitions de courses, UNE fois par mois et par process
+    (month fait partie de la clé de cache) :
+    - crée les partitions mensuelles des COURSES_PARTITIONS_AHEAD_MONTHS prochains mois
+    - si st.secrets["retention"]["courses_months"] est défini, archive puis
+      supprime les partitions plus anciennes (DROP, pas de DELETE)
+    - purge les distances expirées du cache partagé (migrations/0013)
+    - purge les tombstones du flux de changements que plus aucune page ne lit
+    """
+    conn = psycopg2.connect(**get_db_params())
+    try:
+        result = {'created': ensure_course_partitions(conn)}
+        
+        keep_months = st.secrets.get("retention", {}).get("courses_months")
+        if keep_months:
+            result['dropped'] = apply_course_retention(conn, int(keep_months))
+        
+        result['distances_purged'] = purge_expired_distances(conn)
+        result['tombstones_purged'] = purge_course_tombstones(conn)
+        return result
+    finally:
+        conn.close()
+
+
+@st.cache_resource
+def get_distance_cache():
+    """
+    Cache des distances de l'assistant, partagé par toutes les sessions du process
+    (LRU en mémoire) et par tous les process (table distance_cache).
+    
+    Réglages optionnels dans st.secrets["distance_cache"] :
+        maxsize (2048 entrées en mémoire), ttl_days (30),
+        negative_ttl_hours (6 h pour un trajet introuvable)
+    
+    Le cache valide / annule ses propres requêtes : il emprunte une connexion
+    dédiée au pool, jamais celle du rerun (get_db_connection), et sans attente :
+    pool saturé = simple défaut de cache, la suggestion continue.
+    """
+    config = st.secrets.get("distance_cache", {})
+    return DistanceCache(
+        connect=try_checkout_db_connection,
+        release=return_db_connection,
+        maxsize=int(config.get("maxsize", 2048)),
+        ttl=float(config.get("ttl_days", 30)) * 86400,
+        negative_ttl=float(config.get("negative_ttl_hours", 6)) * 3600
+    )
+
+
+@st.cache_resource
+def get_offline_distance_provider():
+    """Estimation hors ligne des distances (répertoire local chargé une fois par process)"""
+    return OfflineDistanceProvider()
+
+
+def get_distance_provider():
+    """
+    Fournisseur de distances de l'assistant :
+    Google Distance Matrix si st.secrets["google_maps"]["api_key"] est configurée
+    (et st.secrets["distance"]["provider"] différent de "offline"),
+    sinon estimation hors ligne.
+    """
+    if st.secrets.get("distance", {}).get("provider") != "offline":
+        api_key = st.secrets.get("google_maps", {}).get("api_key")
+        if api_key:
+            return GoogleDistanceProvider(api_key)
+    return get_offline_distance_provider()
+
+
+def ensure_course_partitions(conn, months_ahead=COURSES_PARTITIONS_AHEAD_MONTHS):
+    """Crée les partitions manquantes du mois courant à +months_ahead mois"""
+    today = datetime.now(TIMEZONE).date()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT ensure_courses_partitions(%s, (%s::date + make_interval(months => %s))::date)",
+        (today, today, months_ahead)
+    )
+    created = cursor.fetchone()[0]
+    conn.commit()
+    return created
+
+
+def apply_course_retention(conn, keep_months, archive=True):
+    """
+    Rétention : les partitions mensuelles antérieures aux keep_months derniers
+    mois sont détachées, copiées dans courses_archive puis supprimées.
+    Les notifications qui les référencent sont détachées (course_id NULL,
+    voir courses_references dans migrations/0009).
+    
+    Returns:
+        list: [(partition, lignes archivées)]
+    """
+    if keep_months < 1:
+        raise ValueError("La rétention doit garder au moins le mois courant")
+    
+    first_kept = datetime.now(TIMEZONE).date().replace(day=1)
+    for _ in range(keep_months - 1):
+        first_kept = (first_kept - timedelta(days=1)).replace(day=1)
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM drop_courses_partitions_before(%s, %s)", (first_kept, archive))
+    dropped = [tuple(row) for row in cursor.fetchall()]
+    conn.commit()
+    
+    if dropped:
+        bump_version('courses', 'notifications')
+    return dropped
+
+
+# Tombstones gardés (jours) : bien au-delà de la resynchronisation complète
+# des pages chauffeur (FULL_SYNC_INTERVAL_SECONDS), après laquelle ils ne sont plus lus
+COURSES_TOMBSTONES_KEEP_DAYS = 3
+
+
+def purge_course_tombstones(conn, keep_days=COURSES_TOMBSTONES_KEEP_DAYS):
+    """Supprime les tombstones de courses_deleted de plus de keep_days jours - renvoie le nombre de lignes"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'DELETE FROM courses_deleted WHERE deleted_at < NOW() - make_interval(days => %s)',
+        (keep_days,)
+    )
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
 
 
 # Fonction de hachage de mot de passe
@@ -181,13 +392,14 @@ def login(username, password):
 
 
 # ============================================
-# FONCTION OPTIMISÉE - CACHE RETIRÉ
+# FONCTION OPTIMISÉE - CACHE VERSIONNÉ
 # ============================================
+@versioned_cache('users')
 def get_chauffeurs():
-    """Récupère tous les chauffeurs - CACHE RETIRÉ pour cohérence"""
+    """Récupère tous les chauffeurs - CACHE invalidé par toute écriture sur users"""
     conn = get_db_connection()
     if not conn:
-        return []
+        raise NoCache([])
     
     cursor = conn.cursor()
     cursor.execute('''
@@ -209,55 +421,120 @@ def get_chauffeurs():
 # SYSTÈME DE NOTIFICATIONS
 # ============================================
 
-def init_notifications_table():
-    """Crée la table notifications si elle n'existe pas"""
-    conn = get_db_connection()
-    if not conn:
-        return
-    
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notifications (
-            id SERIAL PRIMARY KEY,
-            chauffeur_id INTEGER REFERENCES users(id),
-            course_id INTEGER,
-            message TEXT,
-            type VARCHAR(50),
-            lu BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    release_db_connection(conn)
+# Une notification non lue pour la même course et le même chauffeur, plus
+# récente que cette fenêtre, est remplacée au lieu d'être dupliquée
+NOTIFICATION_COALESCE_SECONDS = 300
 
 
 def create_notification(chauffeur_id, course_id, message, notification_type='nouvelle_course'):
     """Crée une notification pour un chauffeur"""
+    result = create_notifications([(chauffeur_id, course_id, message, notification_type)])
+    return result['success']
+
+
+def create_notifications(notifications, coalesce_seconds=NOTIFICATION_COALESCE_SECONDS):
+    """
+    Crée plusieurs notifications en une seule requête
+    
+    Args:
+        notifications: liste de tuples (chauffeur_id, course_id, message, type)
+        coalesce_seconds: fenêtre de fusion des notifications d'une même course
+    
+    Returns:
+        dict: {'success': bool, 'inserted': int, 'merged': int}
+    """
+    if not notifications:
+        return {'success': True, 'inserted': 0, 'merged': 0}
+    
     conn = get_db_connection()
     if not conn:
-        return False
+        return {'success': False, 'error': 'Erreur de connexion'}
     
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO notifications (chauffeur_id, course_id, message, type)
-        VALUES (%s, %s, %s, %s)
-    ''', (chauffeur_id, course_id, message, notification_type))
+    try:
+        inserted, merged = insert_notifications(cursor, notifications, coalesce_seconds)
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        release_db_connection(conn)
+        return {'success': False, 'error': str(e)}
     
-    conn.commit()
+    bump_version('notifications')
     release_db_connection(conn)
-    return True
+    return {'success': True, 'inserted': inserted, 'merged': merged}
 
 
+def insert_notifications(cursor, notifications, coalesce_seconds=NOTIFICATION_COALESCE_SECONDS):
+    """
+    Insère un lot de notifications sur le curseur fourni (SANS commit), pour
+    pouvoir les écrire dans la transaction de l'écriture qui les déclenche.
+    
+    - dans le lot, seule la dernière notification par (chauffeur, course) est gardée
+    - une notification non lue de moins de coalesce_seconds pour la même
+      (chauffeur, course) est mise à jour au lieu d'en insérer une nouvelle
+    - les notifications sans course ne sont jamais fusionnées
+    
+    Returns:
+        tuple: (inserted, merged)
+    """
+    if not notifications:
+        return 0, 0
+    
+    rows = [
+        (ordre, chauffeur_id, course_id, message, notification_type)
+        for ordre, (chauffeur_id, course_id, message, notification_type) in enumerate(notifications)
+    ]
+    
+    result = execute_values(cursor, f'''
+        WITH lot (ordre, chauffeur_id, course_id, message, type) AS (
+            VALUES %s
+        ),
+        dernieres AS (
+            SELECT DISTINCT ON (chauffeur_id, COALESCE(course_id, -1 - ordre)) *
+            FROM lot
+            ORDER BY chauffeur_id, COALESCE(course_id, -1 - ordre), ordre DESC
+        ),
+        fusionnees AS (
+            UPDATE notifications n
+            SET message = d.message, type = d.type, created_at = CURRENT_TIMESTAMP
+            FROM dernieres d
+            WHERE d.course_id IS NOT NULL
+            AND n.chauffeur_id = d.chauffeur_id
+            AND n.course_id = d.course_id
+            AND n.lu = FALSE
+            AND n.created_at >= CURRENT_TIMESTAMP - make_interval(secs => {int(coalesce_seconds)})
+            RETURNING n.chauffeur_id, n.course_id
+        ),
+        inserees AS (
+            INSERT INTO notifications (chauffeur_id, course_id, message, type)
+            SELECT d.chauffeur_id, d.course_id, d.message, d.type
+            FROM dernieres d
+            WHERE NOT EXISTS (
+                SELECT 1 FROM fusionnees f
+                WHERE f.chauffeur_id = d.chauffeur_id AND f.course_id = d.course_id
+            )
+            ORDER BY d.ordre
+            RETURNING id
+        )
+        SELECT (SELECT COUNT(*) FROM inserees) AS inserted,
+               (SELECT COUNT(DISTINCT (chauffeur_id, course_id)) FROM fusionnees) AS merged
+    ''', rows, template='(%s, %s::integer, %s::integer, %s, %s)', page_size=len(rows), fetch=True)
+    
+    return result[0]['inserted'], result[0]['merged']
+
+
+@versioned_cache('notifications', 'courses')
 def get_unread_notifications(chauffeur_id):
     """Récupère les notifications non lues d'un chauffeur"""
     conn = get_db_connection()
     if not conn:
-        return []
+        raise NoCache([])
     
     cursor = conn.cursor()
     cursor.execute('''
         SELECT n.id, n.message, n.type, n.created_at, n.course_id,
-               c.nom_client, c.adresse_pec, c.lieu_depose, c.heure_pec_prevue
+               c.nom_client, c.adresse_pec, c.lieu_depose,
+               to_char(c.heure_pec_prevue, 'HH24:MI') AS heure_pec_prevue
         FROM notifications n
         LEFT JOIN courses c ON n.course_id = c.id
         WHERE n.chauffeur_id = %s AND n.lu = FALSE
@@ -285,14 +562,16 @@ def mark_notifications_as_read(chauffeur_id):
     ''', (chauffeur_id,))
     
     conn.commit()
+    bump_version('notifications')
     release_db_connection(conn)
 
 
+@versioned_cache('notifications')
 def get_unread_count(chauffeur_id):
     """Compte le nombre de notifications non lues"""
     conn = get_db_connection()
     if not conn:
-        return 0
+        raise NoCache(0)
     
     cursor = conn.cursor()
     cursor.execute('''
@@ -332,23 +611,27 @@ def create_client_regulier(data):
     ))
     client_id = cursor.lastrowid
     conn.commit()
+    bump_version('clients_reguliers')
     release_db_connection(conn)
     return client_id
 
 
+@versioned_cache('clients_reguliers')
 def get_clients_reguliers(search_term=None):
     conn = get_db_connection()
     if not conn:
-        return []
+        raise NoCache([])
     
     cursor = conn.cursor()
     
     if search_term:
+        # Insensible à la casse et aux accents, servi par l'index trigramme (migrations/0011)
         cursor.execute('''
             SELECT * FROM clients_reguliers
-            WHERE actif = 1 AND nom_complet LIKE %s
-            ORDER BY nom_complet
-        ''', (f'%{search_term}%',))
+            WHERE actif = 1
+            AND normalize_nom(nom_complet) LIKE '%%' || normalize_nom(%s) || '%%'
+            ORDER BY similarity(normalize_nom(nom_complet), normalize_nom(%s)) DESC, nom_complet
+        ''', (search_term, search_term))
     else:
         cursor.execute('''
             SELECT * FROM clients_reguliers
@@ -376,10 +659,45 @@ def get_clients_reguliers(search_term=None):
     return result
 
 
+# Fenêtre d'utilisation récente prise en compte dans le classement de la recherche
+CLIENT_USAGE_DAYS = 90
+
+
+@versioned_cache('clients_reguliers', maxsize=1)
+def get_client_search_index():
+    """
+    Index de recherche en mémoire des clients actifs (client_search.py),
+    reconstruit quand la version de clients_reguliers change
+    (create_course l'incrémente quand une course utilise un client régulier).
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise NoCache(ClientSearchIndex([]))
+    
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT client_regulier_id, COUNT(*) AS nb
+        FROM courses
+        WHERE client_regulier_id IS NOT NULL
+        AND heure_prevue >= %s
+        GROUP BY client_regulier_id
+    ''', (datetime.now(TIMEZONE) - timedelta(days=CLIENT_USAGE_DAYS),))
+    usage = {row['client_regulier_id']: row['nb'] for row in cursor.fetchall()}
+    release_db_connection(conn)
+    
+    return ClientSearchIndex(get_clients_reguliers(), usage)
+
+
+def search_clients_reguliers(search_term, limit=10):
+    """Autocomplétion : clients actifs classés par pertinence puis utilisation récente"""
+    return get_client_search_index().search(search_term, limit=limit)
+
+
+@versioned_cache('clients_reguliers')
 def get_client_regulier(client_id):
     conn = get_db_connection()
     if not conn:
-        return None
+        raise NoCache(None)
     
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM clients_reguliers WHERE id = %s', (client_id,))
@@ -425,6 +743,7 @@ def update_client_regulier(client_id, data):
         client_id
     ))
     conn.commit()
+    bump_version('clients_reguliers')
     release_db_connection(conn)
 
 
@@ -436,6 +755,7 @@ def delete_client_regulier(client_id):
     cursor = conn.cursor()
     cursor.execute('UPDATE clients_reguliers SET actif = 0 WHERE id = %s', (client_id,))
     conn.commit()
+    bump_version('clients_reguliers')
     release_db_connection(conn)
 
 
@@ -444,7 +764,14 @@ def delete_client_regulier(client_id):
 # ============================================
 
 def create_course(data):
-    """Crée une nouvelle course avec gestion de la visibilité"""
+    """
+    Crée une nouvelle course avec gestion de la visibilité
+    
+    Raises:
+        ValueError: Heure PEC invalide (voir parse_heure_pec)
+    """
+    heure_pec = parse_heure_pec(data.get('heure_pec_prevue'))
+    
     conn = get_db_connection()
     if not conn:
         return None
@@ -485,7 +812,7 @@ def create_course(data):
         data['adresse_pec'],
         data['lieu_depose'],
         data['heure_prevue'],
-        data.get('heure_pec_prevue'),
+        heure_pec,
         data.get('temps_trajet_minutes'),
         data.get('heure_depart_calculee'),
         data['type_course'],
@@ -501,6 +828,11 @@ def create_course(data):
     course_id = result['id'] if result else None
     
     conn.commit()
+    if data.get('client_regulier_id'):
+        # Utilisation récente du client : reclassement de la recherche
+        bump_version('courses', 'clients_reguliers')
+    else:
+        bump_version('courses')
     release_db_connection(conn)
     
     return course_id
@@ -564,20 +896,70 @@ def extract_time_str(datetime_input):
     return ""
 
 
+def to_paris_datetime(datetime_input):
+    """Convertit un datetime (naïf = heure de Paris) en datetime aware Europe/Paris"""
+    if datetime_input.tzinfo is None:
+        return TIMEZONE.localize(datetime_input)
+    return datetime_input.astimezone(TIMEZONE)
+
+
+def get_paris_day_range(date_debut, date_fin=None):
+    """
+    Bornes [début, fin[ en heure de Paris couvrant les jours date_debut → date_fin inclus.
+    Accepte des objets date ou des chaînes ISO (YYYY-MM-DD).
+    """
+    if isinstance(date_debut, str):
+        date_debut = datetime.strptime(date_debut[0:10], '%Y-%m-%d').date()
+    if date_fin is None:
+        date_fin = date_debut
+    elif isinstance(date_fin, str):
+        date_fin = datetime.strptime(date_fin[0:10], '%Y-%m-%d').date()
+    
+    debut = TIMEZONE.localize(datetime.combine(date_debut, datetime.min.time()))
+    fin = TIMEZONE.localize(datetime.combine(date_fin + timedelta(days=1), datetime.min.time()))
+    return debut, fin
+
+
 # ============================================
-# FONCTION OPTIMISÉE - CACHE RETIRÉ
+# FONCTION OPTIMISÉE - CACHE VERSIONNÉ
 # ============================================
+
+# Jour du planning (heure de Paris) : 1re colonne de l'index
+# idx_courses_jour_heure_pec (migrations/0012)
+COURSES_PLANNING_DAY = "((c.heure_prevue AT TIME ZONE 'Europe/Paris')::date)"
+
+# Ordre du planning : jour puis heure PEC (colonne TIME), à défaut heure prévue.
+# Expressions identiques à l'index idx_courses_jour_heure_pec : filtrées AUSSI
+# sur COURSES_PLANNING_DAY, les courses sortent de l'index déjà triées (la
+# plage sur heure_prevue reste pour l'élagage des partitions).
+COURSES_PLANNING_ORDER = f"""
+    {COURSES_PLANNING_DAY},
+    (COALESCE(c.heure_pec_prevue, (c.heure_prevue AT TIME ZONE 'Europe/Paris')::time))
+"""
+
+
 def get_courses(chauffeur_id=None, date_filter=None, role=None, days_back=30, limit=100):
     """
-    Récupère les courses - CACHE RETIRÉ pour résoudre problème de clics multiples
+    Récupère les courses - CACHE versionné : jamais périmé après une écriture
+    (chaque écriture sur courses/users invalide les résultats en cache)
     
     OPTIMISATION: Requête SQL unique avec filtres combinés
     """
+    date_limite = None
+    if not date_filter:
+        date_limite = (datetime.now(TIMEZONE) - timedelta(days=days_back)).date()
+    return _fetch_courses(chauffeur_id, date_filter, role, date_limite, limit)
+
+
+@versioned_cache('courses', 'users')
+def _fetch_courses(chauffeur_id, date_filter, role, date_limite, limit):
+    """Requête de get_courses - la date limite fait partie de la clé de cache"""
     conn = get_db_connection()
     if not conn:
-        return []
+        raise NoCache([])
     
-    cursor = conn.cursor()
+    # Curseur tuple : chaque ligne devient directement un Course (course.py)
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
     
     # Construction optimisée de la requête avec tous les filtres en une fois
     query = '''
@@ -589,13 +971,16 @@ def get_courses(chauffeur_id=None, date_filter=None, role=None, days_back=30, li
     params = []
     
     # LAZY LOADING: Par défaut seulement les N derniers jours
+    # Plages [début, fin[ en heure de Paris (élagage des partitions) + même
+    # borne sur le jour du planning (index idx_courses_jour_heure_pec)
     if date_filter:
-        query += ' AND DATE(c.heure_prevue) = %s'
-        params.append(date_filter)
+        debut, fin = get_paris_day_range(date_filter)
+        query += f' AND c.heure_prevue >= %s AND c.heure_prevue < %s AND {COURSES_PLANNING_DAY} = %s::date'
+        params.extend([debut, fin, debut.date()])
     else:
-        date_limite = (datetime.now(TIMEZONE) - timedelta(days=days_back)).date()
-        query += ' AND DATE(c.heure_prevue) >= %s'
-        params.append(date_limite)
+        debut, _ = get_paris_day_range(date_limite)
+        query += f' AND c.heure_prevue >= %s AND {COURSES_PLANNING_DAY} >= %s::date'
+        params.extend([debut, debut.date()])
     
     if chauffeur_id:
         query += ' AND c.chauffeur_id = %s'
@@ -604,78 +989,342 @@ def get_courses(chauffeur_id=None, date_filter=None, role=None, days_back=30, li
     if role == 'chauffeur':
         query += ' AND c.visible_chauffeur = true'
     
-    # OPTIMISATION: Tri chronologique par DATE puis HEURE
-    query += ''' 
-        ORDER BY 
-            DATE(c.heure_prevue) ASC,
-            COALESCE(
-                c.heure_pec_prevue::time,
-                (c.heure_prevue AT TIME ZONE 'Europe/Paris')::time
-            ) ASC
-    '''
+    # Tri chronologique par DATE puis HEURE PEC (index idx_courses_jour_heure_pec)
+    query += f' ORDER BY {COURSES_PLANNING_ORDER}'
     
     # LIMIT SQL
     query += f' LIMIT {limit}'
     
     cursor.execute(query, params)
-    courses = cursor.fetchall()
+    courses = courses_from_cursor(cursor)
+    release_db_connection(conn)
+    
+    return courses
+
+
+# ============================================
+# PLANNING SEMAINE - UNE SEULE REQUÊTE
+# ============================================
+
+@versioned_cache('courses', 'users', maxsize=16)
+def get_week_courses(week_start_date):
+    """
+    Récupère toutes les courses d'une semaine en UNE requête (plage heure_prevue)
+    
+    Retourne un index en mémoire partagé par la grille, la distribution et l'archivage :
+        {
+            'week_start': date,
+            'courses': [...],                 # toutes les courses, ordre chronologique
+            'by_day': [[...], ... x7],        # index par day_offset (0 = lundi)
+            'by_chauffeur': {id: [...]},      # index par chauffeur_id
+            'grid': {(day_offset, heure): [...]},  # cases de la grille (planning.py)
+            'day_plans': [{chauffeur_id: [...]}, ... x7]  # plan de chaque jour (planning.py)
+        }
+    """
+    week = {
+        'week_start': week_start_date,
+        'courses': [],
+        'by_day': [[] for _ in range(7)],
+        'by_chauffeur': {},
+        'grid': {},
+        'day_plans': []
+    }
+    
+    conn = get_db_connection()
+    if not conn:
+        raise NoCache(week)
+    
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    debut, fin = get_paris_day_range(week_start_date, week_start_date + timedelta(days=6))
+    
+    cursor.execute('''
+        SELECT c.*, u.full_name as chauffeur_name
+        FROM courses c
+        JOIN users u ON c.chauffeur_id = u.id
+        WHERE c.heure_prevue >= %s AND c.heure_prevue < %s
+        AND ''' + COURSES_PLANNING_DAY + ''' BETWEEN %s::date AND %s::date
+        ORDER BY ''' + COURSES_PLANNING_ORDER, (debut, fin, week_start_date, week_start_date + timedelta(days=6)))
+    courses = courses_from_cursor(cursor)
     release_db_connection(conn)
     
-    # Conversion optimisée avec gestion des champs optionnels
-    result = []
     for course in courses:
-        result.append({
-            'id': course['id'],
-            'chauffeur_id': course['chauffeur_id'],
-            'nom_client': course['nom_client'],
-            'telephone_client': course['telephone_client'],
-            'adresse_pec': course['adresse_pec'],
-            'lieu_depose': course['lieu_depose'],
-            'heure_prevue': course['heure_prevue'],
-            'heure_pec_prevue': course.get('heure_pec_prevue'),
-            'temps_trajet_minutes': course.get('temps_trajet_minutes'),
-            'heure_depart_calculee': course.get('heure_depart_calculee'),
-            'type_course': course['type_course'],
-            'tarif_estime': course['tarif_estime'],
-            'km_estime': course['km_estime'],
-            'commentaire': course['commentaire'],
-            'commentaire_chauffeur': course.get('commentaire_chauffeur'),
-            'statut': course['statut'],
-            'date_creation': course['date_creation'],
-            'date_confirmation': course.get('date_confirmation'),
-            'date_pec': course.get('date_pec'),
-            'date_depose': course.get('date_depose'),
-            'created_by': course['created_by'],
-            'client_regulier_id': course.get('client_regulier_id'),
-            'chauffeur_name': course['chauffeur_name'],
-            'visible_chauffeur': course.get('visible_chauffeur', True)
-        })
+        day_offset = (course.date_paris - week_start_date).days
+        if not 0 <= day_offset < 7:
+            continue
+        course.day_offset = day_offset
+        week['courses'].append(course)
+        week['by_day'][day_offset].append(course)
+        week['by_chauffeur'].setdefault(course['chauffeur_id'], []).append(course)
+    
+    week['grid'] = build_week_grid(week['courses'])
+    week['day_plans'] = [build_day_plan(courses_jour) for courses_jour in week['by_day']]
+    return week
+
+
+def get_day_plan(date_str):
+    """
+    Planning d'une journée regroupé par chauffeur (planning.build_day_plan)
+    
+    Args:
+        date_str (str): Date 'YYYY-MM-DD'
+    
+    Returns:
+        dict: {chauffeur_id: [courses triées]}
+    """
+    return build_day_plan(get_courses(date_filter=date_str))
+
+
+# ============================================
+# FLUX DE CHANGEMENTS - SYNCHRONISATION INCRÉMENTALE
+# ============================================
+
+def get_change_cursor():
+    """Position courante du flux de changements (plus grand change_seq validé)"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT GREATEST(
+            (SELECT COALESCE(MAX(change_seq), 0) FROM courses),
+            (SELECT COALESCE(MAX(change_seq), 0) FROM courses_deleted)
+        )
+    ''')
+    position = get_scalar_result(cursor)
+    release_db_connection(conn)
+    return position
+
+
+def get_course_changes(since_cursor, chauffeur_id):
+    """
+    Courses d'un chauffeur insérées / modifiées / supprimées depuis since_cursor
+    (index (chauffeur_id, change_seq), migrations/0014)
+    
+    Une course réattribuée à un autre chauffeur arrive dans deleted_ids
+    (tombstone au nom de l'ancien chauffeur).
+    
+    Returns:
+        dict: {
+            'cursor': int,          # à repasser au prochain appel
+            'upserts': [course],    # état courant des courses modifiées du chauffeur
+            'deleted_ids': [int]    # courses supprimées ou retirées au chauffeur
+        }
+        ou None si la base est indisponible
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    cursor.execute('''
+        SELECT c.*, u.full_name as chauffeur_name
+        FROM courses c
+        JOIN users u ON c.chauffeur_id = u.id
+        WHERE c.chauffeur_id = %s AND c.change_seq > %s
+        ORDER BY c.change_seq
+    ''', (chauffeur_id, since_cursor))
+    courses = courses_from_cursor(cursor)
+    
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT course_id, change_seq
+        FROM courses_deleted
+        WHERE chauffeur_id = %s AND change_seq > %s
+        ORDER BY change_seq
+    ''', (chauffeur_id, since_cursor))
+    deleted = cursor.fetchall()
+    release_db_connection(conn)
+    
+    new_cursor = since_cursor
+    for course in courses:
+        new_cursor = max(new_cursor, course.change_seq)
+    for row in deleted:
+        new_cursor = max(new_cursor, row['change_seq'])
+    
+    # Une course dont la date change de mois passe d'une partition à l'autre
+    # (DELETE + INSERT), une course réattribuée puis rendue au chauffeur :
+    # elles laissent un tombstone mais existent toujours
+    present_ids = {course.id for course in courses}
+    
+    return {
+        'cursor': new_cursor,
+        'upserts': courses,
+        'deleted_ids': [row['course_id'] for row in deleted if row['course_id'] not in present_ids]
+    }
+
+
+def apply_course_changes(courses_by_id, changes, keep):
+    """
+    Fusionne un delta dans un ensemble de courses en mémoire {id: course}
+    keep(course) décide si une course modifiée appartient (encore) à l'ensemble
+    """
+    for course in changes['upserts']:
+        if keep(course):
+            courses_by_id[course['id']] = course
+        else:
+            courses_by_id.pop(course['id'], None)
+    for course_id in changes['deleted_ids']:
+        courses_by_id.pop(course_id, None)
+
+
+# Resynchronisation complète de sécurité
+FULL_SYNC_INTERVAL_SECONDS = 30 * 60
+
+
+def sync_chauffeur_courses(chauffeur_id, days_back=30):
+    """
+    Courses visibles d'un chauffeur (depuis J-days_back), maintenues dans
+    st.session_state par deltas : seul ce qui a changé depuis le dernier
+    curseur est téléchargé.
+    
+    Returns:
+        list: courses triées (date puis heure PEC)
+    """
+    date_limite = (datetime.now(TIMEZONE) - timedelta(days=days_back)).date()
+    debut, _ = get_paris_day_range(date_limite)
+    now = datetime.now().timestamp()
+    state = st.session_state.get('courses_sync')
+    
+    def keep(course):
+        return (course['chauffeur_id'] == chauffeur_id
+                and course.get('visible_chauffeur', True)
+                and course.heure_paris >= debut)
+    
+    full_sync = (
+        not state
+        or state['chauffeur_id'] != chauffeur_id
+        or state['date_limite'] != date_limite
+        or now - state['synced_at'] >= FULL_SYNC_INTERVAL_SECONDS
+    )
+    
+    if not full_sync:
+        changes = get_course_changes(state['cursor'], chauffeur_id)
+        if changes is None:
+            return state['sorted']
+        if changes['upserts'] or changes['deleted_ids']:
+            apply_course_changes(state['courses'], changes, keep)
+            state['sorted'] = sorted(state['courses'].values(), key=lambda course: course.sort_key)
+        state['cursor'] = changes['cursor']
+        return state['sorted']
+    
+    # Curseur lu AVANT le chargement complet : les changements concurrents seront rejoués
+    position = get_change_cursor()
+    if position is None:
+        return state['sorted'] if state else []
+    
+    courses = get_courses(chauffeur_id=chauffeur_id, role='chauffeur', days_back=days_back, limit=10000)
+    courses_by_id = {c['id']: c for c in courses}
+    state = {
+        'chauffeur_id': chauffeur_id,
+        'date_limite': date_limite,
+        'cursor': position,
+        'synced_at': now,
+        'courses': courses_by_id,
+        'sorted': sorted(courses_by_id.values(), key=lambda course: course.sort_key)
+    }
+    st.session_state['courses_sync'] = state
+    return state['sorted']
+
+
+# ============================================
+# STATISTIQUES (table d'agrégats daily_stats)
+# ============================================
+
+@versioned_cache('courses')
+def get_course_stats():
+    """
+    Indicateurs globaux en UNE requête sur daily_stats (agrégats par jour,
+    chauffeur, statut et type maintenus par trigger - migrations/0007)
+    
+    Returns:
+        dict: {'total_courses', 'courses_terminees', 'courses_en_cours', 'ca_total'}
+        ou None si la base est indisponible
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise NoCache(None)
+    
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            COALESCE(SUM(nb_courses), 0) AS total_courses,
+            COALESCE(SUM(nb_courses) FILTER (WHERE statut = 'deposee'), 0) AS courses_terminees,
+            COALESCE(SUM(nb_courses) FILTER (WHERE statut IN ('nouvelle', 'confirmee', 'pec')), 0) AS courses_en_cours,
+            COALESCE(SUM(ca) FILTER (WHERE statut = 'deposee'), 0) AS ca_total
+        FROM daily_stats
+    ''')
+    stats = dict(cursor.fetchone())
+    release_db_connection(conn)
+    return stats
+
+
+@versioned_cache('courses', 'users', maxsize=32)
+def get_analytics(date_debut, date_fin):
+    """
+    Indicateurs par chauffeur / semaine / type de course sur une période
+    (voir analytics.py) - en cache par période et version des données
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise NoCache(None)
     
-    return result
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT s.jour, s.chauffeur_id, u.full_name AS chauffeur, s.statut, s.type_course,
+               s.nb_courses, s.ca, s.km
+        FROM daily_stats s
+        JOIN users u ON s.chauffeur_id = u.id
+        WHERE s.jour >= %s AND s.jour <= %s
+    ''', (date_debut, date_fin))
+    rows = cursor.fetchall()
+    release_db_connection(conn)
+    
+    return compute_analytics(rows)
 
 
 # ============================================
 # DISTRIBUTION DES COURSES
 # ============================================
 
-def distribute_courses_for_date(date_str):
-    """Rend visibles toutes les courses non distribuées pour une date donnée"""
+def distribute_courses_for_date(date_str, notify=True):
+    """
+    Rend visibles toutes les courses non distribuées pour une date donnée
+    et notifie les chauffeurs concernés (même transaction, une seule insertion)
+    """
     try:
         conn = get_db_connection()
         if not conn:
             return {'success': False, 'count': 0, 'message': "Erreur de connexion"}
         
         cursor = conn.cursor()
+        debut, fin = get_paris_day_range(date_str)
         
         cursor.execute('''
             UPDATE courses
             SET visible_chauffeur = true
-            WHERE DATE(heure_prevue AT TIME ZONE 'Europe/Paris') = %s
+            WHERE heure_prevue >= %s AND heure_prevue < %s
             AND visible_chauffeur = false
-        ''', (date_str,))
+            RETURNING id, chauffeur_id, nom_client, heure_prevue, heure_pec_prevue,
+                      adresse_pec, lieu_depose
+        ''', (debut, fin))
+        distributed = cursor.fetchall()
+        count = len(distributed)
+        
+        if notify and distributed:
+            insert_notifications(cursor, [
+                (
+                    course['chauffeur_id'], course['id'],
+                    f"🆕 Nouvelle course : {course['nom_client']}\n"
+                    f"⏰ {normalize_heure_pec(course['heure_pec_prevue']) or extract_time_str(course['heure_prevue'])}\n"
+                    f"📍 {course['adresse_pec']} → {course['lieu_depose']}",
+                    'nouvelle_course'
+                )
+                for course in distributed
+            ])
         
-        count = cursor.rowcount
         conn.commit()
+        bump_version('courses', 'notifications')
         release_db_connection(conn)
         
         return {
@@ -695,119 +1344,189 @@ def distribute_courses_for_date(date_str):
 # EXPORT ET ARCHIVAGE
 # ============================================
 
-def export_week_to_excel(week_start_date):
-    """Exporte toutes les courses d'une semaine en Excel"""
+def export_courses_csv(date_debut, date_fin):
+    """
+    Exporte les courses d'une période en CSV, en flux (COPY ... TO STDOUT) :
+    aucune liste ni DataFrame en mémoire, seulement le fichier produit.
+    
+    Returns:
+        dict: {'success', 'csv_data' (BytesIO), 'count'} ou {'success': False, 'error'}
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Erreur de connexion'}
+    
+    query = '''
+        SELECT 
+            c.id,
+            c.heure_prevue as "Date/Heure",
+            u.full_name as "Chauffeur",
+            c.nom_client as "Client",
+            c.telephone_client as "Téléphone",
+            c.adresse_pec as "Adresse PEC",
+            c.lieu_depose as "Lieu dépose",
+            c.type_course as "Type",
+            c.tarif_estime as "Tarif",
+            c.km_estime as "Km",
+            c.statut as "Statut",
+            c.date_confirmation as "Date confirmation",
+            c.date_pec as "Date PEC",
+            c.date_depose as "Date dépose"
+        FROM courses c
+        JOIN users u ON c.chauffeur_id = u.id
+        WHERE c.heure_prevue >= %s AND c.heure_prevue < %s
+        ORDER BY c.heure_prevue
+    '''
+    debut, fin = get_paris_day_range(date_debut, date_fin)
+    
     try:
-        from io import BytesIO
-        from openpyxl.styles import Font, PatternFill, Alignment
-        
-        conn = get_db_connection()
-        if not conn:
-            return {'success': False, 'error': 'Erreur de connexion'}
-        
-        cursor = conn.cursor()
-        
-        week_end_date = week_start_date + timedelta(days=6)
-        
-        cursor.execute('''
-            SELECT 
-                u.full_name,
-                c.nom_client,
-                c.telephone_client,
-                c.adresse_pec,
-                c.lieu_depose,
-                c.heure_prevue,
-                c.heure_pec_prevue,
-                c.type_course,
-                c.tarif_estime,
-                c.km_estime,
-                c.statut,
-                c.commentaire,
-                c.commentaire_chauffeur,
-                c.date_confirmation,
-                c.date_pec,
-                c.date_depose
+        csv_data, count = copy_query_to_csv(conn.cursor(), query, (debut, fin))
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        release_db_connection(conn)
+        return {'success': False, 'error': f"Erreur d'export : {e}"}
+    
+    release_db_connection(conn)
+    return {'success': True, 'csv_data': csv_data, 'count': count}
+
+
+# Colonnes des exports Excel : (en-tête, expression SQL)
+# Les dates sont formatées par PostgreSQL (to_char, heure de Paris)
+EXCEL_EXPORT_COLUMNS = [
+    ('Chauffeur', "u.full_name"),
+    ('Client', "c.nom_client"),
+    ('Téléphone', "c.telephone_client"),
+    ('Adresse PEC', "c.adresse_pec"),
+    ('Lieu dépose', "c.lieu_depose"),
+    ('Date/Heure', "to_char(c.heure_prevue, 'DD/MM/YYYY HH24:MI')"),
+    ('Heure PEC', "to_char(c.heure_pec_prevue, 'HH24:MI')"),
+    ('Type', "c.type_course"),
+    ('Tarif (€)', "c.tarif_estime"),
+    ('Km', "c.km_estime"),
+    ('Statut', "c.statut"),
+    ('Commentaire secrétaire', "c.commentaire"),
+    ('Commentaire chauffeur', "c.commentaire_chauffeur"),
+    ('Date confirmation', "to_char(c.date_confirmation, 'DD/MM/YYYY HH24:MI')"),
+    ('Date PEC réelle', "to_char(c.date_pec, 'DD/MM/YYYY HH24:MI')"),
+    ('Date dépose', "to_char(c.date_depose, 'DD/MM/YYYY HH24:MI')")
+]
+
+# Découpage en feuilles : clé -> (nom de feuille, ordre des feuilles)
+EXCEL_EXPORT_SPLITS = {
+    None: ("'Courses'", "1"),
+    'jour': (
+        "to_char(c.heure_prevue, 'DD-MM-YYYY')",
+        "(c.heure_prevue AT TIME ZONE 'Europe/Paris')::date"
+    ),
+    'chauffeur': ("u.full_name", "u.full_name")
+}
+
+
+def export_courses_to_excel(date_debut, date_fin, split_by=None):
+    """
+    Exporte les courses d'une période en Excel, en flux :
+    curseur serveur -> classeur openpyxl write-only, une ligne à la fois.
+    
+    Les largeurs de colonnes sont calculées par la même requête
+    (MAX(length) par feuille, fonction fenêtre) : une seule lecture des données.
+    
+    Args:
+        date_debut, date_fin: Bornes incluses (jours, heure de Paris)
+        split_by: None (une feuille), 'jour' ou 'chauffeur'
+    
+    Returns:
+        dict: {'success', 'excel_data' (bytes), 'count', 'sheets'} ou {'success': False, 'error'}
+    """
+    if split_by not in EXCEL_EXPORT_SPLITS:
+        return {'success': False, 'error': f"Découpage inconnu : {split_by}"}
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Erreur de connexion'}
+    
+    sheet_expr, sheet_order = EXCEL_EXPORT_SPLITS[split_by]
+    values_sql = ",\n                ".join(
+        f"{expr} AS col{i}" for i, (_, expr) in enumerate(EXCEL_EXPORT_COLUMNS)
+    )
+    widths_sql = ",\n                ".join(
+        f"MAX(length(col{i}::text)) OVER feuille" for i in range(len(EXCEL_EXPORT_COLUMNS))
+    )
+    query = f'''
+        WITH export AS (
+            SELECT
+                {sheet_expr} AS feuille,
+                {sheet_order} AS ordre_feuille,
+                c.heure_prevue AS tri,
+                c.id,
+                {values_sql}
             FROM courses c
             JOIN users u ON c.chauffeur_id = u.id
-            WHERE c.heure_prevue >= %s AND c.heure_prevue < %s + INTERVAL '1 day'
-            ORDER BY c.heure_prevue
-        ''', (week_start_date, week_end_date))
+            WHERE c.heure_prevue >= %s AND c.heure_prevue < %s
+        )
+        SELECT *,
+            ARRAY[
+                {widths_sql}
+            ] AS largeurs
+        FROM export
+        WINDOW feuille AS (PARTITION BY feuille)
+        ORDER BY ordre_feuille, feuille, tri, id
+    '''
+    debut, fin = get_paris_day_range(date_debut, date_fin)
+    headers = [header for header, _ in EXCEL_EXPORT_COLUMNS]
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET LOCAL TimeZone = %s", (EXPORT_TIMEZONE,))
         
-        rows = cursor.fetchall()
-        release_db_connection(conn)
+        # Curseur serveur : les lignes arrivent par paquets, jamais toutes en mémoire
+        server_cursor = conn.cursor(name='export_courses_excel')
+        server_cursor.itersize = SERVER_CURSOR_ITERSIZE
+        server_cursor.execute(query, (debut, fin))
         
-        if not rows or len(rows) == 0:
-            return {
-                'success': False,
-                'error': f'Aucune course trouvée pour la semaine du {week_start_date.strftime("%d/%m/%Y")} au {week_end_date.strftime("%d/%m/%Y")}'
-            }
+        rows = (
+            (row['feuille'], row['largeurs'], [row[f'col{i}'] for i in range(len(headers))])
+            for row in server_cursor
+        )
+        buffer, count, sheets = rows_to_xlsx(rows, headers)
+        server_cursor.close()
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        release_db_connection(conn)
+        return {'success': False, 'error': f"Erreur d'export : {e}"}
+    
+    release_db_connection(conn)
+    
+    if not count:
+        return {
+            'success': False,
+            'error': f'Aucune course trouvée du {date_debut.strftime("%d/%m/%Y")} au {date_fin.strftime("%d/%m/%Y")}'
+        }
+    
+    return {
+        'success': True,
+        'excel_data': buffer.getvalue(),
+        'count': count,
+        'sheets': sheets
+    }
+
+
+def export_week_to_excel(week_start_date):
+    """Exporte toutes les courses d'une semaine en Excel"""
+    try:
+        week_end_date = week_start_date + timedelta(days=6)
+        result = export_courses_to_excel(week_start_date, week_end_date)
         
-        # Créer le DataFrame
-        data = []
-        for row in rows:
-            data.append({
-                'Chauffeur': row['full_name'],
-                'Client': row['nom_client'],
-                'Téléphone': row['telephone_client'],
-                'Adresse PEC': row['adresse_pec'],
-                'Lieu dépose': row['lieu_depose'],
-                'Date/Heure': row['heure_prevue'],
-                'Heure PEC': row['heure_pec_prevue'],
-                'Type': row['type_course'],
-                'Tarif (€)': row['tarif_estime'],
-                'Km': row['km_estime'],
-                'Statut': row['statut'],
-                'Commentaire secrétaire': row['commentaire'],
-                'Commentaire chauffeur': row['commentaire_chauffeur'],
-                'Date confirmation': row['date_confirmation'],
-                'Date PEC réelle': row['date_pec'],
-                'Date dépose': row['date_depose']
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # Formater les dates
-        date_columns = ['Date/Heure', 'Date confirmation', 'Date PEC réelle', 'Date dépose']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%d/%m/%Y %H:%M')
-        
-        # Créer le fichier Excel
-        buffer = BytesIO()
-        
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Courses')
-            
-            worksheet = writer.sheets['Courses']
-            
-            # Formater les en-têtes
-            for cell in worksheet[1]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Ajuster largeur colonnes
-            for i, col in enumerate(df.columns):
-                max_length = max(
-                    df[col].astype(str).apply(len).max(),
-                    len(col)
-                ) + 2
-                col_letter = chr(65 + i)
-                worksheet.column_dimensions[col_letter].width = min(max_length, 50)
-        
-        buffer.seek(0)
-        excel_data = buffer.getvalue()
+        if not result['success']:
+            if result['error'].startswith('Aucune course'):
+                result['error'] = f'Aucune course trouvée pour la semaine du {week_start_date.strftime("%d/%m/%Y")} au {week_end_date.strftime("%d/%m/%Y")}'
+            return result
         
         week_number = week_start_date.isocalendar()[1]
         year = week_start_date.year
-        filename = f"semaine_{week_number:02d}_{year}.xlsx"
-        
-        return {
-            'success': True,
-            'excel_data': excel_data,
-            'count': len(df),
-            'filename': filename
-        }
+        result['filename'] = f"semaine_{week_number:02d}_{year}.xlsx"
+        return result
         
     except Exception as e:
         return {
@@ -816,8 +1535,16 @@ def export_week_to_excel(week_start_date):
         }
 
 
+# Courses déplacées dans l'archive par transaction (purge_week_courses)
+ARCHIVE_BATCH_SIZE = 200
+
+
 def purge_week_courses(week_start_date):
-    """Supprime TOUTES les courses de la semaine"""
+    """
+    Retire TOUTES les courses de la semaine du planning en les déplaçant
+    dans l'archive (courses_archive) : DELETE ... RETURNING -> INSERT par
+    lots de ARCHIVE_BATCH_SIZE courses
+    """
     try:
         conn = get_db_connection()
         if not conn:
@@ -826,26 +1553,19 @@ def purge_week_courses(week_start_date):
         cursor = conn.cursor()
         
         week_end_date = week_start_date + timedelta(days=6)
-        
-        # Récupérer les IDs puis supprimer
-        cursor.execute('''
-            SELECT id FROM courses
-            WHERE heure_prevue >= %s AND heure_prevue < %s + INTERVAL '1 day'
-        ''', (week_start_date, week_end_date))
-        
-        course_ids = [row['id'] for row in cursor.fetchall()]
-        
-        if not course_ids:
-            release_db_connection(conn)
-            return {'success': True, 'count': 0}
-        
-        cursor.execute('''
-            DELETE FROM courses
-            WHERE id = ANY(%s)
-        ''', (course_ids,))
-        
-        count = cursor.rowcount
-        conn.commit()
+        debut, fin = get_paris_day_range(week_start_date, week_end_date)
+        
+        # Un commit par lot : le verrou du flux de changements (migrations/0005)
+        # n'est jamais tenu longtemps, les autres écritures passent entre deux lots
+        count = 0
+        while True:
+            cursor.execute('SELECT archive_courses(%s, %s, %s)', (debut, fin, ARCHIVE_BATCH_SIZE))
+            batch = get_scalar_result(cursor) or 0
+            conn.commit()
+            count += batch
+            if batch < ARCHIVE_BATCH_SIZE:
+                break
+        bump_version('courses')
         release_db_connection(conn)
         
         return {'success': True, 'count': count}
@@ -854,6 +1574,62 @@ def purge_week_courses(week_start_date):
         return {'success': False, 'error': str(e)}
 
 
+@versioned_cache('courses', maxsize=32)
+def search_archived_courses(nom_client=None, date_debut=None, date_fin=None, chauffeur_id=None, limit=500):
+    """
+    Recherche dans l'archive des courses (semaines purgées)
+    
+    Args:
+        nom_client: Début ou partie du nom du client (insensible à la casse)
+        date_debut, date_fin: Bornes incluses (jours, heure de Paris) -
+            seules les partitions annuelles concernées sont lues
+        chauffeur_id: Chauffeur de la course
+        limit: Nombre maximum de résultats
+    
+    Returns:
+        list: courses archivées (dicts), les plus récentes d'abord
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise NoCache([])
+    
+    query = '''
+        SELECT id, heure_prevue, to_char(heure_pec_prevue, 'HH24:MI') AS heure_pec_prevue,
+               chauffeur_id, chauffeur_name, nom_client, telephone_client, adresse_pec, lieu_depose,
+               type_course, tarif_estime, km_estime, statut, commentaire, archived_at
+        FROM courses_archive
+        WHERE 1=1
+    '''
+    params = []
+    
+    if nom_client:
+        # Préfixe : servi par l'index lower(nom_client) text_pattern_ops
+        query += " AND lower(nom_client) LIKE %s"
+        pattern = nom_client.strip().lower()
+        for special in ('\\', '%', '_'):
+            pattern = pattern.replace(special, '\\' + special)
+        params.append(pattern + '%')
+    
+    if date_debut or date_fin:
+        debut, _ = get_paris_day_range(date_debut or date_fin)
+        _, fin = get_paris_day_range(date_fin or date_debut)
+        query += " AND heure_prevue >= %s AND heure_prevue < %s"
+        params.extend([debut, fin])
+    
+    if chauffeur_id:
+        query += " AND chauffeur_id = %s"
+        params.append(chauffeur_id)
+    
+    query += " ORDER BY heure_prevue DESC LIMIT %s"
+    params.append(limit)
+    
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    courses = [dict(row) for row in cursor.fetchall()]
+    release_db_connection(conn)
+    return courses
+
+
 # ============================================
 # MISE À JOUR DES STATUTS - OPTIMISÉE
 # ============================================
@@ -892,6 +1668,7 @@ def update_course_status(course_id, new_status):
         ''', (new_status, course_id))
     
     conn.commit()
+    bump_version('courses')
     release_db_connection(conn)
     return True
 
@@ -911,12 +1688,20 @@ def update_commentaire_chauffeur(course_id, commentaire):
     ''', (commentaire, course_id))
     
     conn.commit()
+    bump_version('courses')
     release_db_connection(conn)
     return True
 
 
 def update_heure_pec_prevue(course_id, nouvelle_heure):
-    """Met à jour l'heure PEC prévue"""
+    """
+    Met à jour l'heure PEC prévue
+    
+    Raises:
+        ValueError: Heure PEC invalide (voir parse_heure_pec)
+    """
+    nouvelle_heure = parse_heure_pec(nouvelle_heure)
+    
     conn = get_db_connection()
     if not conn:
         return False
@@ -930,6 +1715,7 @@ def update_heure_pec_prevue(course_id, nouvelle_heure):
     ''', (nouvelle_heure, course_id))
     
     conn.commit()
+    bump_version('courses')
     release_db_connection(conn)
     return True
 
@@ -948,12 +1734,20 @@ def delete_course(course_id):
     ''', (course_id,))
     
     conn.commit()
+    bump_version('courses')
     release_db_connection(conn)
     return True
 
 
 def update_course_details(course_id, nouvelle_heure_pec, nouveau_chauffeur_id):
-    """Modifie heure PEC et chauffeur"""
+    """
+    Modifie heure PEC et chauffeur
+    
+    Raises:
+        ValueError: Heure PEC invalide (voir parse_heure_pec)
+    """
+    nouvelle_heure_pec = parse_heure_pec(nouvelle_heure_pec)
+    
     conn = get_db_connection()
     if not conn:
         return False
@@ -967,6 +1761,7 @@ def update_course_details(course_id, nouvelle_heure_pec, nouveau_chauffeur_id):
     ''', (nouvelle_heure_pec, nouveau_chauffeur_id, course_id))
     
     conn.commit()
+    bump_version('courses')
     release_db_connection(conn)
     return True
 
@@ -990,6 +1785,7 @@ def create_user(username, password, role, full_name):
             VALUES (%s, %s, %s, %s)
         ''', (username, hashed_password, role, full_name))
         conn.commit()
+        bump_version('users')
         release_db_connection(conn)
         return True
     except psycopg2.IntegrityError:
@@ -1019,6 +1815,7 @@ def delete_user(user_id):
         
         cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
         conn.commit()
+        bump_version('users', 'courses', 'notifications')
         release_db_connection(conn)
         return True, "Utilisateur supprimé avec succès"
     except Exception as e:
@@ -1026,11 +1823,12 @@ def delete_user(user_id):
         return False, f"Erreur: {str(e)}"
 
 
+@versioned_cache('users')
 def get_all_users():
     """Récupère tous les utilisateurs"""
     conn = get_db_connection()
     if not conn:
-        return []
+        raise NoCache([])
     
     cursor = conn.cursor()
     cursor.execute('''
@@ -1045,50 +1843,133 @@ def get_all_users():
 
 def reassign_course_to_driver(course_id, new_chauffeur_id):
     """Réattribue une course à un nouveau chauffeur"""
+    result = reassign_courses_to_driver([course_id], new_chauffeur_id, notify=False)
+    if not result['success']:
+        return result
+    
+    course_result = result['courses'][0]
+    if not course_result['success']:
+        return {'success': False, 'error': course_result['error']}
+    return course_result
+
+
+def reassign_courses_to_driver(course_ids, new_chauffeur_id, notify=True):
+    """
+    Réattribue plusieurs courses en UNE transaction :
+    un seul UPDATE ... WHERE id = ANY(...) RETURNING, puis les notifications
+    des chauffeurs (ancien et nouveau) insérées dans le même lot - seulement
+    pour les courses déjà visibles des chauffeurs (visible_chauffeur).
+    
+    Returns:
+        dict: {
+            'success': bool,
+            'moved': int,
+            'new_chauffeur_name': str,
+            'courses': [{'success', 'course_id', 'nom_client', 'old_chauffeur_id',
+                         'old_chauffeur_name', 'new_chauffeur_id', 'new_chauffeur_name'}
+                        ou {'success': False, 'course_id', 'error'}]
+        }
+    """
+    course_ids = list(dict.fromkeys(int(course_id) for course_id in course_ids))
+    if not course_ids:
+        return {'success': True, 'moved': 0, 'new_chauffeur_name': None, 'courses': []}
+    
     conn = get_db_connection()
     if not conn:
         return {'success': False, 'error': 'Erreur de connexion'}
     
     cursor = conn.cursor()
-    
-    # Récupérer les infos avant modification
-    cursor.execute('''
-        SELECT c.chauffeur_id, c.nom_client, u.full_name 
-        FROM courses c
-        JOIN users u ON c.chauffeur_id = u.id
-        WHERE c.id = %s
-    ''', (course_id,))
-    result = cursor.fetchone()
-    
-    if result:
-        old_chauffeur_id, nom_client, old_chauffeur_name = result['chauffeur_id'], result['nom_client'], result['full_name']
-        
-        # Récupérer le nom du nouveau chauffeur
-        cursor.execute('SELECT full_name FROM users WHERE id = %s', (new_chauffeur_id,))
-        new_chauffeur_name = get_scalar_result(cursor)
-        
-        # Mettre à jour la course
+    try:
         cursor.execute('''
-            UPDATE courses 
-            SET chauffeur_id = %s
-            WHERE id = %s
-        ''', (new_chauffeur_id, course_id))
+            WITH nouveau AS (
+                SELECT id, full_name FROM users WHERE id = %s AND role = 'chauffeur'
+            ),
+            avant AS (
+                SELECT c.id, c.chauffeur_id, u.full_name
+                FROM courses c
+                JOIN users u ON c.chauffeur_id = u.id
+                WHERE c.id = ANY(%s)
+                FOR UPDATE OF c
+            )
+            UPDATE courses c
+            SET chauffeur_id = n.id
+            FROM avant a, nouveau n
+            WHERE c.id = a.id
+            RETURNING c.id, c.nom_client, c.heure_prevue, c.heure_pec_prevue,
+                      c.adresse_pec, c.lieu_depose, c.visible_chauffeur,
+                      a.chauffeur_id AS old_chauffeur_id, a.full_name AS old_chauffeur_name,
+                      n.id AS new_chauffeur_id, n.full_name AS new_chauffeur_name
+        ''', (new_chauffeur_id, course_ids))
+        moved = {row['id']: row for row in cursor.fetchall()}
+        
+        if not moved:
+            # Rien n'a bougé : chauffeur inconnu ou aucune des courses n'existe
+            cursor.execute("SELECT 1 FROM users WHERE id = %s AND role = 'chauffeur'", (new_chauffeur_id,))
+            error = 'Course non trouvée' if cursor.fetchone() else 'Chauffeur non trouvé'
+            conn.rollback()
+            release_db_connection(conn)
+            return {
+                'success': True,
+                'moved': 0,
+                'new_chauffeur_name': None,
+                'courses': [{'success': False, 'course_id': course_id, 'error': error}
+                            for course_id in course_ids]
+            }
+        
+        if notify:
+            notifications = []
+            for row in moved.values():
+                if row['old_chauffeur_id'] == row['new_chauffeur_id']:
+                    continue
+                # Course pas encore distribuée : aucun des deux chauffeurs ne la voit,
+                # distribute_courses_for_date enverra "Nouvelle course" au bon moment
+                if not row['visible_chauffeur']:
+                    continue
+                heure = normalize_heure_pec(row['heure_pec_prevue']) or extract_time_str(row['heure_prevue'])
+                notifications.append((
+                    row['new_chauffeur_id'], row['id'],
+                    f"🔄 Course réattribuée : {row['nom_client']}\n⏰ {heure}\n📍 {row['adresse_pec']} → {row['lieu_depose']}",
+                    'changement_chauffeur'
+                ))
+                notifications.append((
+                    row['old_chauffeur_id'], row['id'],
+                    f"❌ Course retirée : {row['nom_client']} ({heure}) → {row['new_chauffeur_name']}",
+                    'annulation'
+                ))
+            if notifications:
+                insert_notifications(cursor, notifications)
         
         conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
         release_db_connection(conn)
-        
-        return {
+        return {'success': False, 'error': str(e)}
+    
+    bump_version('courses', 'notifications')
+    release_db_connection(conn)
+    
+    results = []
+    for course_id in course_ids:
+        row = moved.get(course_id)
+        if row is None:
+            results.append({'success': False, 'course_id': course_id, 'error': 'Course non trouvée'})
+            continue
+        results.append({
             'success': True,
             'course_id': course_id,
-            'nom_client': nom_client,
-            'old_chauffeur_id': old_chauffeur_id,
-            'old_chauffeur_name': old_chauffeur_name,
-            'new_chauffeur_id': new_chauffeur_id,
-            'new_chauffeur_name': new_chauffeur_name
-        }
-    else:
-        release_db_connection(conn)
-        return {'success': False, 'error': 'Course non trouvée'}
+            'nom_client': row['nom_client'],
+            'old_chauffeur_id': row['old_chauffeur_id'],
+            'old_chauffeur_name': row['old_chauffeur_name'],
+            'new_chauffeur_id': row['new_chauffeur_id'],
+            'new_chauffeur_name': row['new_chauffeur_name']
+        })
+    
+    return {
+        'success': True,
+        'moved': len(moved),
+        'new_chauffeur_name': next(iter(moved.values()))['new_chauffeur_name'],
+        'courses': results
+    }
 
 
 # ============================================
@@ -1133,11 +2014,12 @@ def admin_page():
             st.rerun()
     with col_refresh:
         if st.button("🔄 Actualiser"):
+            invalidate_all()
             st.rerun()
     
     st.markdown("---")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Planning Global", "👥 Gestion des Comptes", "📈 Statistiques", "💾 Export"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Planning Global", "👥 Gestion des Comptes", "📈 Statistiques", "💾 Export", "🗄️ Archives"])
     
     with tab1:
         st.subheader("Planning Global de toutes les courses")
@@ -1190,7 +2072,7 @@ def admin_page():
                 }
                 
                 date_fr = format_date_fr(course['heure_prevue'])
-                heure_affichage = course.get('heure_pec_prevue', extract_time_str(course['heure_prevue']))
+                heure_affichage = course['heure_affichage']
                 titre_course = f"{statut_colors.get(course['statut'], '⚪')} {date_fr} {heure_affichage} - {course['nom_client']} ({course['chauffeur_name']})"
                 
                 with st.expander(titre_course):
@@ -1199,8 +2081,8 @@ def admin_page():
                         st.write(f"**Client :** {course['nom_client']}")
                         st.write(f"**Téléphone :** {course['telephone_client']}")
                         st.write(f"**📅 Date PEC :** {format_date_fr(course['heure_prevue'])}")
-                        if course.get('heure_pec_prevue'):
-                            st.success(f"⏰ **Heure PEC prévue : {course['heure_pec_prevue']}**")
+                        if course['heure_pec']:
+                            st.success(f"⏰ **Heure PEC prévue : {course['heure_pec']}**")
                         st.write(f"**PEC :** {course['adresse_pec']}")
                         st.write(f"**Dépose :** {course['lieu_depose']}")
                         st.write(f"**Type :** {course['type_course']}")
@@ -1273,33 +2155,118 @@ def admin_page():
     with tab3:
         st.subheader("📈 Statistiques")
         
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            
+        stats = get_course_stats()
+        if stats:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                cursor.execute("SELECT COUNT(*) FROM courses")
-                total_courses = get_scalar_result(cursor)
-                st.metric("Total courses", total_courses)
+                st.metric("Total courses", stats['total_courses'])
             
             with col2:
-                cursor.execute("SELECT COUNT(*) FROM courses WHERE statut = 'deposee'")
-                courses_terminees = get_scalar_result(cursor)
-                st.metric("Courses terminées", courses_terminees)
+                st.metric("Courses terminées", stats['courses_terminees'])
             
             with col3:
-                cursor.execute("SELECT COUNT(*) FROM courses WHERE statut IN ('nouvelle', 'confirmee', 'pec')")
-                courses_en_cours = get_scalar_result(cursor)
-                st.metric("Courses en cours", courses_en_cours)
+                st.metric("Courses en cours", stats['courses_en_cours'])
             
             with col4:
-                cursor.execute("SELECT SUM(tarif_estime) FROM courses WHERE statut = 'deposee'")
-                ca_total = get_scalar_result(cursor) or 0
-                st.metric("CA réalisé", f"{ca_total:.2f}€")
+                st.metric("CA réalisé", f"{stats['ca_total']:.2f}€")
+        
+        st.markdown("---")
+        st.markdown("### 📊 Analyse par période")
+        
+        col_debut, col_fin = st.columns(2)
+        with col_debut:
+            analyse_debut = st.date_input("Du", value=datetime.now(TIMEZONE).date() - timedelta(days=90), key="analyse_debut")
+        with col_fin:
+            analyse_fin = st.date_input("Au", value=datetime.now(TIMEZONE).date(), key="analyse_fin")
+        
+        analyse = get_analytics(analyse_debut, analyse_fin) if analyse_debut <= analyse_fin else None
+        if analyse_debut > analyse_fin:
+            st.warning("⚠️ La date de début doit précéder la date de fin")
+        elif analyse and analyse['totaux']['nb_courses']:
+            totaux = analyse['totaux']
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Courses", int(totaux['nb_courses']))
+            with col2:
+                st.metric("Taux de réalisation", f"{totaux['taux_realisation']:.0%}")
+            with col3:
+                st.metric("CA réalisé", f"{totaux['ca_realise']:.2f}€", help=f"CA prévu : {totaux['ca_prevu']:.2f}€")
+            with col4:
+                st.metric("Km réalisés", f"{totaux['km_realises']:.0f} km", help=f"Km prévus : {totaux['km_prevus']:.0f} km")
             
-            release_db_connection(conn)
+            colonnes = {
+                'nb_courses': 'Courses',
+                'terminees': 'Terminées',
+                'taux_realisation': 'Taux réalisation',
+                'ca_prevu': 'CA prévu (€)',
+                'ca_realise': 'CA réalisé (€)',
+                'km_prevus': 'Km prévus',
+                'km_realises': 'Km réalisés'
+            }
+            
+            vue = st.radio("Regrouper par", ["Chauffeur", "Semaine", "Type de course"], horizontal=True, key="analyse_vue")
+            table = {
+                'Chauffeur': analyse['par_chauffeur'],
+                'Semaine': analyse['par_semaine'],
+                'Type de course': analyse['par_type']
+            }[vue]
+            index = table.columns[0]
+            
+            st.dataframe(
+                table.set_index(index).rename(columns=colonnes).style.format({
+                    'Taux réalisation': '{:.0%}',
+                    'CA prévu (€)': '{:.2f}',
+                    'CA réalisé (€)': '{:.2f}',
+                    'Km prévus': '{:.0f}',
+                    'Km réalisés': '{:.0f}'
+                }),
+                use_container_width=True
+            )
+            st.bar_chart(table.set_index(index)[['ca_realise']].rename(columns=colonnes))
+            
+            with st.expander("📅 CA réalisé par chauffeur et par semaine"):
+                # Les DataFrames en cache sont partagés : renommer sans modifier
+                pivot_ca = analyse['ca_chauffeur_semaine'].rename(columns=lambda semaine: semaine.strftime('%d/%m'))
+                st.dataframe(pivot_ca.style.format('{:.2f}'), use_container_width=True)
+            
+            with st.expander("🛣️ Km réalisés par chauffeur et par semaine"):
+                pivot_km = analyse['km_chauffeur_semaine'].rename(columns=lambda semaine: semaine.strftime('%d/%m'))
+                st.dataframe(pivot_km.style.format('{:.0f}'), use_container_width=True)
+        else:
+            st.info("Aucune course sur cette période")
+        
+        pool_stats = get_pool_stats()
+        if pool_stats:
+            with st.expander("⚙️ Pool de connexions"):
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Connexions", f"{pool_stats['in_use']}/{pool_stats['size']} (max {pool_stats['maxconn']})")
+                with col2:
+                    st.metric("Emprunts", pool_stats['checkouts'])
+                with col3:
+                    st.metric("Attente moy.", f"{pool_stats['wait_time_avg'] * 1000:.0f} ms",
+                              help=f"{pool_stats['waits']} emprunt(s) en attente - max {pool_stats['wait_time_max'] * 1000:.0f} ms")
+                with col4:
+                    st.metric("Saturations", pool_stats['exhaustion_events'])
+                st.caption(f"Health checks échoués : {pool_stats['health_check_failures']} | "
+                           f"Connexions ouvertes : {pool_stats['connections_opened']} | fermées : {pool_stats['connections_closed']}")
+        
+        distance_stats = get_distance_cache().stats()
+        with st.expander("🗺️ Cache des distances"):
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Taux de succès", f"{distance_stats['hit_rate']:.0%}")
+            with col2:
+                st.metric("Mémoire", distance_stats['memory_hits'],
+                          help=f"{distance_stats['size']}/{distance_stats['maxsize']} entrées en mémoire")
+            with col3:
+                st.metric("Base partagée", distance_stats['db_hits'])
+            with col4:
+                st.metric("Appels API", distance_stats['misses'])
+            st.caption(f"Trajets introuvables servis par le cache : {distance_stats['negative_hits']} | "
+                       f"Enregistrés : {distance_stats['stores']} | Évictions : {distance_stats['evictions']} | "
+                       f"Erreurs base : {distance_stats['db_errors']}")
     
     with tab4:
         st.subheader("💾 Export des données")
@@ -1309,39 +2276,98 @@ def admin_page():
         export_date_fin = st.date_input("Date de fin", value=datetime.now())
         
         if st.button("Exporter en CSV"):
-            conn = get_db_connection()
-            if conn:
-                query = '''
-                    SELECT 
-                        c.id,
-                        c.heure_prevue as "Date/Heure",
-                        u.full_name as "Chauffeur",
-                        c.nom_client as "Client",
-                        c.telephone_client as "Téléphone",
-                        c.adresse_pec as "Adresse PEC",
-                        c.lieu_depose as "Lieu dépose",
-                        c.type_course as "Type",
-                        c.tarif_estime as "Tarif",
-                        c.km_estime as "Km",
-                        c.statut as "Statut",
-                        c.date_confirmation as "Date confirmation",
-                        c.date_pec as "Date PEC",
-                        c.date_depose as "Date dépose"
-                    FROM courses c
-                    JOIN users u ON c.chauffeur_id = u.id
-                    WHERE DATE(c.heure_prevue) BETWEEN %s AND %s
-                    ORDER BY c.heure_prevue
-                '''
-                df = pd.read_sql_query(query, conn, params=(export_date_debut, export_date_fin))
-                release_db_connection(conn)
-                
-                csv = df.to_csv(index=False).encode('utf-8-sig')
+            result = export_courses_csv(export_date_debut, export_date_fin)
+            if result['success']:
+                if result['count'] is not None:
+                    st.caption(f"{result['count']} course(s) exportée(s)")
                 st.download_button(
                     label="📥 Télécharger le CSV",
-                    data=csv,
+                    data=result['csv_data'],
                     file_name=f"courses_export_{export_date_debut}_{export_date_fin}.csv",
                     mime="text/csv"
                 )
+            else:
+                st.error(f"❌ {result['error']}")
+        
+        st.markdown("---")
+        st.write("Exporter la même période en Excel (une feuille par jour ou par chauffeur)")
+        
+        decoupage = st.radio(
+            "Découpage",
+            ["Une seule feuille", "Une feuille par jour", "Une feuille par chauffeur"],
+            horizontal=True,
+            key="export_excel_decoupage"
+        )
+        
+        if st.button("Exporter en Excel"):
+            split_by = {
+                "Une seule feuille": None,
+                "Une feuille par jour": 'jour',
+                "Une feuille par chauffeur": 'chauffeur'
+            }[decoupage]
+            
+            with st.spinner("📥 Export en cours..."):
+                result = export_courses_to_excel(export_date_debut, export_date_fin, split_by=split_by)
+            
+            if result['success']:
+                st.caption(f"{result['count']} course(s) exportée(s) - {len(result['sheets'])} feuille(s)")
+                st.download_button(
+                    label="📥 Télécharger le fichier Excel",
+                    data=result['excel_data'],
+                    file_name=f"courses_export_{export_date_debut}_{export_date_fin}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+            else:
+                st.error(f"❌ {result['error']}")
+    
+    with tab5:
+        st.subheader("🗄️ Archives")
+        st.write("Courses des semaines retirées du planning")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            archive_client = st.text_input("Client (début du nom)", key="archive_client")
+        with col2:
+            archive_debut = st.date_input("Du", value=datetime.now(TIMEZONE).date() - timedelta(days=365), key="archive_debut")
+        with col3:
+            archive_fin = st.date_input("Au", value=datetime.now(TIMEZONE).date(), key="archive_fin")
+        with col4:
+            chauffeurs = get_chauffeurs()
+            chauffeur_options = {"Tous": None}
+            chauffeur_options.update({ch['full_name']: ch['id'] for ch in chauffeurs})
+            archive_chauffeur = st.selectbox("Chauffeur", list(chauffeur_options.keys()), key="archive_chauffeur")
+        
+        archives = search_archived_courses(
+            nom_client=archive_client or None,
+            date_debut=archive_debut,
+            date_fin=archive_fin,
+            chauffeur_id=chauffeur_options[archive_chauffeur]
+        )
+        
+        if archives:
+            st.caption(f"{len(archives)} course(s) archivée(s)")
+            st.dataframe(
+                [
+                    {
+                        'Date/Heure': to_paris_datetime(course['heure_prevue']).strftime('%d/%m/%Y %H:%M'),
+                        'Heure PEC': course['heure_pec_prevue'],
+                        'Chauffeur': course['chauffeur_name'],
+                        'Client': course['nom_client'],
+                        'Téléphone': course['telephone_client'],
+                        'Adresse PEC': course['adresse_pec'],
+                        'Lieu dépose': course['lieu_depose'],
+                        'Type': course['type_course'],
+                        'Tarif (€)': course['tarif_estime'],
+                        'Km': course['km_estime'],
+                        'Statut': course['statut']
+                    }
+                    for course in archives
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Aucune course archivée pour ces critères")
 
 
 def secretaire_page():
@@ -1358,6 +2384,7 @@ def secretaire_page():
             st.rerun()
     with col_refresh:
         if st.button("🔄 Actualiser"):
+            invalidate_all()
             st.rerun()
     
     st.markdown("---")
@@ -1420,7 +2447,7 @@ def secretaire_page():
             
             client_selectionne = None
             if search_client and len(search_client) >= 2:
-                clients_trouves = get_clients_reguliers(search_client)
+                clients_trouves = search_clients_reguliers(search_client)
                 if clients_trouves:
                     with col_search2:
                         st.write("")
@@ -1471,7 +2498,7 @@ def secretaire_page():
                         default_type = course_dupliquee['type_course']
                         default_tarif = course_dupliquee['tarif_estime']
                         default_km = course_dupliquee['km_estime']
-                        default_heure_pec = course_dupliquee.get('heure_pec_prevue', '')
+                        default_heure_pec = normalize_heure_pec(course_dupliquee.get('heure_pec_prevue')) or ''
                     elif client_selectionne:
                         default_type = client_selectionne['type_course_habituel']
                         default_tarif = client_selectionne['tarif_habituel']
@@ -1499,7 +2526,16 @@ def secretaire_page():
                 submitted = st.form_submit_button("✅ Créer la course", use_container_width=True)
                 
                 if submitted:
-                    if nom_client and adresse_pec and lieu_depose and selected_chauffeur:
+                    # Validée avant toute écriture (client régulier compris)
+                    heure_pec_erreur = None
+                    try:
+                        heure_pec = parse_heure_pec(heure_pec_prevue)
+                    except ValueError as e:
+                        heure_pec_erreur = str(e)
+                    
+                    if heure_pec_erreur:
+                        st.error(f"❌ {heure_pec_erreur}")
+                    elif nom_client and adresse_pec and lieu_depose and selected_chauffeur:
                         chauffeur_id = None
                         for c in chauffeurs:
                             if c['full_name'] == selected_chauffeur:
@@ -1533,7 +2569,7 @@ def secretaire_page():
                                 'adresse_pec': adresse_pec,
                                 'lieu_depose': lieu_depose,
                                 'heure_prevue': heure_prevue,
-                                'heure_pec_prevue': heure_pec_prevue if heure_pec_prevue else None,
+                                'heure_pec_prevue': heure_pec,
                                 'type_course': type_course,
                                 'tarif_estime': tarif_estime,
                                 'km_estime': km_estime,
@@ -1555,7 +2591,7 @@ def secretaire_page():
                                     "nom_client": nom_client,
                                     "adresse_pec": adresse_pec,
                                     "lieu_depose": lieu_depose,
-                                    "heure_pec": heure_pec_prevue if heure_pec_prevue else "N/A",
+                                    "heure_pec": normalize_heure_pec(heure_pec) or "N/A",
                                     "tarif": tarif_estime,
                                     "km": km_estime
                                 }
@@ -1619,7 +2655,7 @@ def secretaire_page():
                 }
                 
                 date_fr = format_date_fr(course['heure_prevue'])
-                heure_affichage = course.get('heure_pec_prevue', extract_time_str(course['heure_prevue']))
+                heure_affichage = course['heure_affichage']
                 titre = f"{statut_colors.get(course['statut'], '⚪')} {date_fr} {heure_affichage} - {course['nom_client']} ({course['chauffeur_name']})"
                 
                 with st.expander(titre):
@@ -1674,7 +2710,7 @@ def secretaire_page():
                         
                         chauffeurs_list = get_chauffeurs()
                         
-                        heure_actuelle = course.get('heure_pec_prevue', '')
+                        heure_actuelle = course['heure_pec'] or ''
                         nouvelle_heure_pec = st.text_input(
                             "Heure PEC (HH:MM)",
                             value=heure_actuelle,
@@ -1698,29 +2734,11 @@ def secretaire_page():
                         col_save, col_cancel = st.columns(2)
                         with col_save:
                             if st.button("💾 Enregistrer", key=f"save_mod_{course['id']}", use_container_width=True):
-                                heure_valide = True
-                                nouvelle_heure_normalisee = None
-                                
-                                if nouvelle_heure_pec:
-                                    parts = nouvelle_heure_pec.split(':')
-                                    if len(parts) == 2:
-                                        try:
-                                            h = int(parts[0])
-                                            m = int(parts[1])
-                                            if 0 <= h <= 23 and 0 <= m <= 59:
-                                                nouvelle_heure_normalisee = f"{h:02d}:{m:02d}"
-                                            else:
-                                                st.error("❌ Heure invalide")
-                                                heure_valide = False
-                                        except ValueError:
-                                            st.error("❌ Format invalide")
-                                            heure_valide = False
-                                    else:
-                                        st.error("❌ Format invalide")
-                                        heure_valide = False
-                                
-                                if heure_valide:
-                                    update_course_details(course['id'], nouvelle_heure_normalisee, nouveau_chauffeur['id'])
+                                try:
+                                    update_course_details(course['id'], nouvelle_heure_pec, nouveau_chauffeur['id'])
+                                except ValueError as e:
+                                    st.error(f"❌ {e}")
+                                else:
                                     del st.session_state[f'modifier_course_{course["id"]}']
                                     st.rerun()
                         
@@ -1764,14 +2782,9 @@ def secretaire_page():
                 st.session_state.week_start_date = st.session_state.week_start_date + timedelta(days=7)
                 st.rerun()
         
-        # Récupérer toutes les courses de la semaine
-        week_courses = []
-        for day_offset in range(7):
-            day_date = st.session_state.week_start_date + timedelta(days=day_offset)
-            day_courses = get_courses(date_filter=day_date.strftime('%Y-%m-%d'))
-            for course in day_courses:
-                course['day_offset'] = day_offset
-                week_courses.append(course)
+        # Récupérer toutes les courses de la semaine (1 requête, partagée par toutes les sections)
+        week = get_week_courses(st.session_state.week_start_date)
+        week_courses = week['courses']
         
         st.markdown("---")
         
@@ -1794,7 +2807,11 @@ def secretaire_page():
             st.markdown("---")
             
             chauffeurs = get_chauffeurs()
-            courses_jour = get_courses(date_filter=selected_day.strftime('%Y-%m-%d'))
+            selected_offset = (selected_day - st.session_state.week_start_date).days
+            if 0 <= selected_offset < 7:
+                plan_jour = week['day_plans'][selected_offset]
+            else:
+                plan_jour = get_day_plan(selected_day.strftime('%Y-%m-%d'))
             
             nb_colonnes = 4
             cols_chauffeurs = st.columns(nb_colonnes)
@@ -1805,8 +2822,7 @@ def secretaire_page():
                         chauffeur = chauffeurs[i]
                         st.markdown(f"### 🚗 {chauffeur['full_name']}")
                         
-                        courses_chauffeur = [c for c in courses_jour if c['chauffeur_id'] == chauffeur['id']]
-                        courses_chauffeur.sort(key=lambda c: c.get('heure_pec_prevue') or extract_time_str(c['heure_prevue']) or '')
+                        courses_chauffeur = plan_jour.get(chauffeur['id'], [])
                         
                         if courses_chauffeur:
                             for course in courses_chauffeur:
@@ -1818,26 +2834,14 @@ def secretaire_page():
                                 }
                                 emoji = statut_emoji.get(course['statut'], '⚪')
                                 
-                                heure_affichage = course.get('heure_pec_prevue')
-                                if not heure_affichage:
-                                    heure_affichage = extract_time_str(course['heure_prevue'])
-                                
-                                if heure_affichage:
-                                    parts = heure_affichage.split(':')
-                                    if len(parts) == 2:
-                                        h, m = parts
-                                        heure_affichage = f"{int(h):02d}:{m}"
+                                heure_affichage = course['heure_affichage']
                                 
                                 with st.popover(f"{emoji} {heure_affichage} - {course['nom_client']}", use_container_width=True):
                                     st.markdown(f"**{course['nom_client']}**")
                                     st.caption(f"📞 {course['telephone_client']}")
                                     
-                                    if course.get('heure_pec_prevue'):
-                                        heure_pec = course['heure_pec_prevue']
-                                        parts = heure_pec.split(':')
-                                        if len(parts) == 2:
-                                            h, m = parts
-                                            heure_pec = f"{int(h):02d}:{m}"
+                                    if course['heure_pec']:
+                                        heure_pec = course['heure_pec']
                                         st.caption(f"⏰ **Heure PEC:** {heure_pec}")
                                     
                                     st.caption(f"📍 **PEC:** {course['adresse_pec']}")
@@ -1903,7 +2907,7 @@ def secretaire_page():
                                         st.subheader("✏️ Modifier")
                                         chauffeurs_list = get_chauffeurs()
                                         
-                                        h_actuelle = course.get('heure_pec_prevue', '')
+                                        h_actuelle = course['heure_pec'] or ''
                                         new_h = st.text_input("Heure PEC", value=h_actuelle, key=f"h_detail_{course['id']}")
                                         
                                         ch_idx = 0
@@ -1916,27 +2920,11 @@ def secretaire_page():
                                         col_s, col_c = st.columns(2)
                                         with col_s:
                                             if st.button("💾 Enregistrer", key=f"save_detail_{course['id']}", use_container_width=True):
-                                                h_ok = True
-                                                h_norm = None
-                                                if new_h:
-                                                    parts = new_h.split(':')
-                                                    if len(parts) == 2:
-                                                        try:
-                                                            h_int, m_int = int(parts[0]), int(parts[1])
-                                                            if 0 <= h_int <= 23 and 0 <= m_int <= 59:
-                                                                h_norm = f"{h_int:02d}:{m_int:02d}"
-                                                            else:
-                                                                st.error("❌ Heure invalide")
-                                                                h_ok = False
-                                                        except:
-                                                            st.error("❌ Format invalide")
-                                                            h_ok = False
-                                                    else:
-                                                        st.error("❌ Format invalide")
-                                                        h_ok = False
-                                                
-                                                if h_ok:
-                                                    update_course_details(course['id'], h_norm, new_ch['id'])
+                                                try:
+                                                    update_course_details(course['id'], new_h, new_ch['id'])
+                                                except ValueError as e:
+                                                    st.error(f"❌ {e}")
+                                                else:
                                                     del st.session_state[f'mod_detail_{course["id"]}']
                                                     st.rerun()
                                         with col_c:
@@ -1968,8 +2956,7 @@ def secretaire_page():
                 if day_date <= date_aujourdhui:
                     continue
                 
-                day_courses = get_courses(date_filter=day_date.strftime('%Y-%m-%d'))
-                courses_non_dist = [c for c in day_courses if not c.get('visible_chauffeur', True)]
+                courses_non_dist = [c for c in week['by_day'][day_offset] if not c.get('visible_chauffeur', True)]
                 nb_non_dist = len(courses_non_dist)
                 
                 if nb_non_dist > 0:
@@ -2000,13 +2987,7 @@ def secretaire_page():
             st.markdown("### 📥 Archivage hebdomadaire")
             
             week_end_date = st.session_state.week_start_date + timedelta(days=6)
-            all_week_courses = []
-            for day_offset in range(7):
-                day_date = st.session_state.week_start_date + timedelta(days=day_offset)
-                day_courses = get_courses(date_filter=day_date.strftime('%Y-%m-%d'))
-                all_week_courses.extend(day_courses)
-            
-            week_courses_count = len(all_week_courses)
+            week_courses_count = len(week_courses)
             week_num = st.session_state.week_start_date.isocalendar()[1]
             
             st.markdown(f"**Semaine {week_num} : du {st.session_state.week_start_date.strftime('%d/%m')} au {week_end_date.strftime('%d/%m/%Y')}**")
@@ -2057,8 +3038,9 @@ def secretaire_page():
                 
                 if st.session_state.get('confirm_delete_week', False):
                     st.markdown("---")
-                    st.error("⚠️ **SUPPRESSION DÉFINITIVE !**")
-                    st.markdown(f"**Vous allez supprimer {week_courses_count} course(s).**")
+                    st.error("⚠️ **RETRAIT DU PLANNING !**")
+                    st.markdown(f"**Vous allez retirer {week_courses_count} course(s) du planning.** "
+                                "Elles restent consultables dans les archives (compte admin).")
                     
                     col_cancel, col_confirm = st.columns(2)
                     
@@ -2075,7 +3057,7 @@ def secretaire_page():
                                 purge_result = purge_week_courses(st.session_state.week_start_date)
                                 
                                 if purge_result['success']:
-                                    st.success(f"🎉 {purge_result['count']} course(s) supprimée(s) !")
+                                    st.success(f"🎉 {purge_result['count']} course(s) archivée(s) et retirée(s) du planning !")
                                     
                                     if 'week_archived' in st.session_state:
                                         del st.session_state['week_archived']
@@ -2110,40 +3092,15 @@ def secretaire_page():
                             st.session_state.selected_day_date = day_date
                             st.rerun()
             
-            # Plages horaires
-            heures = list(range(6, 23))
-            
-            for heure in heures:
+            # Plages horaires : cases pré-calculées (une lecture par case)
+            for heure in GRID_HOURS:
                 cols_hours = st.columns(8)
                 with cols_hours[0]:
                     st.markdown(f"**{heure:02d}:00**")
                 
                 for day_num in range(7):
                     with cols_hours[day_num + 1]:
-                        courses_slot = []
-                        for c in week_courses:
-                            if c['day_offset'] != day_num:
-                                continue
-                            
-                            heure_a_afficher = c.get('heure_pec_prevue')
-                            if not heure_a_afficher:
-                                heure_a_afficher = extract_time_str(c['heure_prevue'])
-                            
-                            if heure_a_afficher:
-                                parts = heure_a_afficher.split(':')
-                                if len(parts) == 2:
-                                    h, m = parts
-                                    heure_normalisee = f"{int(h):02d}:{m}"
-                                else:
-                                    heure_normalisee = heure_a_afficher
-                            else:
-                                heure_normalisee = None
-                            
-                            if heure_normalisee and heure_normalisee.startswith(f"{heure:02d}:"):
-                                courses_slot.append(c)
-                        
-                        if courses_slot:
-                            courses_slot.sort(key=lambda c: c.get('heure_pec_prevue') or extract_time_str(c['heure_prevue']) or '')
+                        courses_slot = week['grid'].get((day_num, heure))
                         
                         if courses_slot:
                             for course in courses_slot:
@@ -2154,31 +3111,17 @@ def secretaire_page():
                                     'deposee': '🟢'
                                 }
                                 emoji = statut_emoji.get(course['statut'], '⚪')
-                                
-                                heure_affichage = course.get('heure_pec_prevue')
-                                if not heure_affichage:
-                                    heure_affichage = extract_time_str(course['heure_prevue'])
-                                
-                                if heure_affichage:
-                                    parts = heure_affichage.split(':')
-                                    if len(parts) == 2:
-                                        h, m = parts
-                                        heure_affichage = f"{int(h):02d}:{m}"
+                                heure_affichage = course.heure_affichage
                                 
                                 chauffeur_prenom = course['chauffeur_name'].split()[0]
                                 with st.popover(f"{chauffeur_prenom}\n{emoji} {heure_affichage}", use_container_width=True):
                                     st.markdown(f"**{course['nom_client']}**")
                                     st.caption(f"📞 {course['telephone_client']}")
                                     
-                                    if course.get('heure_pec_prevue'):
-                                        heure_pec = course['heure_pec_prevue']
-                                        parts = heure_pec.split(':')
-                                        if len(parts) == 2:
-                                            h, m = parts
-                                            heure_pec = f"{int(h):02d}:{m}"
-                                        st.caption(f"⏰ **Heure PEC:** {heure_pec}")
+                                    if course.heure_pec:
+                                        st.caption(f"⏰ **Heure PEC:** {course.heure_pec}")
                                     else:
-                                        st.caption(f"⏰ Création: {extract_time_str(course['heure_prevue'])}")
+                                        st.caption(f"⏰ Création: {course.heure_paris.strftime('%H:%M')}")
                                     
                                     st.caption(f"📍 **PEC:** {course['adresse_pec']}")
                                     st.caption(f"🏁 **Dépose:** {course['lieu_depose']}")
@@ -2243,10 +3186,10 @@ def secretaire_page():
         if mode_reattribution:
             st.info("💡 **Sélectionnez les courses, choisissez le nouveau chauffeur, puis cliquez sur Réattribuer**")
             
-            courses_jour = get_courses(date_filter=st.session_state.planning_jour_date.strftime('%Y-%m-%d'))
+            plan_jour = get_day_plan(st.session_state.planning_jour_date.strftime('%Y-%m-%d'))
             chauffeurs = get_chauffeurs()
             
-            if not courses_jour:
+            if not plan_jour:
                 st.warning("Aucune course pour ce jour")
             else:
                 if 'selected_courses' not in st.session_state:
@@ -2254,21 +3197,12 @@ def secretaire_page():
                 
                 st.markdown("#### 1️⃣ Sélectionner les courses")
                 
-                courses_par_chauffeur = {}
-                for course in courses_jour:
-                    chauffeur_id = course['chauffeur_id']
-                    if chauffeur_id not in courses_par_chauffeur:
-                        courses_par_chauffeur[chauffeur_id] = []
-                    courses_par_chauffeur[chauffeur_id].append(course)
-                
                 selected_course_ids = []
                 
                 for chauffeur in chauffeurs:
-                    if chauffeur['id'] in courses_par_chauffeur:
-                        with st.expander(f"🚗 {chauffeur['full_name']} ({len(courses_par_chauffeur[chauffeur['id']])} course(s))", expanded=True):
-                            courses = courses_par_chauffeur[chauffeur['id']]
-                            courses.sort(key=lambda c: c.get('heure_pec_prevue') or extract_time_str(c['heure_prevue']) or '')
-                            
+                    if chauffeur['id'] in plan_jour:
+                        courses = plan_jour[chauffeur['id']]
+                        with st.expander(f"🚗 {chauffeur['full_name']} ({len(courses)} course(s))", expanded=True):
                             for course in courses:
                                 statut_emoji = {
                                     'nouvelle': '🔵',
@@ -2278,15 +3212,7 @@ def secretaire_page():
                                 }
                                 emoji = statut_emoji.get(course['statut'], '⚪')
                                 
-                                heure_affichage = course.get('heure_pec_prevue')
-                                if not heure_affichage:
-                                    heure_affichage = extract_time_str(course['heure_prevue'])
-                                
-                                if heure_affichage:
-                                    parts = heure_affichage.split(':')
-                                    if len(parts) == 2:
-                                        h, m = parts
-                                        heure_affichage = f"{int(h):02d}:{m}"
+                                heure_affichage = course['heure_affichage']
                                 
                                 label = f"{emoji} {heure_affichage} - {course['nom_client']} ({course['adresse_pec']} → {course['lieu_depose']})"
                                 
@@ -2308,18 +3234,21 @@ def secretaire_page():
                     col1, col2 = st.columns([1, 4])
                     with col1:
                         if st.button("🔄 Réattribuer", type="primary", use_container_width=True):
-                            success_count = 0
-                            for course_id in selected_course_ids:
-                                result = reassign_course_to_driver(course_id, nouveau_chauffeur_id)
-                                if result['success']:
-                                    success_count += 1
+                            # Un seul UPDATE pour toutes les courses + notifications dans la même transaction
+                            result = reassign_courses_to_driver(selected_course_ids, nouveau_chauffeur_id)
+                            success_count = result.get('moved', 0)
                             
-                            if success_count == len(selected_course_ids):
+                            if result['success'] and success_count == len(selected_course_ids):
                                 st.success(f"✅ {success_count} course(s) réattribuée(s) à {nouveau_chauffeur_name} !")
                                 st.balloons()
                                 st.rerun()
+                            elif not result['success']:
+                                st.error(f"❌ Erreur : {result.get('error', 'Erreur inconnue')}")
                             else:
                                 st.error(f"❌ Erreur : {success_count}/{len(selected_course_ids)} course(s) réattribuée(s)")
+                                for course_result in result['courses']:
+                                    if not course_result['success']:
+                                        st.caption(f"Course #{course_result['course_id']} : {course_result['error']}")
                     
                     with col2:
                         if st.button("❌ Annuler", use_container_width=True):
@@ -2350,8 +3279,8 @@ def secretaire_page():
         
         nb_colonnes = 4
         
-        # Récupérer toutes les courses du jour
-        courses_jour = get_courses(date_filter=st.session_state.planning_jour_date.strftime('%Y-%m-%d'))
+        # Courses du jour regroupées par chauffeur
+        plan_jour = get_day_plan(st.session_state.planning_jour_date.strftime('%Y-%m-%d'))
         
         # Créer 4 colonnes
         cols_chauffeurs = st.columns(nb_colonnes)
@@ -2362,8 +3291,7 @@ def secretaire_page():
                     chauffeur = chauffeurs[i]
                     st.markdown(f"### 🚗 {chauffeur['full_name']}")
                     
-                    courses_chauffeur = [c for c in courses_jour if c['chauffeur_id'] == chauffeur['id']]
-                    courses_chauffeur.sort(key=lambda c: c.get('heure_pec_prevue') or extract_time_str(c['heure_prevue']) or '')
+                    courses_chauffeur = plan_jour.get(chauffeur['id'], [])
                     
                     if courses_chauffeur:
                         for course in courses_chauffeur:
@@ -2375,25 +3303,13 @@ def secretaire_page():
                             }
                             emoji = statut_emoji.get(course['statut'], '⚪')
                             
-                            heure_affichage = course.get('heure_pec_prevue')
-                            if not heure_affichage:
-                                heure_affichage = extract_time_str(course['heure_prevue'])
-                            
-                            if heure_affichage:
-                                parts = heure_affichage.split(':')
-                                if len(parts) == 2:
-                                    h, m = parts
-                                    heure_affichage = f"{int(h):02d}:{m}"
+                            heure_affichage = course['heure_affichage']
                             
                             with st.popover(f"{emoji} {heure_affichage} - {course['nom_client']}", use_container_width=True):
                                 st.markdown(f"**{course['nom_client']}** - {course['telephone_client']}")
                                 
-                                if course.get('heure_pec_prevue'):
-                                    heure_pec = course['heure_pec_prevue']
-                                    parts = heure_pec.split(':')
-                                    if len(parts) == 2:
-                                        h, m = parts
-                                        heure_pec = f"{int(h):02d}:{m}"
+                                if course['heure_pec']:
+                                    heure_pec = course['heure_pec']
                                     st.caption(f"⏰ {heure_pec} • {course['adresse_pec']} → {course['lieu_depose']}")
                                 else:
                                     st.caption(f"📍 {course['adresse_pec']} → {course['lieu_depose']}")
@@ -2465,6 +3381,9 @@ def secretaire_page():
         st.subheader("💡 Assistant Intelligent - Suggestion automatique de chauffeur")
         
         st.info("🎯 **L'assistant analyse** : Distance depuis dernière course, charge de travail, disponibilité")
+        if get_distance_provider().name == 'offline':
+            st.caption("ℹ️ Distances estimées hors ligne (répertoire des communes d'Eure-et-Loir) : "
+                       "clé Google Maps non configurée")
         
         chauffeurs_list = get_chauffeurs()
         
@@ -2493,11 +3412,8 @@ def secretaire_page():
                 else:
                     with st.spinner("🔄 Analyse en cours..."):
                         
-                        try:
-                            google_api_key = st.secrets["google_maps"]["api_key"]
-                        except:
-                            st.error("⚠️ Erreur : Clé API Google Maps non configurée")
-                            st.stop()
+                        # Sans clé Google Maps : distances estimées hors ligne
+                        distance_provider = get_distance_provider()
                         
                         date_aujourdhui = datetime.now(TIMEZONE).strftime('%Y-%m-%d')
                         
@@ -2534,7 +3450,9 @@ def secretaire_page():
                             suggestions = suggest_best_driver(
                                 chauffeurs=chauffeurs_data,
                                 course_data=course_data,
-                                api_key=google_api_key
+                                cache=get_distance_cache(),
+                                provider=distance_provider,
+                                fallback=get_offline_distance_provider()
                             )
                             
                             st.session_state['assistant_suggestions'] = suggestions
@@ -2593,7 +3511,10 @@ def secretaire_page():
                         with col_info1:
                             if sug['distance_km'] is not None:
                                 st.metric("Distance", f"{sug['distance_km']} km")
-                                st.caption(f"~{sug['duration_min']} min")
+                                if sug.get('distance_estimated'):
+                                    st.caption(f"~{sug['duration_min']} min (estimation hors ligne)")
+                                else:
+                                    st.caption(f"~{sug['duration_min']} min")
                             else:
                                 st.metric("Distance", "À sa base")
                         
@@ -2657,17 +3578,50 @@ def secretaire_page():
 # INTERFACE CHAUFFEUR - OPTIMISÉE
 # ============================================
 
+# Relance de secours si le listener LISTEN/NOTIFY est déconnecté
+FALLBACK_REFRESH_SECONDS = 30
+
+# Intervalle de la surveillance en mémoire d'une page chauffeur (secondes) :
+# délai maximal d'affichage d'un changement poussé par LISTEN/NOTIFY.
+# Réglable dans st.secrets["realtime"]["watch_interval_seconds"]
+WATCH_INTERVAL_SECONDS = float(st.secrets.get("realtime", {}).get("watch_interval_seconds", 2))
+
+
+@st.fragment(run_every=WATCH_INTERVAL_SECONDS)
+def watch_chauffeur_changes(chauffeur_id):
+    """
+    Surveille en mémoire (AUCUNE requête SQL) la version des données du chauffeur,
+    mise à jour par le listener LISTEN/NOTIFY. La page complète n'est relancée
+    que si une course ou une notification de CE chauffeur a changé.
+    """
+    version = get_driver_version(chauffeur_id)
+    now = datetime.now().timestamp()
+    
+    if st.session_state.get('chauffeur_data_version') is None:
+        st.session_state.chauffeur_data_version = version
+        st.session_state.chauffeur_last_refresh = now
+        return
+    
+    changed = st.session_state.chauffeur_data_version != version
+    listener_down = not get_change_listener().connected
+    fallback_due = listener_down and now - st.session_state.chauffeur_last_refresh >= FALLBACK_REFRESH_SECONDS
+    
+    if changed or fallback_due:
+        st.session_state.chauffeur_data_version = version
+        st.session_state.chauffeur_last_refresh = now
+        if fallback_due:
+            invalidate_all()
+        st.rerun(scope="app")
+
+
 def chauffeur_page():
     """Interface Chauffeur - OPTIMISÉE avec système de notifications"""
     
     # ============================================
-    # AUTO-REFRESH AUTOMATIQUE (30 secondes) - STREAMLIT-AUTOREFRESH
+    # MISES À JOUR PUSH (LISTEN/NOTIFY) - remplace l'auto-refresh 30 s
     # ============================================
-    # Package officiel qui fonctionne vraiment !
-    count = st_autorefresh(interval=30000, key="chauffeur_autorefresh")
+    watch_chauffeur_changes(st.session_state.user['id'])
     
-    # ============================================
-    # ============================================
     col_deconnexion, col_refresh = st.columns([1, 6])
     
     st.title("🚖 Mes courses")
@@ -2712,7 +3666,7 @@ def chauffeur_page():
                 st.info(f"{icon} **{notif['message']}**")
                 
                 if notif.get('nom_client'):
-                    heure = notif.get('heure_pec_prevue', 'N/A')
+                    heure = notif.get('heure_pec_prevue') or 'N/A'
                     st.caption(f"👤 {notif['nom_client']} | ⏰ {heure}")
                     st.caption(f"📍 {notif.get('adresse_pec', 'N/A')} → {notif.get('lieu_depose', 'N/A')}")
             
@@ -2730,7 +3684,8 @@ def chauffeur_page():
             st.rerun()
     
     with col_refresh:
-        if st.button("🔄 Actualiser (auto: 30s)", use_container_width=True):
+        if st.button("🔄 Actualiser", use_container_width=True):
+            invalidate_all()
             st.rerun()
     
     st.markdown("---")
@@ -2748,8 +3703,18 @@ def chauffeur_page():
     if not show_all_chauff and date_filter:
         date_filter_str = date_filter.strftime('%Y-%m-%d')
     
-    # Récupérer les courses DU CHAUFFEUR avec role='chauffeur' pour filtrer visible_chauffeur
-    courses = get_courses(chauffeur_id=st.session_state.user['id'], date_filter=date_filter_str, role='chauffeur')
+    # Courses DU CHAUFFEUR (visibles), synchronisées par deltas depuis le dernier curseur
+    fenetre_debut = (datetime.now(TIMEZONE) - timedelta(days=30)).date()
+    if date_filter_str and date_filter < fenetre_debut:
+        # Date hors de la fenêtre synchronisée : lecture directe
+        courses = get_courses(chauffeur_id=st.session_state.user['id'], date_filter=date_filter_str, role='chauffeur')
+    else:
+        mes_courses = sync_chauffeur_courses(st.session_state.user['id'], days_back=30)
+        if date_filter_str:
+            courses = [c for c in mes_courses
+                       if c.date_paris == date_filter]
+        else:
+            courses = mes_courses[:100]
     
     with col2:
         st.metric("Mes courses", len([c for c in courses if c['statut'] != 'deposee']))
@@ -2775,7 +3740,7 @@ def chauffeur_page():
             }
             
             date_fr = format_date_fr(course['heure_prevue'])
-            heure_affichage = course.get('heure_pec_prevue', extract_time_str(course['heure_prevue']))
+            heure_affichage = course['heure_affichage']
             titre = f"{statut_colors.get(course['statut'], '⚪')} {date_fr} {heure_affichage} - {course['nom_client']} - {statut_text.get(course['statut'], course['statut'].upper())}"
             
             with st.expander(titre):
@@ -2785,8 +3750,8 @@ def chauffeur_page():
                     st.write(f"**Tel :** {course['telephone_client']}")
                     st.write(f"**📅 Date :** {date_fr}")
                     
-                    if course.get('heure_pec_prevue'):
-                        st.success(f"⏰ **Heure PEC : {course['heure_pec_prevue']}**")
+                    if course['heure_pec']:
+                        st.success(f"⏰ **Heure PEC : {course['heure_pec']}**")
                     st.write(f"**PEC :** {course['adresse_pec']}")
                 
                 with col2:
@@ -2866,15 +3831,21 @@ def main():
     """Point d'entrée principal de l'application"""
     init_db()
     
-    if 'user' not in st.session_state:
-        login_page()
-    else:
-        if st.session_state.user['role'] == 'admin':
-            admin_page()
-        elif st.session_state.user['role'] == 'secretaire':
-            secretaire_page()
-        elif st.session_state.user['role'] == 'chauffeur':
-            chauffeur_page()
+    # Une connexion par rerun, partagée par toutes les requêtes de la page
+    begin_request_session(checkout_db_connection, return_db_connection)
+    try:
+        if 'user' not in st.session_state:
+            login_page()
+        else:
+            if st.session_state.user['role'] == 'admin':
+                admin_page()
+            elif st.session_state.user['role'] == 'secretaire':
+                secretaire_page()
+            elif st.session_state.user['role'] == 'chauffeur':
+                chauffeur_page()
+    finally:
+        # Aussi en cas de st.rerun() / st.stop() (exceptions de contrôle Streamlit)
+        end_request_session()
 
 
 if __name__ == "__main__":
@@ -5,25 +5,54 @@ Transport DanGE Planning
 Fonctions pour suggérer automatiquement le meilleur chauffeur
 basé sur distance, charge de travail, et disponibilité.
 
-Utilise Google Maps Distance Matrix API pour calculs de distance réels.
+Les distances viennent d'un fournisseur interchangeable
+(distance_providers.py) : API Google Distance Matrix, ou estimation hors
+ligne (répertoire local des communes d'Eure-et-Loir, haversine x facteur
+routier) quand la clé API manque ou en secours d'une erreur de l'API.
+
+Les résultats Google passent par un cache à deux niveaux
+(distance_cache.py) : un trajet déjà calculé ne refait pas d'appel réseau.
+Les appels restants sont groupés, envoyés en parallèle sur une session
+HTTP partagée, dans la limite d'un délai global par suggestion.
+
+Banc d'essai reproductible (sans réseau) :
+
+    python assistant.py bench --provider offline
+    python assistant.py bench --provider stub --latency 0.2
 """
 
-import requests
+import argparse
+import random
+import statistics
+import time
+
 from datetime import datetime, timedelta
 import pytz
 
+from distance_cache import DistanceCache
+from distance_providers import GoogleDistanceProvider, OfflineDistanceProvider
+
 # Configuration
 TIMEZONE = pytz.timezone('Europe/Paris')
 
+# Délai global d'une suggestion : les distances encore manquantes
+# reçoivent le score neutre
+SUGGESTION_DEADLINE_SECONDS = 4
+
 
-def calculate_distance(origin, destination, api_key):
+def calculate_distance(origin, destination, api_key=None, cache=None, deadline=None,
+                       provider=None, fallback=None):
     """
     Calcule la distance et le temps de trajet entre 2 adresses.
     
     Args:
         origin (str): Adresse de départ (ex: "Dangeau, France")
         destination (str): Adresse d'arrivée (ex: "Chartres, France")
-        api_key (str): Clé API Google Maps
+        api_key (str): Clé API Google Maps (fournisseur par défaut)
+        cache (DistanceCache): Cache des distances (None = appel direct)
+        deadline (float): Échéance time.monotonic() (None = délai d'une requête)
+        provider (DistanceProvider): Fournisseur (None = Google avec api_key)
+        fallback (DistanceProvider): Fournisseur de secours en cas d'erreur
         
     Returns:
         dict: {
@@ -31,79 +60,73 @@ def calculate_distance(origin, destination, api_key):
             'distance_meters': int,    # Distance en mètres
             'duration_min': int,       # Durée en minutes
             'duration_seconds': int,   # Durée en secondes
+            'status': str or None,     # Statut Google ('OK', 'NOT_FOUND'...)
+            'estimated': bool,         # Présent (True) pour une estimation hors ligne
             'success': bool,           # True si succès
             'error': str or None       # Message d'erreur si échec
         }
     """
+    return calculate_distances(
+        [origin], destination, api_key, cache=cache, deadline=deadline,
+        provider=provider, fallback=fallback
+    )[origin]
+
+
+def calculate_distances(origins, destination, api_key=None, cache=None, deadline=None,
+                        provider=None, fallback=None):
+    """
+    Calcule en une fois les distances de plusieurs origines vers une destination.
     
-    # URL de l'API Google Maps Distance Matrix
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
+    Les trajets en cache sont servis sans réseau ; les autres sont demandés
+    au fournisseur en une fois (requêtes groupées pour Google). Les trajets
+    encore en échec sont ensuite estimés par le fournisseur de secours.
     
-    # Paramètres de la requête
-    params = {
-        'origins': origin,
-        'destinations': destination,
-        'key': api_key,
-        'language': 'fr',
-        'units': 'metric'
-    }
-    
-    try:
-        # Appel API
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()  # Lève exception si erreur HTTP
-        
-        data = response.json()
-        
-        # Vérifier le statut de la réponse
-        if data.get('status') != 'OK':
-            return {
-                'success': False,
-                'error': f"API Error: {data.get('status')} - {data.get('error_message', 'Unknown error')}"
-            }
-        
-        # Extraire les données du premier résultat
-        element = data['rows'][0]['elements'][0]
-        
-        if element.get('status') != 'OK':
-            return {
-                'success': False,
-                'error': f"Route Error: {element.get('status')}"
-            }
-        
-        # Extraire distance et durée
-        distance_meters = element['distance']['value']
-        duration_seconds = element['duration']['value']
-        
-        return {
-            'distance_km': round(distance_meters / 1000, 2),
-            'distance_meters': distance_meters,
-            'duration_min': round(duration_seconds / 60),
-            'duration_seconds': duration_seconds,
-            'success': True,
-            'error': None
-        }
+    Args:
+        origins (list): Adresses de départ (doublons acceptés)
+        destination (str): Adresse d'arrivée
+        api_key (str): Clé API Google Maps (fournisseur par défaut)
+        cache (DistanceCache): Cache des distances (None = appel direct)
+        deadline (float): Échéance time.monotonic() (None = délai d'une requête)
+        provider (DistanceProvider): Fournisseur (None = Google avec api_key)
+        fallback (DistanceProvider): Fournisseur de secours en cas d'erreur
         
-    except requests.exceptions.Timeout:
-        return {
-            'success': False,
-            'error': 'Timeout: API took too long to respond'
-        }
-    except requests.exceptions.RequestException as e:
-        return {
-            'success': False,
-            'error': f'Request Error: {str(e)}'
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': f'Unexpected Error: {str(e)}'
-        }
+    Returns:
+        dict: {origine: résultat de calculate_distance()}
+    """
+    if provider is None:
+        provider = GoogleDistanceProvider(api_key)
+    if not provider.cacheable:
+        cache = None
+    
+    origins = list(dict.fromkeys(origins))
+    results = {}
+    
+    if cache is not None:
+        cached = cache.get_many([(origin, destination) for origin in origins])
+        for (origin, _), result in cached.items():
+            results[origin] = result
+    
+    missing = [origin for origin in origins if origin not in results]
+    if missing:
+        fetched = provider.distances(missing, destination, deadline=deadline)
+        results.update(fetched)
+        if cache is not None:
+            cache.put_many([(origin, destination, result) for origin, result in fetched.items()])
+    
+    if fallback is not None:
+        failed = [origin for origin in origins if not results[origin]['success']]
+        if failed:
+            for origin, result in fallback.distances(failed, destination).items():
+                if result['success']:
+                    results[origin] = result
+    
+    return results
 
 
 # ============ FONCTIONS À AJOUTER DANS LES PROCHAINES ÉTAPES ============
 
-def calculate_driver_score(driver_data, course_data, api_key):
+def calculate_driver_score(driver_data, course_data, api_key=None, cache=None, distances=None,
+                           provider=None, fallback=None):
     """
     Calcule le score d'un chauffeur pour une course donnée.
     
@@ -120,6 +143,11 @@ def calculate_driver_score(driver_data, course_data, api_key):
             'lieu_depose': str
         }
         api_key (str): Clé API Google Maps
+        cache (DistanceCache): Cache des distances (optionnel)
+        distances (dict): Distances déjà calculées {dernière dépose: résultat}
+            (voir suggest_best_driver) - sinon calcul individuel
+        provider (DistanceProvider): Fournisseur de distances (None = Google)
+        fallback (DistanceProvider): Fournisseur de secours en cas d'erreur
         
     Returns:
         dict: {
@@ -128,6 +156,7 @@ def calculate_driver_score(driver_data, course_data, api_key):
             'score': int (0-100),
             'distance_km': float,
             'duration_min': int,
+            'distance_estimated': bool,  # Distance estimée hors ligne
             'courses_today': int,
             'details': str,  # Explication du score
             'available': bool
@@ -138,6 +167,7 @@ def calculate_driver_score(driver_data, course_data, api_key):
     details = []
     distance_km = None
     duration_min = None
+    distance_estimated = False
     
     # ============ CRITÈRE 1 : DISTANCE (40 points max) ============
     
@@ -147,11 +177,17 @@ def calculate_driver_score(driver_data, course_data, api_key):
         
         if last_depose:
             # Calculer distance entre dernière dépose et nouvelle PEC
-            dist_result = calculate_distance(
-                origin=last_depose,
-                destination=course_data['adresse_pec'],
-                api_key=api_key
-            )
+            if distances is not None and last_depose in distances:
+                dist_result = distances[last_depose]
+            else:
+                dist_result = calculate_distance(
+                    origin=last_depose,
+                    destination=course_data['adresse_pec'],
+                    api_key=api_key,
+                    cache=cache,
+                    provider=provider,
+                    fallback=fallback
+                )
             
             if dist_result['success']:
                 distance_km = dist_result['distance_km']
@@ -176,7 +212,9 @@ def calculate_driver_score(driver_data, course_data, api_key):
                     distance_score = 0
                 
                 score += distance_score
-                details.append(f"Distance: {distance_km} km ({distance_score} pts)")
+                distance_estimated = dist_result.get('estimated', False)
+                estimation = " estimés" if distance_estimated else ""
+                details.append(f"Distance: {distance_km} km{estimation} ({distance_score} pts)")
             else:
                 # Erreur de calcul, score neutre
                 details.append(f"Distance: non calculée (20 pts par défaut)")
@@ -229,13 +267,15 @@ def calculate_driver_score(driver_data, course_data, api_key):
         'score': score,
         'distance_km': distance_km,
         'duration_min': duration_min,
+        'distance_estimated': distance_estimated,
         'courses_today': courses_today,
         'details': " | ".join(details),
         'available': True  # Pour l'instant toujours True
     }
 
 
-def suggest_best_driver(chauffeurs, course_data, api_key):
+def suggest_best_driver(chauffeurs, course_data, api_key=None, cache=None, timeout=SUGGESTION_DEADLINE_SECONDS,
+                        provider=None, fallback=None):
     """
     Suggère le meilleur chauffeur pour une course.
     
@@ -254,6 +294,12 @@ def suggest_best_driver(chauffeurs, course_data, api_key):
             'lieu_depose': str
         }
         api_key (str): Clé API Google Maps
+        cache (DistanceCache): Cache des distances (optionnel)
+        timeout (float): Délai global du calcul des distances (secondes) ;
+            un chauffeur dont la distance manque reçoit le score neutre
+        provider (DistanceProvider): Fournisseur de distances (None = Google avec api_key)
+        fallback (DistanceProvider): Fournisseur de secours en cas d'erreur
+            (ex: OfflineDistanceProvider au lieu du score neutre)
         
     Returns:
         list: Liste de scores triés par ordre décroissant
@@ -261,13 +307,29 @@ def suggest_best_driver(chauffeurs, course_data, api_key):
     """
     
     scores = []
+    deadline = time.monotonic() + timeout
+    
+    # Toutes les dernières déposes résolues ensemble (cache puis requêtes groupées)
+    origins = [
+        chauffeur['last_course'].get('lieu_depose')
+        for chauffeur in chauffeurs
+        if chauffeur.get('last_course') and chauffeur['last_course'].get('lieu_depose')
+    ]
+    distances = calculate_distances(
+        origins, course_data['adresse_pec'], api_key, cache=cache, deadline=deadline,
+        provider=provider, fallback=fallback
+    ) if origins else {}
     
-    # Calculer le score pour chaque chauffeur
+    # Calculer le score pour chaque chauffeur (sans réseau)
     for chauffeur in chauffeurs:
         score_result = calculate_driver_score(
             driver_data=chauffeur,
             course_data=course_data,
-            api_key=api_key
+            api_key=api_key,
+            cache=cache,
+            distances=distances,
+            provider=provider,
+            fallback=fallback
         )
         scores.append(score_result)
     
@@ -284,7 +346,7 @@ def test_api():
     Fonction de test pour vérifier que l'API fonctionne.
     
     Usage:
-        python assistant.py
+        python assistant.py test
     """
     
     print("=" * 70)
@@ -399,6 +461,143 @@ def test_api():
     print("=" * 70)
 
 
+# ============ BANC D'ESSAI ============
+
+def benchmark(provider_name='offline', drivers=20, runs=200, seed=42, latency=0.0,
+              error_rate=0.0, use_cache=False, timeout=SUGGESTION_DEADLINE_SECONDS):
+    """
+    Mesure suggest_best_driver() sur des scénarios tirés avec une graine fixe
+    (dernières déposes et adresses PEC prises dans le répertoire local) :
+    mêmes paramètres = mêmes scénarios et mêmes classements, sans réseau.
+    
+    Args:
+        provider_name (str): 'offline' (estimation locale) ou 'stub'
+            (chemin Google complet contre le serveur local distance_stub.py)
+        drivers (int): Chauffeurs par suggestion
+        runs (int): Nombre de suggestions
+        seed (int): Graine des scénarios
+        latency (float): Latence simulée du serveur stub (secondes)
+        error_rate (float): Part de requêtes en erreur côté stub
+        use_cache (bool): Cache des distances en mémoire (sans base)
+        timeout (float): Délai global d'une suggestion
+    
+    Returns:
+        dict: {'runs', 'drivers', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms',
+               'api_requests', 'fallbacks', 'ranking_checksum', 'cache'}
+    """
+    offline = OfflineDistanceProvider()
+    places = _gazetteer_names()
+    rng = random.Random(seed)
+    
+    scenarios = []
+    for _ in range(runs):
+        chauffeurs = [
+            {
+                'id': i,
+                'name': f"Chauffeur {i}",
+                'last_course': {'lieu_depose': rng.choice(places)} if rng.random() < 0.85 else None,
+                'courses_today': rng.randint(0, 8)
+            }
+            for i in range(drivers)
+        ]
+        scenarios.append((chauffeurs, {'adresse_pec': rng.choice(places), 'lieu_depose': rng.choice(places)}))
+    
+    cache = DistanceCache() if use_cache else None
+    server = None
+    if provider_name == 'stub':
+        from distance_stub import StubDistanceMatrixServer
+        server = StubDistanceMatrixServer(latency=latency, error_rate=error_rate, seed=seed).start()
+        provider = GoogleDistanceProvider('stub', url=server.url)
+        fallback = offline
+    else:
+        provider = offline
+        fallback = None
+    
+    timings = []
+    checksum = 0
+    fallbacks = 0
+    try:
+        for chauffeurs, course_data in scenarios:
+            start = time.perf_counter()
+            suggestions = suggest_best_driver(
+                chauffeurs, course_data, cache=cache, timeout=timeout,
+                provider=provider, fallback=fallback
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            checksum = (checksum * 31 + sum((rank + 1) * sug['driver_id'] for rank, sug in enumerate(suggestions))) % 1000000007
+            if provider_name == 'stub':
+                fallbacks += sum(1 for sug in suggestions if sug['distance_estimated'])
+    finally:
+        if server is not None:
+            server.stop()
+    
+    timings.sort()
+    return {
+        'runs': runs,
+        'drivers': drivers,
+        'mean_ms': statistics.fmean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'max_ms': timings[-1],
+        'api_requests': server.requests if server is not None else 0,
+        'fallbacks': fallbacks,
+        'ranking_checksum': checksum,
+        'cache': cache.stats() if cache is not None else None
+    }
+
+
+def _gazetteer_names():
+    """Noms du répertoire local (adresses du banc d'essai)"""
+    import csv
+    from distance_providers import GAZETTEER_PATH
+    with open(GAZETTEER_PATH, encoding='utf-8', newline='') as f:
+        return [row['nom'] for row in csv.DictReader(f)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assistant intelligent - test de l'API et banc d'essai")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    subparsers.add_parser('test', help="Test de l'API Google Maps (réseau)")
+    
+    bench = subparsers.add_parser('bench', help="Banc d'essai reproductible de suggest_best_driver (sans réseau)")
+    bench.add_argument('--provider', choices=['offline', 'stub'], default='offline')
+    bench.add_argument('--drivers', type=int, default=20)
+    bench.add_argument('--runs', type=int, default=200)
+    bench.add_argument('--seed', type=int, default=42)
+    bench.add_argument('--latency', type=float, default=0.0, help="Latence du serveur stub (s)")
+    bench.add_argument('--error-rate', type=float, default=0.0, help="Part de requêtes stub en erreur")
+    bench.add_argument('--cache', action='store_true', help="Cache des distances en mémoire")
+    bench.add_argument('--timeout', type=float, default=SUGGESTION_DEADLINE_SECONDS)
+    
+    args = parser.parse_args(argv)
+    
+    if args.command != 'bench':
+        test_api()
+        return
+    
+    result = benchmark(
+        provider_name=args.provider,
+        drivers=args.drivers,
+        runs=args.runs,
+        seed=args.seed,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        use_cache=args.cache,
+        timeout=args.timeout
+    )
+    
+    print(f"Fournisseur : {args.provider} | {result['runs']} suggestions x {result['drivers']} chauffeurs | graine {args.seed}")
+    print(f"Temps par suggestion : moyenne {result['mean_ms']:.3f} ms | p50 {result['p50_ms']:.3f} ms | "
+          f"p95 {result['p95_ms']:.3f} ms | max {result['max_ms']:.3f} ms")
+    if args.provider == 'stub':
+        print(f"Requêtes API : {result['api_requests']} | distances estimées en secours : {result['fallbacks']}")
+    if result['cache']:
+        print(f"Cache : {result['cache']['hit_rate']:.0%} de succès ({result['cache']['memory_hits']} / "
+              f"{result['cache']['memory_hits'] + result['cache']['misses']})")
+    print(f"Empreinte des classements : {result['ranking_checksum']}")
+
+
 # Si le fichier est exécuté directement
 if __name__ == "__main__":
-    test_api()
+    main()
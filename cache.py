@@ -0,0 +1,140 @@
+"""
+CACHE VERSIONNÉ - MODULE 6
+Transport DanGE Planning
+
+Cache de lectures partagé par toutes les sessions du process :
+
+- chaque table a un compteur de version en mémoire
+- chaque fonction d'écriture incrémente le compteur des tables modifiées
+  (bump_version), APRÈS le commit
+- une entrée de cache est valide tant que les versions des tables lues
+  n'ont pas changé : les lectures sont instantanées tant que les données
+  ne bougent pas, et jamais périmées après une écriture
+
+Les valeurs en cache sont partagées : les listes sont copiées à la sortie,
+mais les éléments (dicts de courses, chauffeurs...) ne doivent pas être modifiés.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+_lock = threading.Lock()
+_versions = {}
+_caches = []
+
+# Tables dont les versions sont suivies
+TABLES = ('courses', 'users', 'clients_reguliers', 'notifications')
+
+
+class NoCache(Exception):
+    """
+    Levée par une fonction décorée pour renvoyer `value` SANS la mettre en cache
+    (ex: connexion indisponible -> liste vide à ne pas mémoriser).
+    """
+
+    def __init__(self, value=None):
+        super().__init__()
+        self.value = value
+
+
+def bump_version(*tables):
+    """Invalide les entrées de cache qui dépendent de ces tables"""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def invalidate_all():
+    """Invalide tout le cache (bouton Actualiser, modification hors application)"""
+    bump_version(*TABLES)
+
+
+def get_version(table):
+    with _lock:
+        return _versions.get(table, 0)
+
+
+def get_versions(tables):
+    with _lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+def versioned_cache(*tables, maxsize=256):
+    """
+    Décorateur : met en cache le résultat par arguments, validé par les versions
+    des tables lues.
+
+    Le résultat est PARTAGÉ par toutes les sessions du process : seule une
+    liste de premier niveau est copiée (l'appelant peut la trier / filtrer).
+    Tout le reste est en lecture seule - les lignes (RealDictRow, Course) et,
+    pour un résultat dict (get_week_courses), ses listes, dicts et index
+    internes. Pour modifier, copier d'abord (dict(row), list(...), sorted(...)).
+
+    Usage:
+        @versioned_cache('courses', 'users')
+        def get_courses(...):
+            ...
+    """
+
+    def decorator(func):
+        entries = OrderedDict()
+        entries_lock = threading.Lock()
+        info = {'hits': 0, 'misses': 0}
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            # Versions lues AVANT la requête : une écriture concurrente invalide l'entrée
+            versions = get_versions(tables)
+
+            with entries_lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] == versions:
+                    entries.move_to_end(key)
+                    info['hits'] += 1
+                    return _copy(entry[1])
+                info['misses'] += 1
+
+            try:
+                value = func(*args, **kwargs)
+            except NoCache as e:
+                return e.value
+
+            with entries_lock:
+                entries[key] = (versions, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+
+            return _copy(value)
+
+        def cache_clear():
+            with entries_lock:
+                entries.clear()
+
+        def cache_info():
+            with entries_lock:
+                return dict(info, size=len(entries), maxsize=maxsize, tables=tables)
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        _caches.append(wrapper)
+        return wrapper
+
+    return decorator
+
+
+def get_cache_stats():
+    """Statistiques de tous les caches versionnés : {nom_fonction: {...}}"""
+    return {cached.__name__: cached.cache_info() for cached in _caches}
+
+
+def _copy(value):
+    """
+    Copie superficielle des listes pour que l'appelant puisse trier / filtrer
+    (les éléments restent partagés, voir versioned_cache)
+    """
+    if isinstance(value, list):
+        return list(value)
+    return value
@@ -0,0 +1,136 @@
+"""
+RECHERCHE CLIENTS - MODULE 10
+Transport DanGE Planning
+
+Index en mémoire des clients réguliers actifs pour l'autocomplétion du
+formulaire de course (une recherche à chaque frappe = chaque rerun) :
+
+- noms normalisés : minuscules, sans accents ni ponctuation
+  ("Église" et "eglise" sont équivalents)
+- index de préfixes : liste triée des mots, recherche par bisect
+- index de trigrammes : tolère les fautes de frappe et les sous-chaînes
+- classement par pertinence puis par utilisation récente du client
+
+L'index est reconstruit par app.py quand la version de la table
+clients_reguliers change (cache versionné) ; une recherche ne fait
+aucune requête SQL.
+"""
+
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+
+# Part minimale des trigrammes de la recherche présents dans le nom
+# (équivalent de word_similarity de pg_trgm) pour une correspondance approchée
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+# Poids de l'utilisation récente dans le classement
+USAGE_WEIGHT = 0.15
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Minuscules, sans accents, ponctuation remplacée par des espaces"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', without_accents.lower()).strip()
+
+
+def trigrams(text):
+    """Trigrammes d'un texte normalisé (mots complétés comme pg_trgm)"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+class ClientSearchIndex:
+    """
+    Args:
+        clients (list): Clients réguliers actifs (dicts avec 'id' et 'nom_complet')
+        usage (dict): {client_id: nombre de courses récentes}
+    """
+
+    def __init__(self, clients, usage=None):
+        self._clients = {client['id']: client for client in clients}
+        self._usage = usage or {}
+        self._names = {}
+        self._words = []          # [(mot, client_id)] trié
+        self._trigrams = {}       # trigramme -> {client_id}
+
+        for client in clients:
+            name = normalize(client['nom_complet'])
+            self._names[client['id']] = name
+            for word in set(name.split()):
+                self._words.append((word, client['id']))
+
+            for gram in trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(client['id'])
+
+        self._words.sort()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def search(self, term, limit=10):
+        """
+        Clients correspondant à `term`, les plus pertinents d'abord.
+
+        Pertinence : nom commençant par le terme > mot commençant par le
+        terme > terme contenu dans le nom > similarité trigramme,
+        départagés par l'utilisation récente puis par ordre alphabétique.
+        """
+        query = normalize(term)
+        if not query:
+            return []
+
+        scores = {}
+
+        # Préfixes : le premier mot de la recherche suffit à réduire les candidats
+        first_word = query.split()[0]
+        start = bisect_left(self._words, (first_word,))
+        for word, client_id in self._words[start:]:
+            if not word.startswith(first_word):
+                break
+            scores[client_id] = 0.0
+
+        # Sous-chaînes (comme l'ancien LIKE '%terme%') : balayage des noms normalisés
+        for client_id, name in self._names.items():
+            if client_id not in scores and query in name:
+                scores[client_id] = 0.0
+
+        query_grams = trigrams(query)
+        counts = {}
+        for gram in query_grams:
+            for client_id in self._trigrams.get(gram, ()):
+                counts[client_id] = counts.get(client_id, 0) + 1
+
+        for client_id, shared in counts.items():
+            similarity = shared / len(query_grams)
+            if similarity >= MIN_TRIGRAM_SIMILARITY or client_id in scores:
+                scores[client_id] = similarity
+
+        query_words = query.split()
+        results = []
+        for client_id, similarity in scores.items():
+            name = self._names[client_id]
+            words = name.split()
+            if name.startswith(query):
+                relevance = 3.0
+            elif all(any(word.startswith(q) for word in words) for q in query_words):
+                relevance = 2.0
+            elif query in name:
+                relevance = 1.5
+            else:
+                relevance = similarity
+            relevance += USAGE_WEIGHT * math.log1p(self._usage.get(client_id, 0))
+            results.append((-relevance, name, client_id))
+
+        results.sort()
+        return [self._clients[client_id] for _, _, client_id in results[:limit]]
@@ -0,0 +1,169 @@
+"""
+MODÈLE COURSE - MODULE 11
+Transport DanGE Planning
+
+Enregistrement compact d'une course (__slots__), construit directement
+depuis une ligne tuple du curseur : aucun dict intermédiaire, une seule
+copie par ligne.
+
+Les champs dérivés utilisés par tous les affichages sont calculés une
+fois à la construction :
+- heure_paris / date_paris : heure prévue en heure de Paris
+- heure_pec : heure de prise en charge 'HH:MM' (colonne TIME, ou None)
+- heure_affichage : heure PEC, sinon heure prévue (Paris)
+
+L'accès façon dict (course['nom_client'], course.get(...)) reste possible
+pour le code d'affichage existant.
+"""
+
+import re
+from datetime import datetime, time
+
+import pytz
+
+TIMEZONE = pytz.timezone('Europe/Paris')
+
+# Colonnes lues depuis la requête (c.*, u.full_name AS chauffeur_name)
+COLUMNS = (
+    'id', 'chauffeur_id', 'nom_client', 'telephone_client', 'adresse_pec',
+    'lieu_depose', 'heure_prevue', 'heure_pec_prevue', 'temps_trajet_minutes',
+    'heure_depart_calculee', 'type_course', 'tarif_estime', 'km_estime',
+    'commentaire', 'commentaire_chauffeur', 'statut', 'date_creation',
+    'date_confirmation', 'date_pec', 'date_depose', 'created_by',
+    'client_regulier_id', 'chauffeur_name', 'visible_chauffeur', 'change_seq'
+)
+
+DERIVED = ('heure_paris', 'date_paris', 'heure_pec', 'heure_affichage', 'day_offset')
+
+# Saisie acceptée pour l'heure PEC : 'H:MM', 'HH:MM', '8h30', '17H50'
+_HEURE_PEC_PATTERN = re.compile(r'^\s*(\d{1,2})\s*[:hH]\s*(\d{2})\s*$')
+
+# Valeur d'une colonne absente de la requête
+_MISSING_DEFAULTS = {'visible_chauffeur': True}
+
+
+def normalize_heure_pec(heure):
+    """Normalise une heure 'H:MM' / 'HH:MM' (ou un objet time) en 'HH:MM' (None si vide ou invalide)"""
+    if not heure:
+        return None
+    if isinstance(heure, time):
+        return heure.strftime('%H:%M')
+    parts = str(heure).strip().split(':')
+    if len(parts) < 2:
+        return None
+    try:
+        return f"{int(parts[0]):02d}:{int(parts[1]):02d}"
+    except ValueError:
+        return None
+
+
+def parse_heure_pec(value):
+    """
+    Valide une heure PEC saisie avant écriture dans la colonne TIME.
+
+    Args:
+        value (str | time | None): Saisie ('HH:MM', 'H:MM', '8h30') ou objet time
+
+    Returns:
+        time | None: None si la saisie est vide
+
+    Raises:
+        ValueError: Format ou heure invalide
+    """
+    if value is None or isinstance(value, time):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    match = _HEURE_PEC_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Format d'heure PEC invalide : '{text}' (attendu HH:MM)")
+    heure, minute = int(match.group(1)), int(match.group(2))
+    if heure > 23 or minute > 59:
+        raise ValueError(f"Heure PEC invalide : '{text}'")
+    return time(heure, minute)
+
+
+class Course:
+    __slots__ = COLUMNS + DERIVED
+
+    def __init__(self, **values):
+        for name in COLUMNS:
+            setattr(self, name, values.get(name, _MISSING_DEFAULTS.get(name)))
+        self.day_offset = values.get('day_offset')
+        self._derive()
+
+    @classmethod
+    def from_tuple(cls, row, column_index):
+        """
+        Args:
+            row (tuple): Ligne d'un curseur tuple
+            column_index (dict): {colonne: position}, voir column_index()
+        """
+        course = cls.__new__(cls)
+        for name in COLUMNS:
+            position = column_index.get(name)
+            setattr(course, name, row[position] if position is not None else _MISSING_DEFAULTS.get(name))
+        course.day_offset = None
+        course._derive()
+        return course
+
+    def _derive(self):
+        heure_prevue = self.heure_prevue
+        if isinstance(heure_prevue, datetime):
+            if heure_prevue.tzinfo is None:
+                heure_prevue = TIMEZONE.localize(heure_prevue)
+            else:
+                heure_prevue = heure_prevue.astimezone(TIMEZONE)
+            self.heure_paris = heure_prevue
+            self.date_paris = heure_prevue.date()
+        else:
+            self.heure_paris = None
+            self.date_paris = None
+
+        self.heure_pec = normalize_heure_pec(self.heure_pec_prevue)
+        self.heure_affichage = self.heure_pec or (self.heure_paris.strftime('%H:%M') if self.heure_paris else '')
+
+    @property
+    def sort_key(self):
+        """Ordre du planning : date (Paris) puis heure PEC (ou heure prévue)"""
+        return (self.date_paris, self.heure_affichage)
+
+    # ============ ACCÈS FAÇON DICT ============
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return COLUMNS
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def __repr__(self):
+        return f"Course(id={self.id}, {self.date_paris} {self.heure_affichage}, {self.nom_client!r})"
+
+
+def column_index(cursor):
+    """{colonne: position} d'après cursor.description"""
+    return {column[0]: position for position, column in enumerate(cursor.description)}
+
+
+def courses_from_cursor(cursor):
+    """Courses d'un curseur tuple déjà exécuté"""
+    index = column_index(cursor)
+    return [Course.from_tuple(row, index) for row in cursor.fetchall()]
@@ -0,0 +1,240 @@
+"""
+POOL DE CONNEXIONS - MODULE 4
+Transport DanGE Planning
+
+Pool de connexions PostgreSQL thread-safe pour Streamlit (toutes les sessions
+sont servies par des threads du même process) :
+
+- taille min/max configurable
+- attente bornée quand le pool est plein (au lieu d'un PoolError immédiat)
+- health check à l'emprunt des connexions restées inactives
+- compteurs exposés par stats() pour dimensionner le pool
+"""
+
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    """Aucune connexion libérée avant la fin du délai d'attente"""
+
+
+class BoundedConnectionPool:
+    """
+    Pool thread-safe avec attente bornée.
+
+    Args:
+        minconn (int): Connexions ouvertes dès la création
+        maxconn (int): Nombre maximum de connexions ouvertes simultanément
+        timeout (float): Attente maximale (secondes) quand le pool est plein
+        health_check_interval (float): Une connexion inactive depuis plus
+            longtemps est vérifiée par un SELECT 1 avant d'être prêtée
+        **connect_kwargs: Paramètres passés à psycopg2.connect()
+    """
+
+    def __init__(self, minconn, maxconn, timeout=10.0, health_check_interval=30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Taille de pool invalide : min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._condition = threading.Condition()
+        self._idle = []          # [(conn, last_used)] - pile LIFO
+        self._in_use = set()     # id(conn) des connexions prêtées
+        self._size = 0           # connexions ouvertes (prêtées + inactives + en ouverture)
+        self._closed = False
+
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'exhaustion_events': 0,
+            'health_check_failures': 0,
+            'connections_opened': 0,
+            'connections_closed': 0
+        }
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._condition:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    # ============ EMPRUNT / RESTITUTION ============
+
+    def getconn(self, timeout=None):
+        """
+        Emprunte une connexion, en attendant au plus `timeout` secondes
+        (self.timeout par défaut) qu'une connexion se libère.
+
+        Raises:
+            PoolTimeout: Aucune connexion disponible dans le délai
+            PoolError: Pool fermé
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise PoolError("Pool de connexions fermé")
+
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn, last_used = None, None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['exhaustion_events'] += 1
+                        raise PoolTimeout(
+                            f"Pool saturé : aucune connexion libre après {timeout:.1f}s "
+                            f"({self.maxconn} connexions en cours d'utilisation)"
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+
+            # Ouverture / vérification hors du verrou
+            try:
+                if conn is None:
+                    conn = self._connect()
+                elif not self._is_healthy(conn, last_used):
+                    self._discard(conn, health_check_failed=True)
+                    continue
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+
+            wait_time = time.monotonic() - start
+            with self._condition:
+                self._in_use.add(id(conn))
+                self._counters['checkouts'] += 1
+                if waited:
+                    self._counters['waits'] += 1
+                    self._counters['wait_time_total'] += wait_time
+                    self._counters['wait_time_max'] = max(self._counters['wait_time_max'], wait_time)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Restitue une connexion (annule toute transaction laissée ouverte)"""
+        with self._condition:
+            known = id(conn) in self._in_use
+            self._in_use.discard(id(conn))
+
+        if not known:
+            # Connexion étrangère au pool : on la ferme simplement
+            if not conn.closed:
+                conn.close()
+            return
+
+        if not close and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        if close or conn.closed or self._closed:
+            self._discard(conn)
+            return
+
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def closeall(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for conn, _ in idle:
+            self._discard(conn)
+
+    # ============ COMPTEURS ============
+
+    def stats(self):
+        """
+        Compteurs du pool.
+
+        Returns:
+            dict: {
+                'size', 'in_use', 'idle', 'minconn', 'maxconn',
+                'checkouts', 'waits', 'wait_time_total', 'wait_time_avg',
+                'wait_time_max', 'exhaustion_events', 'health_check_failures',
+                'connections_opened', 'connections_closed'
+            }
+        """
+        with self._condition:
+            result = dict(self._counters)
+            result.update({
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'minconn': self.minconn,
+                'maxconn': self.maxconn
+            })
+
+        result['wait_time_avg'] = result['wait_time_total'] / result['waits'] if result['waits'] else 0.0
+        return result
+
+    # ============ INTERNE ============
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._condition:
+            self._counters['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn, health_check_failed=False):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._counters['connections_closed'] += 1
+            if health_check_failed:
+                self._counters['health_check_failures'] += 1
+            self._condition.notify()
+
+    def _is_healthy(self, conn, last_used):
+        """Connexion ouverte, et ping si elle est restée inactive trop longtemps"""
+        if conn.closed:
+            return False
+
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
@@ -0,0 +1,114 @@
+"""
+SESSION BASE DE DONNÉES PAR RERUN - MODULE 5
+Transport DanGE Planning
+
+Unité de travail liée à UNE exécution du script Streamlit (un rerun) :
+
+- la connexion est empruntée au pool paresseusement, à la première requête
+- toutes les fonctions d'accès aux données du rerun la réutilisent
+- elle est rendue au pool une seule fois, en fin de rerun
+
+La connexion reste empruntée pendant tout le rerun, mais pas la
+transaction : dès que la dernière fonction d'accès aux données en cours
+rend la connexion (release), la transaction ouverte est annulée. Les
+écritures ont déjà validé (commit) ; une écriture qui aurait oublié de le
+faire est annulée, comme lors de la restitution au pool. Aucun snapshot ni
+verrou n'est donc gardé pendant le rendu ou les appels HTTP de l'assistant.
+
+Streamlit exécute chaque rerun dans son propre thread : la session courante
+est donc stockée dans un threading.local (les threads d'arrière-plan n'en
+ont pas et empruntent directement au pool).
+"""
+
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+_local = threading.local()
+
+
+class RequestSession:
+    """
+    Args:
+        acquire (callable): Emprunte une connexion (ou renvoie None)
+        release (callable): Rend une connexion au pool
+    """
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+        self._conn = None
+        self._depth = 0    # fonctions d'accès aux données en cours sur la connexion
+        self.uses = 0
+
+    def connection(self):
+        """Connexion du rerun (empruntée au premier appel)"""
+        if self._conn is None or self._conn.closed:
+            self._conn = self._acquire()
+            self._depth = 0
+        elif self._conn.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+            # Une requête précédente a échoué : on repart d'une transaction propre
+            self._conn.rollback()
+
+        if self._conn is not None:
+            self.uses += 1
+            self._depth += 1
+        return self._conn
+
+    def owns(self, conn):
+        return conn is not None and conn is self._conn
+
+    def release(self, conn):
+        """
+        Appelé par les fonctions d'accès aux données à la place de la restitution
+        au pool : la connexion reste attachée au rerun, la transaction est
+        terminée dès que plus aucune fonction ne l'utilise.
+        """
+        if not self.owns(conn) or conn.closed:
+            return
+
+        self._depth = max(self._depth - 1, 0)
+        if self._depth == 0 or conn.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+            _rollback(conn)
+
+    def close(self):
+        """Fin du rerun : annule la transaction éventuellement restée ouverte et rend la connexion"""
+        conn, self._conn = self._conn, None
+        self._depth = 0
+        if conn is None:
+            return
+
+        try:
+            _rollback(conn)
+        finally:
+            self._release(conn)
+
+
+def _rollback(conn):
+    """Annule la transaction en cours (lectures terminées, écriture non validée)"""
+    try:
+        if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+
+
+def begin_request_session(acquire, release):
+    """Ouvre la session du rerun courant (ferme une éventuelle session oubliée)"""
+    end_request_session()
+    _local.session = RequestSession(acquire, release)
+    return _local.session
+
+
+def get_request_session():
+    """Session du rerun courant, ou None (thread d'arrière-plan, hors rerun)"""
+    return getattr(_local, 'session', None)
+
+
+def end_request_session():
+    """Ferme la session du rerun courant"""
+    session = getattr(_local, 'session', None)
+    _local.session = None
+    if session is not None:
+        session.close()
@@ -0,0 +1,313 @@
+"""
+CACHE DES DISTANCES - MODULE 13
+Transport DanGE Planning
+
+Cache à deux niveaux devant assistant.calculate_distance() :
+
+- LRU en mémoire, borné, propre au process (aucune requête SQL)
+- table distance_cache (migrations/0013) partagée par tous les process et
+  réplicas
+
+Les clés sont les adresses normalisées ("Chartres Gare" et "chartres, gare"
+sont le même trajet). Chaque entrée a une durée de vie ; les trajets
+introuvables sont mis en cache négatif (durée plus courte) pour ne pas
+rappeler l'API à chaque suggestion. Les erreurs passagères (timeout, quota,
+erreur réseau) ne sont jamais mises en cache.
+
+Le cache est "best effort" : une erreur de base de données est comptée
+puis ignorée, le calcul continue sans le niveau partagé.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+from client_search import normalize
+
+# Durée de vie d'une distance calculée (les routes changent peu)
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+
+# Durée de vie d'un trajet introuvable (adresse corrigée entre-temps...)
+NEGATIVE_TTL_SECONDS = 6 * 3600
+
+# Entrées gardées en mémoire par process
+DEFAULT_MAXSIZE = 2048
+
+# Statuts Google définitifs pour un couple d'adresses : mis en cache négatif
+NEGATIVE_STATUSES = ('NOT_FOUND', 'ZERO_RESULTS', 'MAX_ROUTE_LENGTH_EXCEEDED')
+
+
+def address_key(address):
+    """Clé de cache d'une adresse : minuscules, sans accents ni ponctuation"""
+    return normalize(address)
+
+
+def is_cacheable(result):
+    """
+    Un résultat est mis en cache s'il est valide ou définitivement introuvable
+    (jamais une estimation hors ligne)
+    """
+    if result.get('estimated'):
+        return False
+    return result.get('success') or result.get('status') in NEGATIVE_STATUSES
+
+
+def distance_result(distance_meters, duration_seconds):
+    """Résultat de calculate_distance() pour un trajet trouvé"""
+    return {
+        'distance_km': round(distance_meters / 1000, 2),
+        'distance_meters': distance_meters,
+        'duration_min': round(duration_seconds / 60),
+        'duration_seconds': duration_seconds,
+        'status': 'OK',
+        'success': True,
+        'error': None
+    }
+
+
+class DistanceCache:
+    """
+    Args:
+        connect (callable): Renvoie une connexion psycopg2 dédiée, que le cache
+            valide ou annule lui-même (None = pas de niveau partagé)
+        release (callable): Rend la connexion obtenue par connect
+        maxsize (int): Entrées gardées en mémoire
+        ttl (float): Durée de vie d'une distance (secondes)
+        negative_ttl (float): Durée de vie d'un trajet introuvable (secondes)
+    """
+
+    def __init__(self, connect=None, release=None, maxsize=DEFAULT_MAXSIZE,
+                 ttl=DEFAULT_TTL_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS):
+        self._connect = connect
+        self._release = release
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()    # (origine, destination) -> (expire_à, résultat)
+        self._counters = {
+            'memory_hits': 0,
+            'db_hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'stores': 0,
+            'evictions': 0,
+            'db_errors': 0
+        }
+
+    def get(self, origin, destination):
+        """
+        Résultat en cache pour un trajet (mémoire, puis table partagée).
+
+        Returns:
+            dict | None: Résultat de calculate_distance() ou None si absent / expiré
+        """
+        return self.get_many([(origin, destination)]).get((origin, destination))
+
+    def get_many(self, pairs):
+        """
+        Résultats en cache pour plusieurs trajets : mémoire, puis UNE requête
+        sur la table partagée pour les trajets absents de la mémoire.
+
+        Args:
+            pairs (list): [(origine, destination)]
+
+        Returns:
+            dict: {(origine, destination): résultat} - trajets absents / expirés omis
+        """
+        found = {}
+        missing = {}    # clé normalisée -> [(origine, destination)]
+        now = time.time()
+
+        with self._lock:
+            for pair in pairs:
+                key = (address_key(pair[0]), address_key(pair[1]))
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    missing.setdefault(key, []).append(pair)
+                    continue
+                self._entries.move_to_end(key)
+                self._count('memory_hits', entry[1])
+                found[pair] = dict(entry[1])
+
+        rows = self._load(list(missing)) if missing else {}
+
+        with self._lock:
+            for key, missing_pairs in missing.items():
+                row = rows.get(key)
+                for pair in missing_pairs:
+                    if row is None:
+                        self._counters['misses'] += 1
+                        continue
+                    self._count('db_hits', row[1])
+                    found[pair] = dict(row[1])
+                if row is not None:
+                    self._remember(key, *row)
+
+        return found
+
+    def put(self, origin, destination, result):
+        """Enregistre un résultat (ignoré si l'erreur est passagère)"""
+        self.put_many([(origin, destination, result)])
+
+    def put_many(self, items):
+        """
+        Enregistre plusieurs résultats (UNE requête sur la table partagée).
+        Les erreurs passagères sont ignorées.
+
+        Args:
+            items (list): [(origine, destination, résultat)]
+        """
+        entries = {}
+        for origin, destination, result in items:
+            if not is_cacheable(result):
+                continue
+            if result['success']:
+                result, ttl = distance_result(result['distance_meters'], result['duration_seconds']), self.ttl
+            else:
+                result, ttl = {'success': False, 'status': result['status'], 'error': result.get('error')}, self.negative_ttl
+            entries[(address_key(origin), address_key(destination))] = (result, ttl)
+
+        if not entries:
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (result, ttl) in entries.items():
+                self._remember(key, now + ttl, result)
+                self._counters['stores'] += 1
+
+        self._store(entries)
+
+    def stats(self):
+        """
+        Compteurs du cache.
+
+        Returns:
+            dict: {
+                'size', 'maxsize', 'memory_hits', 'db_hits', 'misses',
+                'negative_hits', 'stores', 'evictions', 'db_errors', 'hit_rate'
+            }
+        """
+        with self._lock:
+            result = dict(self._counters, size=len(self._entries), maxsize=self.maxsize)
+
+        lookups = result['memory_hits'] + result['db_hits'] + result['misses']
+        result['hit_rate'] = (result['memory_hits'] + result['db_hits']) / lookups if lookups else 0.0
+        return result
+
+    def clear(self):
+        """Vide le niveau mémoire (la table partagée est conservée)"""
+        with self._lock:
+            self._entries.clear()
+
+    # ============ INTERNE ============
+
+    def _count(self, counter, result):
+        self._counters[counter] += 1
+        if not result['success']:
+            self._counters['negative_hits'] += 1
+
+    def _remember(self, key, expires_at, result):
+        """Appelé sous self._lock"""
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _load(self, keys):
+        """{clé: (expire_à, résultat)} des trajets valides de la table partagée"""
+        if self._connect is None:
+            return {}
+        conn = self._connect()
+        if conn is None:
+            return {}
+        try:
+            cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            cursor.execute('''
+                SELECT d.origin_key, d.destination_key, d.status, d.distance_meters,
+                       d.duration_seconds, d.error, EXTRACT(EPOCH FROM d.expires_at)
+                FROM unnest(%s::text[], %s::text[]) AS k(origin_key, destination_key)
+                JOIN distance_cache d
+                  ON d.origin_key = k.origin_key AND d.destination_key = k.destination_key
+                WHERE d.expires_at > NOW()
+            ''', ([key[0] for key in keys], [key[1] for key in keys]))
+            rows = cursor.fetchall()
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            with self._lock:
+                self._counters['db_errors'] += 1
+            return {}
+        finally:
+            self._release(conn)
+
+        loaded = {}
+        for origin_key, destination_key, status, distance_meters, duration_seconds, error, expires_at in rows:
+            if status == 'OK':
+                result = distance_result(distance_meters, duration_seconds)
+            else:
+                result = {'success': False, 'status': status, 'error': error}
+            loaded[(origin_key, destination_key)] = (float(expires_at), result)
+        return loaded
+
+    def _store(self, entries):
+        """entries : {clé: (résultat, durée de vie)}"""
+        if self._connect is None:
+            return
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            cursor = conn.cursor()
+            execute_values(cursor, '''
+                INSERT INTO distance_cache (
+                    origin_key, destination_key, status, distance_meters,
+                    duration_seconds, error, fetched_at, expires_at
+                )
+                SELECT v.origin_key, v.destination_key, v.status, v.distance_meters,
+                       v.duration_seconds, v.error, NOW(), NOW() + make_interval(secs => v.ttl)
+                FROM (VALUES %s) AS v(origin_key, destination_key, status, distance_meters,
+                                      duration_seconds, error, ttl)
+                ON CONFLICT (origin_key, destination_key) DO UPDATE SET
+                    status = EXCLUDED.status,
+                    distance_meters = EXCLUDED.distance_meters,
+                    duration_seconds = EXCLUDED.duration_seconds,
+                    error = EXCLUDED.error,
+                    fetched_at = EXCLUDED.fetched_at,
+                    expires_at = EXCLUDED.expires_at
+            ''', [
+                key + (
+                    result['status'],
+                    result.get('distance_meters'),
+                    result.get('duration_seconds'),
+                    result.get('error'),
+                    float(ttl)
+                )
+                for key, (result, ttl) in entries.items()
+            ], template='(%s, %s, %s, %s::integer, %s::integer, %s, %s::float8)')
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            with self._lock:
+                self._counters['db_errors'] += 1
+        finally:
+            self._release(conn)
+
+
+def purge_expired_distances(conn):
+    """Supprime les entrées expirées de distance_cache - renvoie le nombre de lignes"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM distance_cache WHERE expires_at <= NOW()')
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
@@ -0,0 +1,351 @@
+"""
+FOURNISSEURS DE DISTANCE - MODULE 14
+Transport DanGE Planning
+
+Interface commune derrière assistant.calculate_distance() :
+
+- GoogleDistanceProvider : API Google Distance Matrix (session HTTP
+  partagée, requêtes groupées par 25 origines envoyées en parallèle,
+  délai global)
+- OfflineDistanceProvider : estimation sans réseau. Les adresses sont
+  géocodées par un répertoire local (communes d'Eure-et-Loir et adresses
+  fréquentes, data/gazetteer_eure_et_loir.csv), la distance est la
+  distance à vol d'oiseau (haversine) multipliée par un facteur routier,
+  la durée vient d'un modèle de vitesse par tranche de distance
+
+Un fournisseur renvoie, pour chaque origine, le même dict que
+calculate_distance(). Les estimations hors ligne portent 'estimated': True
+et ne sont jamais mises en cache.
+
+Pour les tests, distance_stub.py fournit un faux serveur Distance Matrix
+local à passer en url= de GoogleDistanceProvider.
+"""
+
+import csv
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from client_search import normalize
+from distance_cache import distance_result
+
+# URL de l'API Google Maps Distance Matrix
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+# Limite de l'API : 25 origines par requête
+MAX_ORIGINS_PER_REQUEST = 25
+
+# Délai maximal d'une requête HTTP (secondes)
+REQUEST_TIMEOUT_SECONDS = 10
+
+# Requêtes Distance Matrix simultanées (et connexions gardées ouvertes)
+MAX_CONCURRENT_REQUESTS = 4
+
+# Répertoire des lieux connus pour l'estimation hors ligne
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer_eure_et_loir.csv')
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Distance routière / distance à vol d'oiseau (réseau rural, moyenne observée)
+ROAD_FACTOR = 1.3
+
+# Trajet minimal (deux adresses de la même commune)
+MIN_ROAD_KM = 1.0
+
+# Modèle de vitesse : (km de la tranche, km/h) - ville, routes départementales, au-delà
+SPEED_MODEL = ((3.0, 30.0), (15.0, 60.0), (None, 80.0))
+
+_POSTAL_CODE = re.compile(r'\b(28\d{3})\b')
+
+_http_lock = threading.Lock()
+_http_session = None
+_http_executor = None
+
+
+def get_http_session():
+    """Session HTTP partagée par tous les threads du process (pool keep-alive)"""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def _get_executor():
+    global _http_executor
+    with _http_lock:
+        if _http_executor is None:
+            _http_executor = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_REQUESTS,
+                thread_name_prefix='distance-matrix'
+            )
+        return _http_executor
+
+
+def _failure(status, error):
+    return {'success': False, 'status': status, 'error': error}
+
+
+class DistanceProvider:
+    """
+    Interface d'un fournisseur de distances.
+
+    Attributes:
+        name (str): Identifiant du fournisseur
+        cacheable (bool): Résultats à garder dans le cache des distances
+    """
+
+    name = None
+    cacheable = True
+
+    def distances(self, origins, destination, deadline=None):
+        """
+        Distances de plusieurs origines (sans doublons) vers une destination.
+
+        Args:
+            origins (list): Adresses de départ
+            destination (str): Adresse d'arrivée
+            deadline (float): Échéance time.monotonic() (None = pas de limite globale)
+
+        Returns:
+            dict: {origine: résultat de calculate_distance()}
+        """
+        raise NotImplementedError
+
+
+# ============================================
+# GOOGLE DISTANCE MATRIX
+# ============================================
+
+class GoogleDistanceProvider(DistanceProvider):
+    """
+    Args:
+        api_key (str): Clé API Google Maps
+        url (str): Point d'accès Distance Matrix (serveur de test : distance_stub.py)
+    """
+
+    name = 'google'
+
+    def __init__(self, api_key, url=DISTANCE_MATRIX_URL):
+        self.api_key = api_key
+        self.url = url
+
+    def distances(self, origins, destination, deadline=None):
+        """
+        Une requête par groupe de MAX_ORIGINS_PER_REQUEST origines, les
+        groupes étant envoyés en parallèle (MAX_CONCURRENT_REQUESTS au plus).
+
+        Les origines dont la réponse n'est pas arrivée à l'échéance reçoivent
+        un résultat en échec (status None : jamais mis en cache).
+        """
+        if deadline is None:
+            deadline = time.monotonic() + REQUEST_TIMEOUT_SECONDS
+
+        chunks = [origins[start:start + MAX_ORIGINS_PER_REQUEST]
+                  for start in range(0, len(origins), MAX_ORIGINS_PER_REQUEST)]
+
+        executor = _get_executor()
+        futures = {
+            executor.submit(self._fetch_matrix, chunk, destination, deadline): chunk
+            for chunk in chunks
+        }
+        done, _ = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+
+        results = {}
+        for future, chunk in futures.items():
+            if future in done:
+                results.update(zip(chunk, future.result()))
+            else:
+                # Réponse trop tardive : abandonnée (la requête se termine seule)
+                for origin in chunk:
+                    results[origin] = _failure(None, 'Timeout: deadline exceeded')
+        return results
+
+    def _fetch_matrix(self, origins, destination, deadline):
+        """Une requête Distance Matrix : un résultat par origine, dans l'ordre"""
+        params = {
+            'origins': '|'.join(origins),
+            'destinations': destination,
+            'key': self.api_key,
+            'language': 'fr',
+            'units': 'metric'
+        }
+
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout()
+
+            # Session partagée : connexion réutilisée
+            response = get_http_session().get(
+                self.url,
+                params=params,
+                timeout=min(remaining, REQUEST_TIMEOUT_SECONDS)
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get('status') != 'OK':
+                error = _failure(
+                    data.get('status'),
+                    f"API Error: {data.get('status')} - {data.get('error_message', 'Unknown error')}"
+                )
+                return [dict(error) for _ in origins]
+
+            rows = data.get('rows') or []
+            if len(rows) != len(origins):
+                error = _failure(
+                    None,
+                    f"API Error: {len(rows)} ligne(s) reçue(s) pour {len(origins)} origine(s)"
+                )
+                return [dict(error) for _ in origins]
+
+            # Une ligne par origine, un élément (la destination) par ligne
+            return [self._element_result(row['elements'][0]) for row in rows]
+
+        except requests.exceptions.Timeout:
+            error = _failure(None, 'Timeout: API took too long to respond')
+        except requests.exceptions.RequestException as e:
+            error = _failure(None, f'Request Error: {str(e)}')
+        except Exception as e:
+            error = _failure(None, f'Unexpected Error: {str(e)}')
+        return [dict(error) for _ in origins]
+
+    @staticmethod
+    def _element_result(element):
+        if element.get('status') != 'OK':
+            return _failure(element.get('status'), f"Route Error: {element.get('status')}")
+        return distance_result(element['distance']['value'], element['duration']['value'])
+
+
+# ============================================
+# ESTIMATION HORS LIGNE
+# ============================================
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance à vol d'oiseau entre deux points (km)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def estimate_duration_seconds(road_km, speed_model=SPEED_MODEL):
+    """Durée d'un trajet routier selon le modèle de vitesse par tranche"""
+    seconds = 0.0
+    remaining = road_km
+    for length, speed in speed_model:
+        part = remaining if length is None else min(remaining, length)
+        seconds += part / speed * 3600
+        remaining -= part
+        if remaining <= 0:
+            break
+    return seconds
+
+
+class Gazetteer:
+    """
+    Répertoire local de lieux (coordonnées approximatives) pour géocoder
+    une adresse sans réseau.
+
+    Une adresse est reconnue par le nom d'un lieu qu'elle contient (mots
+    entiers, sans accents ni casse) : une adresse fréquente ("Chartres
+    Gare", "Hôpital de Dreux") l'emporte sur une commune ; entre communes,
+    c'est la dernière citée ("Rue de Chartres, Dreux" -> Dreux). Si
+    l'adresse a un code postal (28xxx), seule une commune citée après lui
+    est retenue ; à défaut, le code désigne la première commune du
+    répertoire pour ce code.
+
+    Args:
+        path (str): Fichier CSV (nom, code_postal, latitude, longitude, type)
+        maxsize (int): Adresses géocodées gardées en mémoire
+    """
+
+    def __init__(self, path=GAZETTEER_PATH, maxsize=4096):
+        self._addresses = []    # [(' nom normalisé ', lat, lon, libellé)]
+        self._communes = []
+        self._postal_codes = {}
+
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                entry = (f" {normalize(row['nom'])} ", float(row['latitude']), float(row['longitude']), row['nom'])
+                if row['type'] == 'adresse':
+                    self._addresses.append(entry)
+                else:
+                    self._communes.append(entry)
+                    self._postal_codes.setdefault(row['code_postal'], entry)
+
+        self.geocode = lru_cache(maxsize=maxsize)(self._geocode)
+
+    def __len__(self):
+        return len(self._addresses) + len(self._communes)
+
+    def _geocode(self, address):
+        """(latitude, longitude, libellé) ou None si le lieu est inconnu"""
+        text = f" {normalize(address)} "
+
+        best = None
+        for name, lat, lon, label in self._addresses:
+            if name in text and (best is None or len(name) > len(best[0])):
+                best = (name, lat, lon, label)
+        if best is not None:
+            return best[1:]
+
+        # Avec un code postal, seule une commune citée APRÈS lui compte : un
+        # nom placé avant est celui d'une rue ("5 rue de Chartres, 28190 ...")
+        match = _POSTAL_CODE.search(text)
+        best_position = match.end() - 1 if match else -1
+        for name, lat, lon, label in self._communes:
+            position = text.rfind(name)
+            if position > best_position or (position == best_position >= 0 and len(name) > len(best[0])):
+                best_position = position
+                best = (name, lat, lon, label)
+        if best is not None:
+            return best[1:]
+
+        if match and match.group(1) in self._postal_codes:
+            return self._postal_codes[match.group(1)][1:]
+        return None
+
+
+class OfflineDistanceProvider(DistanceProvider):
+    """
+    Estimation sans réseau : haversine x facteur routier, durée par modèle
+    de vitesse. Quelques microsecondes par trajet, résultats reproductibles.
+
+    Args:
+        gazetteer (Gazetteer): Répertoire des lieux (chargé depuis GAZETTEER_PATH si None)
+        road_factor (float): Distance routière / distance à vol d'oiseau
+    """
+
+    name = 'offline'
+    cacheable = False
+
+    def __init__(self, gazetteer=None, road_factor=ROAD_FACTOR):
+        self.gazetteer = gazetteer or Gazetteer()
+        self.road_factor = road_factor
+
+    def distances(self, origins, destination, deadline=None):
+        target = self.gazetteer.geocode(destination)
+        return {origin: self._estimate(self.gazetteer.geocode(origin), target) for origin in origins}
+
+    def _estimate(self, start, target):
+        if start is None or target is None:
+            return _failure('NOT_FOUND', 'Route Error: NOT_FOUND (lieu absent du répertoire)')
+
+        road_km = max(haversine_km(start[0], start[1], target[0], target[1]) * self.road_factor, MIN_ROAD_KM)
+        result = distance_result(round(road_km * 1000), round(estimate_duration_seconds(road_km)))
+        result['estimated'] = True
+        return result
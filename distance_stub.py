@@ -0,0 +1,133 @@
+"""
+SERVEUR DISTANCE MATRIX DE TEST - MODULE 15
+Transport DanGE Planning
+
+Faux serveur Google Distance Matrix, local et sans clé, pour tester et
+mesurer le chemin réseau de l'assistant (requêtes groupées, session
+keep-alive, délai global) de façon reproductible :
+
+    with StubDistanceMatrixServer(latency=0.2) as server:
+        provider = GoogleDistanceProvider('stub', url=server.url)
+
+Les distances sont celles de l'estimation hors ligne (OfflineDistanceProvider),
+au format JSON de l'API. Latence et taux d'erreur sont réglables ; les
+erreurs sont tirées avec une graine fixe.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from distance_providers import MAX_ORIGINS_PER_REQUEST, OfflineDistanceProvider
+
+
+class StubDistanceMatrixServer:
+    """
+    Args:
+        latency (float): Délai ajouté à chaque réponse (secondes)
+        error_rate (float): Part des requêtes répondues en UNKNOWN_ERROR
+        seed (int): Graine du tirage des erreurs
+        provider (DistanceProvider): Calcul des distances (hors ligne par défaut)
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, provider=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.provider = provider or OfflineDistanceProvider()
+        self.requests = 0
+        self.elements = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/maps/api/distancematrix/json"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='distance-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, query):
+        """Réponse JSON (dict) à une requête Distance Matrix"""
+        origins = [o for o in query.get('origins', [''])[0].split('|') if o]
+        destinations = [d for d in query.get('destinations', [''])[0].split('|') if d]
+
+        with self._lock:
+            self.requests += 1
+            self.elements += len(origins) * len(destinations)
+            failed = self._random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not origins or not destinations:
+            return {'status': 'INVALID_REQUEST', 'rows': []}
+        if len(origins) > MAX_ORIGINS_PER_REQUEST:
+            return {'status': 'MAX_DIMENSIONS_EXCEEDED', 'rows': []}
+        if failed:
+            return {'status': 'UNKNOWN_ERROR', 'error_message': 'Stub: erreur simulée', 'rows': []}
+
+        by_destination = [self.provider.distances(origins, destination) for destination in destinations]
+        rows = []
+        for origin in origins:
+            elements = []
+            for results in by_destination:
+                result = results[origin]
+                if result['success']:
+                    elements.append({
+                        'status': 'OK',
+                        'distance': {'value': result['distance_meters'], 'text': f"{result['distance_km']} km"},
+                        'duration': {'value': result['duration_seconds'], 'text': f"{result['duration_min']} min"}
+                    })
+                else:
+                    elements.append({'status': result['status']})
+            rows.append({'elements': elements})
+
+        return {
+            'status': 'OK',
+            'origin_addresses': origins,
+            'destination_addresses': destinations,
+            'rows': rows
+        }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'    # keep-alive, comme l'API
+            disable_nagle_algorithm = True   # pas d'attente d'ACK entre en-têtes et corps
+
+            def do_GET(self):
+                body = json.dumps(stub.respond(parse_qs(urlparse(self.path).query))).encode('utf-8')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client parti avant la réponse (délai global dépassé)
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
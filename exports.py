@@ -0,0 +1,149 @@
+"""
+EXPORTS - MODULE 9
+Transport DanGE Planning
+
+Exports de courses en flux, sans DataFrame intermédiaire :
+
+- CSV : COPY (SELECT ...) TO STDOUT WITH CSV HEADER, écrit par blocs
+  directement dans le tampon de téléchargement
+- Excel : classeur openpyxl en mode write-only alimenté ligne à ligne par
+  un curseur serveur ; les largeurs de colonnes arrivent avec les lignes
+  (calculées par la requête), une feuille par jour ou par chauffeur
+
+La mémoire utilisée reste celle du fichier produit, quel que soit le
+nombre de lignes exportées.
+"""
+
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+# Taille des blocs lus depuis le serveur pendant un COPY
+COPY_CHUNK_SIZE = 64 * 1024
+
+# BOM UTF-8 : Excel ouvre alors le CSV avec les accents corrects
+UTF8_BOM = b'\xef\xbb\xbf'
+
+EXPORT_TIMEZONE = 'Europe/Paris'
+
+# Lignes rapatriées par aller-retour depuis un curseur serveur
+SERVER_CURSOR_ITERSIZE = 2000
+
+# Largeur maximale d'une colonne Excel (caractères)
+MAX_COLUMN_WIDTH = 50
+
+# Caractères interdits dans un nom de feuille Excel
+_FORBIDDEN_SHEET_CHARS = str.maketrans({c: '-' for c in '[]:*?/\\'})
+
+
+def copy_query_to_csv(cursor, query, params=None, out=None, chunk_size=COPY_CHUNK_SIZE, bom=True):
+    """
+    Exporte le résultat d'une requête SELECT en CSV (avec en-têtes) via COPY.
+
+    Les dates avec fuseau sont rendues en heure de Paris (SET LOCAL TimeZone,
+    limité à la transaction en cours).
+
+    Args:
+        cursor: Curseur psycopg2
+        query (str): Requête SELECT (paramètres %s)
+        params (tuple): Paramètres de la requête
+        out: Fichier binaire de destination (BytesIO créé si None)
+        chunk_size (int): Taille des blocs transférés
+        bom (bool): Préfixer le fichier du BOM UTF-8
+
+    Returns:
+        tuple: (out positionné au début, nombre de lignes exportées ou None)
+    """
+    if out is None:
+        out = BytesIO()
+    if bom:
+        out.write(UTF8_BOM)
+
+    select = cursor.mogrify(query, params).decode('utf-8')
+    cursor.execute("SET LOCAL TimeZone = %s", (EXPORT_TIMEZONE,))
+    cursor.copy_expert(
+        f"COPY ({select}) TO STDOUT WITH (FORMAT CSV, HEADER, ENCODING 'UTF8')",
+        out,
+        size=chunk_size
+    )
+
+    row_count = cursor.rowcount if cursor.rowcount >= 0 else None
+    out.seek(0)
+    return out, row_count
+
+
+def sheet_title(name, used):
+    """Nom de feuille Excel valide (31 caractères, sans []:*?/\\) et unique"""
+    base = (str(name or 'Sans nom').translate(_FORBIDDEN_SHEET_CHARS).strip("' ") or 'Sans nom')[:31]
+    title, suffix = base, 2
+    while title.lower() in used:
+        tag = f" ({suffix})"
+        title = base[:31 - len(tag)] + tag
+        suffix += 1
+    used.add(title.lower())
+    return title
+
+
+def rows_to_xlsx(rows, headers, out=None, max_width=MAX_COLUMN_WIDTH):
+    """
+    Écrit un classeur Excel en mode write-only, ligne par ligne.
+
+    Les lignes d'une même feuille doivent être consécutives. En mode
+    write-only les largeurs doivent être connues AVANT la première ligne :
+    chaque ligne porte donc les largeurs maximales de sa feuille (calculées
+    par la requête, ex: MAX(length(...)) OVER (PARTITION BY feuille)).
+
+    Args:
+        rows: itérable de tuples (feuille, largeurs, valeurs)
+        headers (list): En-têtes de colonnes
+        out: Fichier binaire de destination (BytesIO créé si None)
+        max_width (int): Largeur maximale d'une colonne
+
+    Returns:
+        tuple: (out positionné au début, nombre de lignes, noms des feuilles)
+            ou (None, 0, []) si aucune ligne
+    """
+    workbook = Workbook(write_only=True)
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_alignment = Alignment(horizontal="center")
+
+    used_titles = set()
+    sheets = []
+    current_sheet = None
+    worksheet = None
+    count = 0
+
+    for sheet, widths, values in rows:
+        if worksheet is None or sheet != current_sheet:
+            current_sheet = sheet
+            worksheet = workbook.create_sheet(sheet_title(sheet, used_titles))
+            sheets.append(worksheet.title)
+
+            for i, header in enumerate(headers, start=1):
+                width = max(widths[i - 1] or 0, len(header)) + 2
+                worksheet.column_dimensions[get_column_letter(i)].width = min(width, max_width)
+
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(worksheet, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.alignment = header_alignment
+                header_cells.append(cell)
+            worksheet.append(header_cells)
+
+        worksheet.append(list(values))
+        count += 1
+
+    if not count:
+        return None, 0, []
+
+    if out is None:
+        out = BytesIO()
+    workbook.save(out)
+    out.seek(0)
+    return out, count, sheets
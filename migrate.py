@@ -0,0 +1,286 @@
+"""
+MIGRATIONS DE SCHÉMA - MODULE 3
+Transport DanGE Planning
+
+Applique, dans l'ordre, les fichiers SQL du dossier migrations/ :
+
+    migrations/0001_notifications.sql
+    migrations/0002_courses_indexes.sql
+    ...
+
+Chaque migration appliquée est enregistrée dans la table schema_migrations.
+Le runner est appelé UNE fois par process (voir init_db() dans app.py) :
+les reruns Streamlit n'exécutent plus aucun DDL.
+
+Une migration dont la première ligne est :
+
+    -- migrate: no-transaction
+
+est exécutée instruction par instruction en autocommit (obligatoire pour
+CREATE INDEX CONCURRENTLY). Les autres sont exécutées dans une transaction.
+"""
+
+import os
+import re
+
+# Dossier des fichiers de migration
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Verrou consultatif : un seul process applique les migrations à la fois
+MIGRATIONS_LOCK_ID = 2828001
+
+NO_TRANSACTION_DIRECTIVE = '-- migrate: no-transaction'
+
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d+)_([\w\-]+)\.sql$')
+CONCURRENT_INDEX_PATTERN = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?("?[\w]+"?)',
+    re.IGNORECASE
+)
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Liste les fichiers de migration triés par version.
+
+    Returns:
+        list: [{'version': int, 'name': str, 'path': str}, ...]
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append({
+                'version': int(match.group(1)),
+                'name': match.group(2),
+                'path': os.path.join(directory, filename)
+            })
+
+    migrations.sort(key=lambda m: m['version'])
+
+    versions = [m['version'] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Numéros de migration en double dans {directory}")
+
+    return migrations
+
+
+def split_sql_statements(sql):
+    """
+    Découpe un script SQL en instructions.
+    Gère les commentaires -- et /* ... */ (imbriqués), les chaînes '...',
+    E'...' (échappements \\') et les blocs $tag$ ... $tag$ (corps de
+    fonctions PL/pgSQL).
+    """
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+
+    while i < length:
+        char = sql[i]
+
+        # Commentaire ligne
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = length if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+            continue
+
+        # Commentaire bloc (imbrications comprises, comme PostgreSQL)
+        if sql.startswith('/*', i):
+            depth = 1
+            end = i + 2
+            while end < length and depth:
+                if sql.startswith('/*', end):
+                    depth += 1
+                    end += 2
+                elif sql.startswith('*/', end):
+                    depth -= 1
+                    end += 2
+                else:
+                    end += 1
+            current.append(sql[i:end])
+            i = end
+            continue
+
+        # Chaîne littérale ('...' ou E'...' avec échappements \)
+        if char == "'":
+            escapes = i > 0 and sql[i - 1] in 'eE' and (i < 2 or not (sql[i - 2].isalnum() or sql[i - 2] == '_'))
+            end = i + 1
+            while end < length:
+                if escapes and sql[end] == '\\':
+                    end += 2
+                    continue
+                if sql[end] == "'":
+                    if sql.startswith("''", end):
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+
+        # Bloc dollar-quoted
+        if char == '$':
+            match = re.match(r'\$[A-Za-z_]*\$', sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = length if end == -1 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+                continue
+
+        if char == ';':
+            statement = ''.join(current).strip()
+            if _has_code(statement):
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if _has_code(statement):
+        statements.append(statement)
+
+    return statements
+
+
+# Commentaire bloc le plus interne (les imbrications sont retirées une à une)
+_BLOCK_COMMENT_PATTERN = re.compile(r'/\*(?:(?!/\*|\*/).)*\*/', re.DOTALL)
+
+
+def _has_code(statement):
+    """True si l'instruction contient autre chose que des commentaires"""
+    previous = None
+    while previous != statement:
+        previous, statement = statement, _BLOCK_COMMENT_PATTERN.sub('', statement)
+    return any(line.strip() and not line.strip().startswith('--') for line in statement.splitlines())
+
+
+def get_applied_versions(conn):
+    """Versions déjà appliquées (lecture seule, aucun DDL si la table existe)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    exists = cursor.fetchone()[0]
+
+    if not exists:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ DEFAULT NOW()
+            )
+        ''')
+        return set()
+
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migration(conn, migration):
+    """Applique une migration et l'enregistre dans schema_migrations"""
+    with open(migration['path'], encoding='utf-8') as f:
+        sql = f.read()
+
+    cursor = conn.cursor()
+
+    if sql.lstrip().lower().startswith(NO_TRANSACTION_DIRECTIVE):
+        # Autocommit, instruction par instruction (CREATE INDEX CONCURRENTLY)
+        conn.autocommit = True
+        for statement in split_sql_statements(sql):
+            try:
+                cursor.execute(statement)
+            except Exception:
+                _drop_invalid_index(conn, statement)
+                raise
+        cursor.execute(
+            'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+            (migration['version'], migration['name'])
+        )
+    else:
+        conn.autocommit = False
+        try:
+            cursor.execute(sql)
+            cursor.execute(
+                'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                (migration['version'], migration['name'])
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+
+def _drop_invalid_index(conn, statement):
+    """
+    Un CREATE INDEX CONCURRENTLY interrompu laisse un index INVALID que
+    IF NOT EXISTS ignorerait ensuite : on le supprime pour le prochain essai.
+    """
+    match = CONCURRENT_INDEX_PATTERN.search(statement)
+    if not match:
+        return
+
+    index_name = match.group(1).strip('"')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        ''', (index_name,))
+        if cursor.fetchone():
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+    except Exception:
+        pass
+
+
+def run_migrations(connect, directory=MIGRATIONS_DIR):
+    """
+    Applique toutes les migrations en attente.
+
+    Args:
+        connect (callable): Fonction sans argument qui ouvre une connexion psycopg2
+            DÉDIÉE (elle est passée en autocommit puis fermée)
+        directory (str): Dossier des fichiers de migration
+
+    Returns:
+        dict: {
+            'applied': [str],   # Migrations appliquées lors de cet appel
+            'current': int      # Version du schéma après exécution
+        }
+    """
+    migrations = list_migrations(directory)
+
+    conn = connect()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATIONS_LOCK_ID,))
+        try:
+            applied_versions = get_applied_versions(conn)
+            applied = []
+
+            for migration in migrations:
+                if migration['version'] in applied_versions:
+                    continue
+                apply_migration(conn, migration)
+                applied_versions.add(migration['version'])
+                applied.append(f"{migration['version']:04d}_{migration['name']}")
+
+            return {
+                'applied': applied,
+                'current': max(applied_versions) if applied_versions else 0
+            }
+        finally:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATIONS_LOCK_ID,))
+    finally:
+        conn.close()
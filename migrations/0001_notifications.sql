@@ -0,0 +1,10 @@
+-- Table des notifications chauffeur (créée auparavant par init_notifications_table)
+CREATE TABLE IF NOT EXISTS notifications (
+    id SERIAL PRIMARY KEY,
+    chauffeur_id INTEGER REFERENCES users(id),
+    course_id INTEGER,
+    message TEXT,
+    type VARCHAR(50),
+    lu BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
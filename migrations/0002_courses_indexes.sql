@@ -0,0 +1,19 @@
+-- migrate: no-transaction
+-- Index de la table courses (ex-bloc "DATABASE INDEXES - RECOMMANDATIONS" de app.py)
+--
+-- Les filtres de date utilisent des plages [début, fin[ sur heure_prevue :
+-- l'ancien index recommandé sur DATE(heure_prevue) est remplacé par
+-- idx_courses_heure_prevue (DATE() sur un timestamptz n'est pas indexable).
+-- idx_courses_chauffeur_heure couvre aussi les recherches sur chauffeur_id seul.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_heure_prevue
+    ON courses (heure_prevue);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_chauffeur_heure
+    ON courses (chauffeur_id, heure_prevue);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_statut
+    ON courses (statut);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_visible_chauffeur
+    ON courses (visible_chauffeur);
@@ -0,0 +1,19 @@
+-- migrate: no-transaction
+-- Index des tables users, clients_reguliers et notifications
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_role
+    ON users (role);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username
+    ON users (username);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_reguliers_nom
+    ON clients_reguliers (nom_complet);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_reguliers_actif
+    ON clients_reguliers (actif);
+
+-- Badge et liste des notifications non lues (get_unread_count / get_unread_notifications)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_chauffeur_non_lues
+    ON notifications (chauffeur_id, created_at DESC)
+    WHERE lu = FALSE;
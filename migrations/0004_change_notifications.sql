@@ -0,0 +1,47 @@
+-- Canal LISTEN/NOTIFY "planning_changes" : chaque écriture sur courses ou
+-- notifications publie {table, op, id, chauffeur_id[, old_chauffeur_id]}.
+-- Le thread d'écoute de chaque process (realtime.py) invalide son cache et
+-- réveille uniquement la session du chauffeur concerné.
+
+CREATE OR REPLACE FUNCTION notify_planning_change() RETURNS trigger AS $$
+DECLARE
+    payload json;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        payload := json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', TG_OP,
+            'id', OLD.id,
+            'chauffeur_id', OLD.chauffeur_id
+        );
+    ELSIF TG_OP = 'UPDATE' THEN
+        payload := json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', TG_OP,
+            'id', NEW.id,
+            'chauffeur_id', NEW.chauffeur_id,
+            'old_chauffeur_id', OLD.chauffeur_id
+        );
+    ELSE
+        payload := json_build_object(
+            'table', TG_TABLE_NAME,
+            'op', TG_OP,
+            'id', NEW.id,
+            'chauffeur_id', NEW.chauffeur_id
+        );
+    END IF;
+
+    PERFORM pg_notify('planning_changes', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_courses_notify ON courses;
+CREATE TRIGGER trg_courses_notify
+    AFTER INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION notify_planning_change();
+
+DROP TRIGGER IF EXISTS trg_notifications_notify ON notifications;
+CREATE TRIGGER trg_notifications_notify
+    AFTER INSERT OR UPDATE OR DELETE ON notifications
+    FOR EACH ROW EXECUTE FUNCTION notify_planning_change();
@@ -0,0 +1,64 @@
+-- Flux de changements de la table courses (get_course_changes dans app.py)
+--
+-- change_seq : numéro de séquence attribué à chaque INSERT / UPDATE
+-- courses_deleted : une ligne (tombstone) par course supprimée
+--
+-- Un verrou consultatif transactionnel, pris AVANT toute écriture sur
+-- courses (trigger d'instruction), sérialise les transactions d'écriture :
+-- l'ordre des change_seq est donc l'ordre de commit et un client qui a vu
+-- le numéro N n'a rien manqué en dessous de N.
+
+CREATE SEQUENCE IF NOT EXISTS courses_change_seq;
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS change_seq BIGINT;
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+UPDATE courses SET change_seq = nextval('courses_change_seq') WHERE change_seq IS NULL;
+ALTER TABLE courses ALTER COLUMN change_seq SET DEFAULT nextval('courses_change_seq');
+
+CREATE TABLE IF NOT EXISTS courses_deleted (
+    course_id INTEGER NOT NULL,
+    chauffeur_id INTEGER,
+    change_seq BIGINT NOT NULL DEFAULT nextval('courses_change_seq'),
+    deleted_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_courses_deleted_change_seq
+    ON courses_deleted (change_seq);
+
+CREATE OR REPLACE FUNCTION courses_lock_change_feed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(2828002);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION courses_stamp_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('courses_change_seq');
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION courses_record_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO courses_deleted (course_id, chauffeur_id) VALUES (OLD.id, OLD.chauffeur_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_courses_lock_change_feed ON courses;
+CREATE TRIGGER trg_courses_lock_change_feed
+    BEFORE INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH STATEMENT EXECUTE FUNCTION courses_lock_change_feed();
+
+DROP TRIGGER IF EXISTS trg_courses_stamp_change ON courses;
+CREATE TRIGGER trg_courses_stamp_change
+    BEFORE INSERT OR UPDATE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_stamp_change();
+
+DROP TRIGGER IF EXISTS trg_courses_record_delete ON courses;
+CREATE TRIGGER trg_courses_record_delete
+    AFTER DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_record_delete();
@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Lecture du flux de changements : WHERE change_seq > curseur
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_change_seq
+    ON courses (change_seq);
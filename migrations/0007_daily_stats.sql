@@ -0,0 +1,105 @@
+-- Agrégats journaliers des courses (statistiques admin)
+--
+-- Une ligne par (jour Paris, chauffeur, statut, type de course), maintenue
+-- par trigger à chaque INSERT / UPDATE / DELETE sur courses : les
+-- statistiques lisent quelques centaines de lignes au lieu de parcourir
+-- tout l'historique.
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    jour DATE NOT NULL,
+    chauffeur_id INTEGER NOT NULL,
+    statut TEXT NOT NULL,
+    type_course TEXT NOT NULL,
+    nb_courses INTEGER NOT NULL DEFAULT 0,
+    ca NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    km NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (jour, chauffeur_id, statut, type_course)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_stats_chauffeur_jour
+    ON daily_stats (chauffeur_id, jour);
+
+CREATE OR REPLACE FUNCTION daily_stats_add(
+    p_heure_prevue TIMESTAMPTZ,
+    p_chauffeur_id INTEGER,
+    p_statut TEXT,
+    p_type_course TEXT,
+    p_sign INTEGER,
+    p_tarif NUMERIC,
+    p_km NUMERIC
+) RETURNS void AS $$
+DECLARE
+    v_jour DATE := (p_heure_prevue AT TIME ZONE 'Europe/Paris')::date;
+BEGIN
+    IF p_heure_prevue IS NULL OR p_chauffeur_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO daily_stats (jour, chauffeur_id, statut, type_course, nb_courses, ca, km)
+    VALUES (
+        v_jour, p_chauffeur_id, COALESCE(p_statut, ''), COALESCE(p_type_course, ''),
+        p_sign, p_sign * COALESCE(p_tarif, 0), p_sign * COALESCE(p_km, 0)
+    )
+    ON CONFLICT (jour, chauffeur_id, statut, type_course) DO UPDATE
+    SET nb_courses = daily_stats.nb_courses + EXCLUDED.nb_courses,
+        ca = daily_stats.ca + EXCLUDED.ca,
+        km = daily_stats.km + EXCLUDED.km;
+
+    IF p_sign < 0 THEN
+        DELETE FROM daily_stats
+        WHERE jour = v_jour
+        AND chauffeur_id = p_chauffeur_id
+        AND statut = COALESCE(p_statut, '')
+        AND type_course = COALESCE(p_type_course, '')
+        AND nb_courses <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION courses_maintain_daily_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.heure_prevue IS NOT DISTINCT FROM NEW.heure_prevue
+       AND OLD.chauffeur_id IS NOT DISTINCT FROM NEW.chauffeur_id
+       AND OLD.statut IS NOT DISTINCT FROM NEW.statut
+       AND OLD.type_course IS NOT DISTINCT FROM NEW.type_course
+       AND OLD.tarif_estime IS NOT DISTINCT FROM NEW.tarif_estime
+       AND OLD.km_estime IS NOT DISTINCT FROM NEW.km_estime THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM daily_stats_add(OLD.heure_prevue, OLD.chauffeur_id, OLD.statut, OLD.type_course,
+                                -1, OLD.tarif_estime, OLD.km_estime);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM daily_stats_add(NEW.heure_prevue, NEW.chauffeur_id, NEW.statut, NEW.type_course,
+                                1, NEW.tarif_estime, NEW.km_estime);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Aucune écriture sur courses entre le calcul initial et la pose du trigger
+LOCK TABLE courses IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM daily_stats;
+
+INSERT INTO daily_stats (jour, chauffeur_id, statut, type_course, nb_courses, ca, km)
+SELECT (heure_prevue AT TIME ZONE 'Europe/Paris')::date,
+       chauffeur_id,
+       COALESCE(statut, ''),
+       COALESCE(type_course, ''),
+       COUNT(*),
+       COALESCE(SUM(tarif_estime), 0),
+       COALESCE(SUM(km_estime), 0)
+FROM courses
+WHERE heure_prevue IS NOT NULL AND chauffeur_id IS NOT NULL
+GROUP BY 1, 2, 3, 4;
+
+DROP TRIGGER IF EXISTS trg_courses_daily_stats ON courses;
+CREATE TRIGGER trg_courses_daily_stats
+    AFTER INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_maintain_daily_stats();
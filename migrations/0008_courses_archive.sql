@@ -0,0 +1,117 @@
+-- Archive froide des courses retirées du planning (purge_week_courses)
+--
+-- courses_archive reprend les colonnes de courses (+ nom du chauffeur au
+-- moment de l'archivage) et est partitionnée par année sur heure_prevue :
+-- la table courses reste petite pour les pages en direct, l'historique
+-- reste interrogeable (search_archived_courses dans app.py).
+
+CREATE TABLE IF NOT EXISTS courses_archive (
+    LIKE courses,
+    chauffeur_name TEXT,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+) PARTITION BY RANGE (heure_prevue);
+
+CREATE INDEX IF NOT EXISTS idx_courses_archive_heure_prevue
+    ON courses_archive (heure_prevue);
+
+CREATE INDEX IF NOT EXISTS idx_courses_archive_chauffeur_heure
+    ON courses_archive (chauffeur_id, heure_prevue);
+
+CREATE INDEX IF NOT EXISTS idx_courses_archive_client
+    ON courses_archive (lower(nom_client) text_pattern_ops);
+
+-- Partition annuelle (bornes en heure de Paris), créée à la demande
+CREATE OR REPLACE FUNCTION ensure_courses_archive_partition(p_year INTEGER) RETURNS void AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF courses_archive FOR VALUES FROM (%L) TO (%L)',
+        'courses_archive_' || p_year,
+        make_timestamptz(p_year, 1, 1, 0, 0, 0, 'Europe/Paris'),
+        make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'Europe/Paris')
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Déplace en bloc les courses de [p_debut, p_fin) : un seul DELETE ... RETURNING
+-- alimente l'INSERT dans l'archive. Les colonnes communes aux deux tables
+-- sont lues dans le catalogue, l'archive suit donc les évolutions de courses.
+CREATE OR REPLACE FUNCTION archive_courses(p_debut TIMESTAMPTZ, p_fin TIMESTAMPTZ) RETURNS INTEGER AS $$
+DECLARE
+    v_columns TEXT;
+    v_year INTEGER;
+    v_count INTEGER;
+BEGIN
+    FOR v_year IN
+        SELECT DISTINCT EXTRACT(YEAR FROM heure_prevue AT TIME ZONE 'Europe/Paris')::integer
+        FROM courses
+        WHERE heure_prevue >= p_debut AND heure_prevue < p_fin
+    LOOP
+        PERFORM ensure_courses_archive_partition(v_year);
+    END LOOP;
+
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum)
+    INTO v_columns
+    FROM pg_attribute a
+    WHERE a.attrelid = 'courses'::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND EXISTS (
+        SELECT 1 FROM pg_attribute b
+        WHERE b.attrelid = 'courses_archive'::regclass
+        AND b.attname = a.attname
+        AND NOT b.attisdropped
+    );
+
+    -- Les agrégats daily_stats conservent les courses archivées
+    PERFORM set_config('app.archiving', 'on', true);
+
+    EXECUTE format(
+        'WITH moved AS (
+            DELETE FROM courses
+            WHERE heure_prevue >= $1 AND heure_prevue < $2
+            RETURNING %s
+        )
+        INSERT INTO courses_archive (%s, chauffeur_name)
+        SELECT moved.*, u.full_name
+        FROM moved
+        LEFT JOIN users u ON u.id = moved.chauffeur_id',
+        v_columns, v_columns
+    ) USING p_debut, p_fin;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    PERFORM set_config('app.archiving', 'off', true);
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Une suppression faite par archive_courses ne retire pas la course des statistiques
+CREATE OR REPLACE FUNCTION courses_maintain_daily_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND current_setting('app.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND OLD.heure_prevue IS NOT DISTINCT FROM NEW.heure_prevue
+       AND OLD.chauffeur_id IS NOT DISTINCT FROM NEW.chauffeur_id
+       AND OLD.statut IS NOT DISTINCT FROM NEW.statut
+       AND OLD.type_course IS NOT DISTINCT FROM NEW.type_course
+       AND OLD.tarif_estime IS NOT DISTINCT FROM NEW.tarif_estime
+       AND OLD.km_estime IS NOT DISTINCT FROM NEW.km_estime THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM daily_stats_add(OLD.heure_prevue, OLD.chauffeur_id, OLD.statut, OLD.type_course,
+                                -1, OLD.tarif_estime, OLD.km_estime);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM daily_stats_add(NEW.heure_prevue, NEW.chauffeur_id, NEW.statut, NEW.type_course,
+                                1, NEW.tarif_estime, NEW.km_estime);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
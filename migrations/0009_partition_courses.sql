@@ -0,0 +1,289 @@
+-- Partitionnement mensuel de courses sur heure_prevue
+--
+-- Toutes les lectures en direct filtrent sur une plage de heure_prevue :
+-- avec une partition par mois (bornes en heure de Paris), la journée et la
+-- semaine en cours ne lisent qu'une ou deux petites partitions, et la
+-- rétention détache / supprime des partitions entières au lieu d'un DELETE.
+--
+-- La table existante est renommée, une table partitionnée de même structure
+-- est créée puis remplie ; index, contraintes et triggers sont recréés.
+-- La clé primaire devient (id, heure_prevue) : la clé de partition doit en
+-- faire partie. id reste alimenté par la même séquence.
+
+LOCK TABLE courses IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE courses RENAME TO courses_legacy;
+
+-- Le nom de la clé primaire (courses_pkey) est repris par la nouvelle table
+DO $$
+DECLARE
+    v_pkey TEXT;
+BEGIN
+    SELECT conname INTO v_pkey
+    FROM pg_constraint
+    WHERE conrelid = 'courses_legacy'::regclass AND contype = 'p';
+
+    IF v_pkey IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE courses_legacy RENAME CONSTRAINT %I TO courses_legacy_pkey', v_pkey);
+    END IF;
+END;
+$$;
+
+CREATE TABLE courses (
+    LIKE courses_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS
+) PARTITION BY RANGE (heure_prevue);
+
+ALTER TABLE courses ADD PRIMARY KEY (id, heure_prevue);
+
+-- Partition mensuelle (bornes en heure de Paris), créée si absente.
+-- Un mois dont des lignes sont déjà dans la partition par défaut n'est pas
+-- créé (PostgreSQL le refuserait) : ces lignes restent dans courses_default.
+CREATE OR REPLACE FUNCTION ensure_courses_partition(p_month DATE) RETURNS BOOLEAN AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_month)::date;
+    v_name TEXT := 'courses_' || to_char(v_month, 'YYYY_MM');
+    v_debut TIMESTAMPTZ := make_timestamptz(
+        EXTRACT(YEAR FROM v_month)::integer, EXTRACT(MONTH FROM v_month)::integer, 1, 0, 0, 0, 'Europe/Paris');
+    v_fin TIMESTAMPTZ := v_debut + INTERVAL '1 month';
+    v_default_rows BOOLEAN;
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    IF to_regclass('courses_default') IS NOT NULL THEN
+        EXECUTE 'SELECT EXISTS (SELECT 1 FROM courses_default WHERE heure_prevue >= $1 AND heure_prevue < $2)'
+        INTO v_default_rows USING v_debut, v_fin;
+        IF v_default_rows THEN
+            RAISE NOTICE 'Partition % non créée : lignes présentes dans courses_default', v_name;
+            RETURN FALSE;
+        END IF;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF courses FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_debut, v_fin
+    );
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Crée les partitions de p_from à p_to inclus (mois), renvoie le nombre créé
+CREATE OR REPLACE FUNCTION ensure_courses_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        IF ensure_courses_partition(v_month) THEN
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Références ENTRANTES vers courses.id (notifications.course_id, ...).
+-- Une clé étrangère vers la table partitionnée devrait viser toute sa clé
+-- primaire (id, heure_prevue) : les contraintes existantes sont supprimées
+-- (ci-dessous, avant DROP TABLE courses_legacy) et remplacées par cette
+-- table, lue par la rétention pour traiter les lignes qui référencent une
+-- partition supprimée : 'delete' (ON DELETE CASCADE ou colonne NOT NULL)
+-- ou 'set null' (les autres règles, la course restant dans l'archive).
+CREATE TABLE IF NOT EXISTS courses_references (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ('delete', 'set null')),
+    PRIMARY KEY (table_name, column_name)
+);
+
+-- Rétention : chaque partition mensuelle entièrement antérieure à p_before
+-- est détachée, copiée dans courses_archive (si p_archive) puis supprimée.
+-- Aucun DELETE ligne à ligne : ni tombstone, ni mise à jour de daily_stats.
+-- Les lignes qui la référencent (courses_references) sont supprimées ou
+-- détachées (NULL) avant le DROP.
+CREATE OR REPLACE FUNCTION drop_courses_partitions_before(p_before DATE, p_archive BOOLEAN DEFAULT TRUE)
+RETURNS TABLE (partition_name TEXT, archived_rows BIGINT) AS $$
+DECLARE
+    v_partition RECORD;
+    v_reference RECORD;
+    v_columns TEXT;
+    v_year INTEGER;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'courses'::regclass
+        AND c.relname ~ '^courses_[0-9]{4}_[0-9]{2}$'
+        AND to_date(substr(c.relname, 9), 'YYYY_MM') + INTERVAL '1 month' <= p_before
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE courses DETACH PARTITION %I', v_partition.relname);
+        partition_name := v_partition.relname;
+        archived_rows := 0;
+
+        IF p_archive THEN
+            v_year := substr(v_partition.relname, 9, 4)::integer;
+            PERFORM ensure_courses_archive_partition(v_year);
+
+            SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum)
+            INTO v_columns
+            FROM pg_attribute a
+            WHERE a.attrelid = v_partition.relname::regclass
+            AND a.attnum > 0
+            AND NOT a.attisdropped
+            AND EXISTS (
+                SELECT 1 FROM pg_attribute b
+                WHERE b.attrelid = 'courses_archive'::regclass
+                AND b.attname = a.attname
+                AND NOT b.attisdropped
+            );
+
+            EXECUTE format(
+                'INSERT INTO courses_archive (%s, chauffeur_name)
+                 SELECT p.*, u.full_name
+                 FROM (SELECT %s FROM %I) p
+                 LEFT JOIN users u ON u.id = p.chauffeur_id',
+                v_columns, v_columns, v_partition.relname
+            );
+            GET DIAGNOSTICS archived_rows = ROW_COUNT;
+        END IF;
+
+        FOR v_reference IN SELECT * FROM courses_references LOOP
+            IF v_reference.action = 'delete' THEN
+                EXECUTE format(
+                    'DELETE FROM %s r USING %I p WHERE r.%I = p.id',
+                    v_reference.table_name, v_partition.relname, v_reference.column_name
+                );
+            ELSE
+                EXECUTE format(
+                    'UPDATE %s r SET %I = NULL FROM %I p WHERE r.%I = p.id',
+                    v_reference.table_name, v_reference.column_name,
+                    v_partition.relname, v_reference.column_name
+                );
+            END IF;
+        END LOOP;
+
+        EXECUTE format('DROP TABLE %I', v_partition.relname);
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions : du premier mois présent jusqu'à 12 mois devant nous,
+-- plus une partition par défaut pour les dates hors plage
+SELECT ensure_courses_partitions(
+    LEAST(
+        COALESCE((SELECT MIN(heure_prevue AT TIME ZONE 'Europe/Paris') FROM courses_legacy)::date, CURRENT_DATE),
+        CURRENT_DATE
+    ),
+    (CURRENT_DATE + INTERVAL '12 months')::date
+);
+
+CREATE TABLE IF NOT EXISTS courses_default PARTITION OF courses DEFAULT;
+
+INSERT INTO courses SELECT * FROM courses_legacy;
+
+-- Contraintes de clé étrangère de l'ancienne table (chauffeur_id -> users, ...)
+DO $$
+DECLARE
+    v_constraint RECORD;
+BEGIN
+    FOR v_constraint IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'courses_legacy'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE courses ADD CONSTRAINT %I %s', v_constraint.conname, v_constraint.definition);
+    END LOOP;
+END;
+$$;
+
+-- La séquence de id (SERIAL) appartient désormais à la nouvelle table
+-- (une colonne IDENTITY a reçu sa propre séquence, recalée ci-dessous)
+DO $$
+DECLARE
+    v_sequence TEXT := pg_get_serial_sequence('courses_legacy', 'id');
+    v_identity "char";
+BEGIN
+    SELECT attidentity INTO v_identity
+    FROM pg_attribute
+    WHERE attrelid = 'courses_legacy'::regclass AND attname = 'id';
+
+    IF v_sequence IS NOT NULL AND v_identity = '' THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY courses.id', v_sequence);
+    END IF;
+END;
+$$;
+
+SELECT setval(
+    pg_get_serial_sequence('courses', 'id'),
+    GREATEST((SELECT MAX(id) FROM courses), 1)
+)
+WHERE pg_get_serial_sequence('courses', 'id') IS NOT NULL;
+
+-- Clés étrangères entrantes (voir courses_references) : supprimées, sinon
+-- DROP TABLE courses_legacy échoue ; leur règle ON DELETE est conservée
+DO $$
+DECLARE
+    v_constraint RECORD;
+BEGIN
+    FOR v_constraint IN
+        SELECT con.conname, con.conrelid::regclass::text AS table_name,
+               a.attname AS column_name,
+               CASE WHEN con.confdeltype = 'c' OR a.attnotnull THEN 'delete' ELSE 'set null' END AS action,
+               array_length(con.conkey, 1) AS nb_columns
+        FROM pg_constraint con
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+        WHERE con.confrelid = 'courses_legacy'::regclass AND con.contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', v_constraint.table_name, v_constraint.conname);
+
+        IF v_constraint.nb_columns = 1 THEN
+            INSERT INTO courses_references (table_name, column_name, action)
+            VALUES (v_constraint.table_name, v_constraint.column_name, v_constraint.action)
+            ON CONFLICT (table_name, column_name) DO UPDATE SET action = EXCLUDED.action;
+        ELSE
+            RAISE NOTICE 'Clé étrangère % (%) vers courses supprimée sans remplacement',
+                v_constraint.conname, v_constraint.table_name;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- notifications.course_id référence courses.id sans contrainte (migrations/0001)
+INSERT INTO courses_references (table_name, column_name, action)
+VALUES ('notifications', 'course_id', 'set null')
+ON CONFLICT (table_name, column_name) DO NOTHING;
+
+DROP TABLE courses_legacy;
+
+-- Index (créés sur chaque partition)
+CREATE INDEX IF NOT EXISTS idx_courses_heure_prevue ON courses (heure_prevue);
+CREATE INDEX IF NOT EXISTS idx_courses_chauffeur_heure ON courses (chauffeur_id, heure_prevue);
+CREATE INDEX IF NOT EXISTS idx_courses_statut ON courses (statut);
+CREATE INDEX IF NOT EXISTS idx_courses_visible_chauffeur ON courses (visible_chauffeur);
+CREATE INDEX IF NOT EXISTS idx_courses_change_seq ON courses (change_seq);
+
+-- Triggers (migrations 0004, 0005, 0007)
+CREATE TRIGGER trg_courses_notify
+    AFTER INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION notify_planning_change();
+
+CREATE TRIGGER trg_courses_lock_change_feed
+    BEFORE INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH STATEMENT EXECUTE FUNCTION courses_lock_change_feed();
+
+CREATE TRIGGER trg_courses_stamp_change
+    BEFORE INSERT OR UPDATE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_stamp_change();
+
+CREATE TRIGGER trg_courses_record_delete
+    AFTER DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_record_delete();
+
+CREATE TRIGGER trg_courses_daily_stats
+    AFTER INSERT OR UPDATE OR DELETE ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_maintain_daily_stats();
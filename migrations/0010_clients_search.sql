@@ -0,0 +1,32 @@
+-- Recherche de clients insensible à la casse et aux accents
+--
+-- unaccent() n'est pas IMMUTABLE (elle dépend du dictionnaire) : elle ne
+-- peut pas servir dans un index. immutable_unaccent() fige le dictionnaire,
+-- dans le schéma où l'extension est installée (public, ou extensions sur
+-- Supabase).
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DO $$
+DECLARE
+    v_schema TEXT;
+BEGIN
+    SELECT n.nspname INTO v_schema
+    FROM pg_extension e
+    JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'unaccent';
+
+    EXECUTE format(
+        'CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text
+         LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+         AS $f$ SELECT %1$I.unaccent(%2$L::regdictionary, $1) $f$',
+        v_schema, v_schema || '.unaccent'
+    );
+END;
+$$;
+
+-- Nom normalisé utilisé par l'index et par les requêtes
+CREATE OR REPLACE FUNCTION normalize_nom(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT lower(immutable_unaccent($1)) $$;
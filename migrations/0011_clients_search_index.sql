@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Index trigramme sur le nom normalisé des clients actifs :
+-- sert LIKE '%terme%' et la similarité (%, similarity) sans parcours complet
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_reguliers_nom_trgm
+    ON clients_reguliers USING gin (normalize_nom(nom_complet) gin_trgm_ops)
+    WHERE actif = 1;
@@ -0,0 +1,62 @@
+-- Heure PEC prévue en colonne TIME (au lieu d'un texte libre 'HH:MM')
+--
+-- Le tri du planning (jour puis heure PEC) se fait en SQL sur un vrai type
+-- horaire, servi par un index composite : les courses sortent de la base
+-- déjà triées, sans conversion côté Python.
+--
+-- Reprise des données : 'H:MM', 'HH:MM' et '8h30' sont convertis ; une
+-- saisie illisible est conservée dans le commentaire de la course puis
+-- remplacée par NULL (l'heure prévue sert alors à l'affichage et au tri).
+
+CREATE FUNCTION pg_temp.heure_pec_from_text(p_value TEXT) RETURNS TIME AS $$
+DECLARE
+    v_parts TEXT[];
+BEGIN
+    v_parts := regexp_match(p_value, '^\s*(\d{1,2})\s*[:hH]\s*(\d{2})\s*$');
+    IF v_parts IS NULL OR v_parts[1]::int > 23 OR v_parts[2]::int > 59 THEN
+        RETURN NULL;
+    END IF;
+    RETURN make_time(v_parts[1]::int, v_parts[2]::int, 0);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['courses', 'courses_archive'] LOOP
+        IF to_regclass(v_table) IS NULL OR EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = v_table
+              AND column_name = 'heure_pec_prevue'
+              AND data_type LIKE 'time%'
+        ) THEN
+            CONTINUE;
+        END IF;
+
+        EXECUTE format(
+            $q$UPDATE %I
+               SET commentaire = concat_ws(E'\n', NULLIF(commentaire, ''),
+                                           'Heure PEC d''origine : ' || heure_pec_prevue),
+                   heure_pec_prevue = NULL
+               WHERE NULLIF(trim(heure_pec_prevue), '') IS NOT NULL
+                 AND pg_temp.heure_pec_from_text(heure_pec_prevue) IS NULL$q$,
+            v_table
+        );
+
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN heure_pec_prevue TYPE TIME(0)
+                 USING pg_temp.heure_pec_from_text(heure_pec_prevue)',
+            v_table
+        );
+    END LOOP;
+END;
+$$;
+
+-- Ordre du planning : jour (Paris) puis heure PEC, à défaut heure prévue.
+-- Expressions identiques à COURSES_PLANNING_ORDER dans app.py.
+CREATE INDEX IF NOT EXISTS idx_courses_jour_heure_pec ON courses (
+    ((heure_prevue AT TIME ZONE 'Europe/Paris')::date),
+    (COALESCE(heure_pec_prevue, (heure_prevue AT TIME ZONE 'Europe/Paris')::time))
+);
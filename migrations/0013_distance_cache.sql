@@ -0,0 +1,25 @@
+-- Cache partagé des distances (assistant de suggestion de chauffeur)
+--
+-- Une ligne par couple (origine, destination) normalisé (minuscules, sans
+-- accents ni ponctuation, voir distance_cache.address_key) : tous les
+-- process / réplicas réutilisent les trajets déjà calculés au lieu de
+-- rappeler l'API Google Distance Matrix.
+--
+-- Les trajets introuvables (NOT_FOUND, ZERO_RESULTS...) sont aussi
+-- enregistrés (cache négatif) avec une durée de vie plus courte.
+
+CREATE TABLE IF NOT EXISTS distance_cache (
+    origin_key TEXT NOT NULL,
+    destination_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    distance_meters INTEGER,
+    duration_seconds INTEGER,
+    error TEXT,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (origin_key, destination_key)
+);
+
+-- Purge des entrées expirées (maintenance mensuelle)
+CREATE INDEX IF NOT EXISTS idx_distance_cache_expires_at
+    ON distance_cache (expires_at);
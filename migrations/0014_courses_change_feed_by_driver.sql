@@ -0,0 +1,34 @@
+-- Flux de changements par chauffeur (get_course_changes dans app.py)
+--
+-- Chaque page chauffeur ne lit que SES courses modifiées :
+-- WHERE chauffeur_id = %s AND change_seq > curseur, servi par les index
+-- (chauffeur_id, change_seq) ci-dessous. Une course retirée à un chauffeur
+-- (réattribution) laisse un tombstone dans courses_deleted au nom de
+-- l'ANCIEN chauffeur : sa page la retire sans lire les courses des autres.
+--
+-- Le verrou consultatif global de la migration 0005 est conservé : il n'est
+-- pris que par les écritures sur courses (jamais par les lectures) et tenu
+-- jusqu'au commit d'une transaction courte (un UPDATE et ses notifications,
+-- validés aussitôt). Les écritures viennent de quelques sessions secrétaire /
+-- admin, quelques dizaines par minute au plus : les sérialiser ne coûte rien
+-- de mesurable. Un verrou par chauffeur imposerait un curseur par chauffeur
+-- et ferait s'interbloquer deux réattributions groupées concurrentes (verrous
+-- pris dans l'ordre des lignes).
+--
+-- Limite : cela suppose qu'AUCUNE écriture sur courses ne dure. Les
+-- écritures de masse passent donc par lots courts validés un par un
+-- (archive_courses / purge_week_courses, migrations/0016) ; la rétention
+-- détache des partitions (DDL, sans DELETE) et ne prend pas ce verrou.
+
+DROP TRIGGER IF EXISTS trg_courses_record_reassign ON courses;
+CREATE TRIGGER trg_courses_record_reassign
+    AFTER UPDATE OF chauffeur_id ON courses
+    FOR EACH ROW
+    WHEN (OLD.chauffeur_id IS DISTINCT FROM NEW.chauffeur_id)
+    EXECUTE FUNCTION courses_record_delete();
+
+CREATE INDEX IF NOT EXISTS idx_courses_chauffeur_change_seq
+    ON courses (chauffeur_id, change_seq);
+
+CREATE INDEX IF NOT EXISTS idx_courses_deleted_chauffeur_change_seq
+    ON courses_deleted (chauffeur_id, change_seq);
@@ -0,0 +1,27 @@
+-- Canal "planning_changes" étendu aux tables users et clients_reguliers :
+-- les caches versionnés de la liste des chauffeurs et de l'index de
+-- recherche clients sont invalidés dans TOUS les process / réplicas
+-- (realtime.py), pas seulement dans celui qui a écrit.
+--
+-- Un seul événement par instruction {table, op} : l'invalidation porte sur
+-- la table entière, inutile de publier chaque ligne (import de clients...).
+
+CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('planning_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_notify ON users;
+CREATE TRIGGER trg_users_notify
+    AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS trg_clients_reguliers_notify ON clients_reguliers;
+CREATE TRIGGER trg_clients_reguliers_notify
+    AFTER INSERT OR UPDATE OR DELETE ON clients_reguliers
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
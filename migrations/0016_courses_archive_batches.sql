@@ -0,0 +1,91 @@
+-- Flux de changements : tombstones et archivage par lots
+--
+-- 1. Une course archivée (archive_courses, app.archiving = 'on') ne laisse
+--    plus de tombstone : la semaine purgée disparaît des pages chauffeur à
+--    leur resynchronisation complète (FULL_SYNC_INTERVAL_SECONDS dans app.py).
+--    Les tombstones plus anciens que cette resynchronisation ne sont plus
+--    lus : run_db_maintenance les supprime (purge_course_tombstones).
+--
+-- 2. archive_courses déplace au plus p_limit courses par appel.
+--    purge_week_courses l'appelle en boucle, un commit par lot : le verrou
+--    consultatif du flux (migration 0005) n'est tenu que le temps d'un lot
+--    et les écritures des secrétaires passent entre deux lots.
+
+CREATE OR REPLACE FUNCTION courses_record_delete() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('app.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO courses_deleted (course_id, chauffeur_id) VALUES (OLD.id, OLD.chauffeur_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE INDEX IF NOT EXISTS idx_courses_deleted_deleted_at
+    ON courses_deleted (deleted_at);
+
+DROP FUNCTION IF EXISTS archive_courses(TIMESTAMPTZ, TIMESTAMPTZ);
+
+-- Déplace au plus p_limit courses de [p_debut, p_fin) (toutes si NULL) :
+-- un seul DELETE ... RETURNING alimente l'INSERT dans l'archive
+CREATE OR REPLACE FUNCTION archive_courses(p_debut TIMESTAMPTZ, p_fin TIMESTAMPTZ, p_limit INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_columns TEXT;
+    v_returning TEXT;
+    v_year INTEGER;
+    v_count INTEGER;
+BEGIN
+    FOR v_year IN
+        SELECT DISTINCT EXTRACT(YEAR FROM heure_prevue AT TIME ZONE 'Europe/Paris')::integer
+        FROM courses
+        WHERE heure_prevue >= p_debut AND heure_prevue < p_fin
+    LOOP
+        PERFORM ensure_courses_archive_partition(v_year);
+    END LOOP;
+
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum),
+           string_agg('c.' || quote_ident(a.attname), ', ' ORDER BY a.attnum)
+    INTO v_columns, v_returning
+    FROM pg_attribute a
+    WHERE a.attrelid = 'courses'::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND EXISTS (
+        SELECT 1 FROM pg_attribute b
+        WHERE b.attrelid = 'courses_archive'::regclass
+        AND b.attname = a.attname
+        AND NOT b.attisdropped
+    );
+
+    -- Les agrégats daily_stats conservent les courses archivées,
+    -- le flux de changements ne garde pas de tombstone
+    PERFORM set_config('app.archiving', 'on', true);
+
+    EXECUTE format(
+        'WITH lot AS (
+            SELECT id, heure_prevue FROM courses
+            WHERE heure_prevue >= $1 AND heure_prevue < $2
+            ORDER BY heure_prevue, id
+            LIMIT $3
+        ),
+        moved AS (
+            DELETE FROM courses c
+            USING lot
+            WHERE c.id = lot.id AND c.heure_prevue = lot.heure_prevue
+            RETURNING %s
+        )
+        INSERT INTO courses_archive (%s, chauffeur_name)
+        SELECT moved.*, u.full_name
+        FROM moved
+        LEFT JOIN users u ON u.id = moved.chauffeur_id',
+        v_returning, v_columns
+    ) USING p_debut, p_fin, p_limit;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    PERFORM set_config('app.archiving', 'off', true);
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,63 @@
+"""
+PLANNING - MODULE 12
+Transport DanGE Planning
+
+Modèles d'affichage du planning, construits une seule fois à partir des
+courses (course.Course) au lieu d'être recalculés cellule par cellule :
+
+- grille semaine : {(day_offset, heure): [courses triées]}
+- plan du jour : {chauffeur_id: [courses triées]}, partagé par l'onglet
+  jour, le détail d'un jour de la semaine et la réattribution rapide
+"""
+
+# Plages horaires affichées dans la grille semaine
+GRID_HOURS = range(6, 23)
+
+
+def build_week_grid(courses):
+    """
+    Répartit les courses de la semaine dans les cases (jour, heure) de la grille.
+
+    L'heure de la case est celle de l'heure affichée (heure PEC, sinon heure
+    prévue en heure de Paris), déjà normalisée par Course. Chaque case est
+    triée par heure affichée : le rendu n'a plus qu'à lire la case.
+
+    Args:
+        courses (list): Courses de la semaine avec day_offset renseigné
+
+    Returns:
+        dict: {(day_offset, heure): [courses]} - cases vides absentes
+    """
+    grid = {}
+    for course in courses:
+        if course.day_offset is None or not course.heure_affichage:
+            continue
+        hour = int(course.heure_affichage[:2])
+        grid.setdefault((course.day_offset, hour), []).append(course)
+
+    for slot in grid.values():
+        slot.sort(key=lambda course: course.heure_affichage)
+    return grid
+
+
+def build_day_plan(courses):
+    """
+    Regroupe les courses d'une journée par chauffeur, en un seul passage.
+
+    Les colonnes du planning lisent directement la liste de leur chauffeur
+    au lieu de refiltrer toutes les courses du jour pour chacune. Les
+    requêtes renvoient les courses dans l'ordre du planning (index
+    idx_courses_jour_heure_pec) : le regroupement conserve cet ordre, sans
+    nouveau tri.
+
+    Args:
+        courses (list): Courses d'une même journée, dans l'ordre du planning
+
+    Returns:
+        dict: {chauffeur_id: [courses]} - chauffeurs sans course absents.
+            Les listes peuvent être partagées par le cache : ne pas les modifier.
+    """
+    plan = {}
+    for course in courses:
+        plan.setdefault(course.chauffeur_id, []).append(course)
+    return plan
@@ -0,0 +1,121 @@
+"""
+MISES À JOUR EN TEMPS RÉEL - MODULE 7
+Transport DanGE Planning
+
+Un thread d'écoute par process reçoit les événements PostgreSQL
+LISTEN/NOTIFY du canal "planning_changes" (voir migrations/0004 et 0015) :
+
+- il invalide le cache versionné des tables modifiées (cache.py), ce qui
+  garde les caches cohérents entre plusieurs process / réplicas
+- il incrémente un compteur par chauffeur : la page chauffeur compare ce
+  compteur en mémoire (aucune requête SQL) et ne relance son rendu que
+  lorsqu'une course ou une notification de CE chauffeur a changé
+"""
+
+import json
+import select
+import threading
+
+from cache import bump_version, invalidate_all
+
+CHANNEL = 'planning_changes'
+
+# Tables publiées par les triggers du canal (toutes celles des caches versionnés)
+WATCHED_TABLES = ('courses', 'notifications', 'users', 'clients_reguliers')
+
+_lock = threading.Lock()
+_driver_versions = {}
+_global_version = 0
+
+
+def get_driver_version(chauffeur_id):
+    """
+    Version des données d'un chauffeur : change à chaque course / notification
+    de ce chauffeur (et à chaque reconnexion du listener).
+    """
+    with _lock:
+        return (_global_version, _driver_versions.get(chauffeur_id, 0))
+
+
+def bump_driver_version(*chauffeur_ids):
+    with _lock:
+        for chauffeur_id in chauffeur_ids:
+            if chauffeur_id is not None:
+                _driver_versions[chauffeur_id] = _driver_versions.get(chauffeur_id, 0) + 1
+
+
+def _bump_all_drivers():
+    global _global_version
+    with _lock:
+        _global_version += 1
+
+
+class ChangeListener(threading.Thread):
+    """
+    Thread démon LISTEN sur une connexion DÉDIÉE (hors pool).
+
+    Args:
+        connect (callable): Ouvre une connexion psycopg2
+        poll_timeout (float): Réveil périodique du select() (secondes)
+        reconnect_delay (float): Attente avant reconnexion après une erreur
+    """
+
+    def __init__(self, connect, poll_timeout=30.0, reconnect_delay=5.0):
+        super().__init__(name='planning-change-listener', daemon=True)
+        self._connect = connect
+        self.poll_timeout = poll_timeout
+        self.reconnect_delay = reconnect_delay
+        self._stop_event = threading.Event()
+        self.connected = False
+        self.events_received = 0
+        self.last_error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'LISTEN {CHANNEL}')
+                self.connected = True
+
+                # Des événements ont pu être manqués pendant la déconnexion
+                invalidate_all()
+                _bump_all_drivers()
+
+                while not self._stop_event.is_set():
+                    readable, _, _ = select.select([conn], [], [], self.poll_timeout)
+                    if not readable:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+            self._stop_event.wait(self.reconnect_delay)
+
+    def _handle(self, payload):
+        self.events_received += 1
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            invalidate_all()
+            _bump_all_drivers()
+            return
+
+        if event.get('table') in WATCHED_TABLES:
+            bump_version(event['table'])
+        bump_driver_version(event.get('chauffeur_id'), event.get('old_chauffeur_id'))
+
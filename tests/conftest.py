@@ -0,0 +1,11 @@
+"""
+Tests sans base de données ni réseau : modules purs, et chemin HTTP de
+l'assistant contre le faux serveur Distance Matrix (distance_stub.py).
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
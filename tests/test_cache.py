@@ -0,0 +1,57 @@
+from cache import NoCache, bump_version, versioned_cache
+
+
+def test_versioned_cache_hits_until_version_bump():
+    calls = []
+
+    @versioned_cache('test_cache_table')
+    def read(value):
+        calls.append(value)
+        return [value]
+
+    assert read(1) == [1]
+    assert read(1) == [1]
+    assert calls == [1]
+
+    bump_version('test_cache_table')
+    assert read(1) == [1]
+    assert calls == [1, 1]
+    assert read.cache_info()['hits'] == 1
+
+
+def test_versioned_cache_copies_top_level_list():
+    @versioned_cache('test_cache_table')
+    def read():
+        return [3, 1, 2]
+
+    read().sort()
+    assert read() == [3, 1, 2]
+
+
+def test_no_cache_value_is_returned_but_not_kept():
+    calls = []
+
+    @versioned_cache('test_cache_table')
+    def read():
+        calls.append(None)
+        raise NoCache([])
+
+    assert read() == []
+    assert read() == []
+    assert len(calls) == 2
+    assert read.cache_info()['size'] == 0
+
+
+def test_versioned_cache_evicts_least_recently_used():
+    @versioned_cache('test_cache_table', maxsize=2)
+    def read(value):
+        return value
+
+    read(1)
+    read(2)
+    read(1)
+    read(3)
+    assert read.cache_info()['size'] == 2
+    hits = read.cache_info()['hits']
+    read(1)
+    assert read.cache_info()['hits'] == hits + 1
@@ -0,0 +1,105 @@
+import threading
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+import db_pool
+from db_pool import BoundedConnectionPool, PoolTimeout
+
+
+class FakeInfo:
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def transaction_status(self):
+        return self._conn.status
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, query):
+        if self._conn.broken:
+            raise psycopg2.OperationalError('connexion perdue')
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+        self.rollbacks = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.info = FakeInfo(self)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', lambda **kwargs: FakeConnection())
+
+
+def test_getconn_reuses_returned_connection():
+    pool = BoundedConnectionPool(0, 2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()['connections_opened'] == 1
+
+
+def test_full_pool_times_out():
+    pool = BoundedConnectionPool(0, 1)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()['exhaustion_events'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool = BoundedConnectionPool(0, 1)
+    conn = pool.getconn()
+    timer = threading.Timer(0.05, pool.putconn, (conn,))
+    timer.start()
+    assert pool.getconn(timeout=2) is conn
+    timer.join()
+    assert pool.stats()['waits'] == 1
+
+
+def test_putconn_rolls_back_open_transaction():
+    pool = BoundedConnectionPool(0, 1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_unhealthy_idle_connection_is_replaced():
+    pool = BoundedConnectionPool(0, 1, health_check_interval=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    stats = pool.stats()
+    assert stats['health_check_failures'] == 1
+    assert stats['size'] == 1
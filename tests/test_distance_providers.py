@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from assistant import calculate_distances
+from distance_providers import (
+    MAX_ORIGINS_PER_REQUEST,
+    Gazetteer,
+    GoogleDistanceProvider,
+    OfflineDistanceProvider
+)
+from distance_stub import StubDistanceMatrixServer
+
+DESTINATION = 'Hôpital de Dreux'
+
+
+def origins(count):
+    return [f"{number} rue de la Gare, 28000 Chartres" for number in range(1, count + 1)]
+
+
+class ShortRowsStub(StubDistanceMatrixServer):
+    """Répond une ligne de moins que d'origines"""
+
+    def respond(self, query):
+        data = super().respond(query)
+        data['rows'] = data['rows'][:-1]
+        return data
+
+
+@pytest.fixture(scope='module')
+def offline():
+    return OfflineDistanceProvider()
+
+
+def test_chunks_above_max_origins(offline):
+    count = MAX_ORIGINS_PER_REQUEST + 5
+    with StubDistanceMatrixServer(provider=offline) as server:
+        results = GoogleDistanceProvider('stub', url=server.url).distances(origins(count), DESTINATION)
+
+    assert server.requests == 2
+    assert server.elements == count
+    assert len(results) == count
+    assert all(result['success'] for result in results.values())
+
+
+def test_deadline_fails_late_origins(offline):
+    with StubDistanceMatrixServer(latency=1.0, provider=offline) as server:
+        start = time.monotonic()
+        results = GoogleDistanceProvider('stub', url=server.url).distances(
+            origins(3), DESTINATION, deadline=time.monotonic() + 0.2
+        )
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.8
+    assert len(results) == 3
+    for result in results.values():
+        assert not result['success']
+        assert result['status'] is None
+
+
+def test_row_count_mismatch_fails_every_origin(offline):
+    with ShortRowsStub(provider=offline) as server:
+        results = calculate_distances(origins(3), DESTINATION, provider=GoogleDistanceProvider('stub', url=server.url))
+
+    assert len(results) == 3
+    for result in results.values():
+        assert not result['success']
+        assert result['status'] is None
+        assert '2 ligne(s)' in result['error']
+
+
+def test_api_error_falls_back_to_offline_estimate(offline):
+    with StubDistanceMatrixServer(error_rate=1.0, provider=offline) as server:
+        results = calculate_distances(
+            origins(2), DESTINATION,
+            provider=GoogleDistanceProvider('stub', url=server.url),
+            fallback=offline
+        )
+
+    for result in results.values():
+        assert result['success']
+        assert result['estimated']
+
+
+@pytest.mark.parametrize('address, label', [
+    ('5 rue de Chartres, 28190 Courville-sur-Eure', 'Courville-sur-Eure'),
+    ('5 rue de Chartres, 28190', 'Courville-sur-Eure'),
+    ('12 rue de Paris, Dreux', 'Dreux'),
+    ('28000 Chartres', 'Chartres'),
+    ('Chartres Gare', 'Chartres Gare'),
+])
+def test_gazetteer_geocode(address, label):
+    assert Gazetteer().geocode(address)[2] == label
+
+
+def test_gazetteer_unknown_postal_code_beats_street_name():
+    assert Gazetteer().geocode('2 route de Dreux, 28410 Boutigny-Prouais') is None
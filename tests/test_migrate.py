@@ -0,0 +1,47 @@
+import glob
+import os
+
+import pytest
+
+from migrate import MIGRATIONS_DIR, NO_TRANSACTION_DIRECTIVE, split_sql_statements
+
+
+def test_splits_on_semicolons():
+    assert split_sql_statements('SELECT 1; SELECT 2;\n') == ['SELECT 1', 'SELECT 2']
+
+
+def test_keeps_semicolons_in_strings_and_dollar_blocks():
+    sql = "SELECT 'a;b''c'; CREATE FUNCTION f() RETURNS void AS $$ BEGIN PERFORM 1; END; $$ LANGUAGE plpgsql;"
+    assert split_sql_statements(sql) == [
+        "SELECT 'a;b''c'",
+        'CREATE FUNCTION f() RETURNS void AS $$ BEGIN PERFORM 1; END; $$ LANGUAGE plpgsql'
+    ]
+
+
+def test_keeps_block_comments_whole():
+    assert split_sql_statements('/* a; b */ SELECT 1; /* x /* y; */ z; */ SELECT 2') == [
+        '/* a; b */ SELECT 1',
+        '/* x /* y; */ z; */ SELECT 2'
+    ]
+
+
+def test_escape_strings():
+    assert split_sql_statements("SELECT E'it\\'s; ok'; SELECT '\\'; SELECT 3") == [
+        "SELECT E'it\\'s; ok'",
+        "SELECT '\\'",
+        'SELECT 3'
+    ]
+
+
+def test_comment_only_chunks_are_dropped():
+    assert split_sql_statements('-- rien ;\n/* rien ; */;\nSELECT 1;') == ['SELECT 1']
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql'))))
+def test_migrations_split_into_statements(path):
+    with open(path, encoding='utf-8') as f:
+        sql = f.read()
+    statements = split_sql_statements(sql)
+    assert statements
+    if sql.startswith(NO_TRANSACTION_DIRECTIVE):
+        assert all('CONCURRENTLY' in statement for statement in statements)
@@ -0,0 +1,40 @@
+from datetime import datetime, time
+
+from course import TIMEZONE, Course
+from planning import build_day_plan, build_week_grid
+
+
+def course(course_id, chauffeur_id, hour, minute=0, heure_pec=None, day_offset=0):
+    return Course(
+        id=course_id,
+        chauffeur_id=chauffeur_id,
+        heure_prevue=TIMEZONE.localize(datetime(2026, 10, 12 + day_offset, hour, minute)),
+        heure_pec_prevue=heure_pec,
+        day_offset=day_offset
+    )
+
+
+def test_day_plan_groups_by_driver_in_query_order():
+    courses = [course(1, 10, 8), course(2, 20, 9), course(3, 10, 11), course(4, 20, 12)]
+    plan = build_day_plan(courses)
+
+    assert list(plan) == [10, 20]
+    assert [c.id for c in plan[10]] == [1, 3]
+    assert [c.id for c in plan[20]] == [2, 4]
+
+
+def test_day_plan_empty():
+    assert build_day_plan([]) == {}
+
+
+def test_week_grid_uses_heure_pec_and_sorts_slots():
+    courses = [
+        course(1, 10, 8, 45),
+        course(2, 10, 7, heure_pec=time(8, 15)),
+        course(3, 10, 9, day_offset=1)
+    ]
+    grid = build_week_grid(courses)
+
+    assert [c.id for c in grid[(0, 8)]] == [2, 1]
+    assert [c.id for c in grid[(1, 9)]] == [3]
+    assert (0, 7) not in grid